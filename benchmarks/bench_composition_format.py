@@ -0,0 +1,63 @@
+"""
+Compare the binary composition format (.mcb) with the indented JSON written today.
+
+Reports encoded size and dump/load time for a synthetic composition, and checks that
+the binary round trip returns the same composition.
+
+Usage:
+	python benchmarks/bench_composition_format.py [--notes 20000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from music_composer.composition_format import dumps, loads
+from bench_synth import synthetic_composition
+
+
+def best_of(function, repeat):
+	timings = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		function()
+		timings.append(time.perf_counter() - start)
+	return min(timings)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--notes", type=int, default=20000)
+	parser.add_argument("--repeat", type=int, default=5)
+	args = parser.parse_args()
+
+	music_data = synthetic_composition(args.notes)
+	for index, note in enumerate(music_data["notes"]):
+		if index % 3 == 0:
+			note["effects"] = [{"type": "reverb", "value": 40}]
+
+	json_text = json.dumps(music_data, indent=2)
+	binary = dumps(music_data)
+	if loads(binary) != json.loads(json_text):
+		raise SystemExit("Binary round trip does not match the JSON composition")
+
+	rows = [
+		("json (indent=2)", len(json_text.encode("utf-8")),
+			best_of(lambda: json.dumps(music_data, indent=2), args.repeat),
+			best_of(lambda: json.loads(json_text), args.repeat)),
+		("binary (.mcb)", len(binary),
+			best_of(lambda: dumps(music_data), args.repeat),
+			best_of(lambda: loads(binary), args.repeat))
+	]
+	print(f"{args.notes} notes, best of {args.repeat}")
+	print(f"{'format':<18}{'bytes':>12}{'dump ms':>10}{'load ms':>10}")
+	for name, size, dump_seconds, load_seconds in rows:
+		print(f"{name:<18}{size:>12}{dump_seconds * 1000:>10.1f}{load_seconds * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+	main()
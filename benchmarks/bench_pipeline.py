@@ -0,0 +1,264 @@
+"""
+Offline benchmark of every stage of the composition pipeline.
+
+The model is replaced by FakeGeminiWrapper, which returns a synthetic composition, so
+no network or API key is needed. For each composition size the benchmark measures:
+
+	instrument_kit  InstrumentKit() construction (independent of size)
+	compose         model call and response parsing (stubbed model)
+	sort            MusicComposer.__sort_notes_by_offset
+	midi            MusicComposer.__create_midi_file (sort, compile and save)
+	score           image_notes (needs LilyPond)
+	render          MusicComposer.__render_audio to WAV (needs fluidsynth)
+
+Time is the best of --repeat runs. Peak memory is the largest Python allocation
+during one extra run under tracemalloc; memory used inside fluidsynth or LilyPond
+is not included. Engraving and rendering grow with the length of the piece, so they
+are only run up to --max-score-notes and --max-render-notes.
+
+Results are compared with the baseline file when it exists, and the exit status is 1
+if any stage got slower or larger than the tolerance allows. Times are scaled by a
+short fixed CPU workload measured in both runs, so a machine that is uniformly
+slower today is not reported as a regression. Write the baseline on
+the reference machine with --save-baseline. With --ci (the default when the CI
+environment variable is set) a missing baseline is an error, exit status 2, so a
+pipeline cannot pass without comparing anything.
+
+Usage:
+	python benchmarks/bench_pipeline.py [--sizes 10,100,1000,10000,100000,1000000]
+		[--repeat 3] [--baseline benchmarks/baseline.json] [--save-baseline]
+		[--tolerance 0.25] [--soundfont path.sf2] [--ci]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from bench_synth import DEFAULT_SOUNDFONT, synthetic_composition
+
+DEFAULT_SIZES = "10,100,1000,10000,100000,1000000"
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+# Differences below these are noise, whatever the relative change
+MIN_TIME_DELTA = 0.002
+MIN_MEMORY_DELTA = 256 * 1024
+
+
+def measure(function, repeat):
+	"""
+	Returns:
+		tuple: (best seconds of `repeat` runs, peak traced bytes of one more run)
+	"""
+	timings = []
+	for _ in range(repeat):
+		# Like timeit: a collection triggered by earlier garbage should not land in this run
+		gc.collect()
+		gc.disable()
+		try:
+			start = time.perf_counter()
+			function()
+			timings.append(time.perf_counter() - start)
+		finally:
+			gc.enable()
+
+	tracemalloc.start()
+	try:
+		function()
+		peak = tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+	return min(timings), peak
+
+
+def calibrate(repeat=5):
+	"""Best time of a fixed pure-Python workload, the unit that stage times are compared in."""
+	def workload():
+		table = {}
+		for i in range(200000):
+			table[i % 1000] = table.get(i % 1000, 0) + i
+		sorted(table.items(), key=lambda item: -item[1])
+	return measure(workload, repeat)[0]
+
+
+def renderer_available():
+	from music_composer.synth import inprocess_available
+	return inprocess_available() or shutil.which("fluidsynth") is not None
+
+
+def run(sizes, repeat, soundfont, max_score_notes, max_render_notes, work_dir):
+	"""
+	Returns:
+		list: One dict per measured stage and size (stage, notes, seconds, peak_bytes)
+	"""
+	# Keep the composer's shared paths out of the package directory
+	os.environ["MUSIC_COMPOSER_BASE_PATH"] = work_dir
+	os.environ.setdefault("OUTPUT_WAV", os.path.join(work_dir, "output.wav"))
+
+	from music_composer.create_notes import image_notes
+	from music_composer.instrument_kit import InstrumentKit
+	from music_composer.llm_stream import FakeGeminiWrapper
+	from music_composer.main import MusicComposer
+
+	results = []
+
+	def record(stage, notes, function, stage_repeat=repeat):
+		seconds, peak = measure(function, stage_repeat)
+		results.append({"stage": stage, "notes": notes, "seconds": seconds, "peak_bytes": peak})
+		print(f"{stage:<16}{notes if notes is not None else '-':>10}{seconds * 1000:>12.2f}{peak / 1024:>14.1f}", flush=True)
+
+	print(f"{'stage':<16}{'notes':>10}{'best ms':>12}{'peak KiB':>14}")
+	InstrumentKit()
+	record("instrument_kit", None, InstrumentKit, max(repeat, 100))
+
+	can_score = shutil.which("lilypond") is not None
+	can_render = renderer_available()
+	for notes in sizes:
+		music_data = synthetic_composition(notes)
+		llm = FakeGeminiWrapper(music_data)
+		composer = MusicComposer(
+			soundfont_path=soundfont,
+			render_cache=False,
+			response_cache=False,
+			score_renderer=False,
+			parallel_render=False,
+			stream_response=False,
+			llm_client=llm
+		)
+		# The stages are private steps of generate_music; call them one at a time
+		sort_notes = composer._MusicComposer__sort_notes_by_offset
+		create_midi_file = composer._MusicComposer__create_midi_file
+		render_audio = composer._MusicComposer__render_audio
+
+		size_dir = os.path.join(work_dir, str(notes))
+		os.makedirs(size_dir, exist_ok=True)
+		midi_path = os.path.join(size_dir, "output.mid")
+		wav_path = os.path.join(size_dir, "output.wav")
+		# Very large sizes run once; repeating them adds minutes but little accuracy
+		size_repeat = repeat if notes < 100000 else 1
+
+		record("compose", notes, lambda: composer.compose("benchmark", use_cache=False), size_repeat)
+		record("sort", notes, lambda: sort_notes(dict(music_data)), size_repeat)
+
+		mid = None
+		def compile_midi():
+			nonlocal mid
+			mid = create_midi_file(dict(music_data), midi_path)
+			if mid is None:
+				raise RuntimeError("MIDI compilation failed")
+		record("midi", notes, compile_midi, size_repeat)
+
+		if not can_score:
+			print(f"{'score':<16}{notes:>10}  skipped (lilypond not installed)")
+		elif notes > max_score_notes:
+			print(f"{'score':<16}{notes:>10}  skipped (above --max-score-notes)")
+		else:
+			score_base = os.path.join(size_dir, "music_data")
+			def engrave():
+				if image_notes(music_data, score_base) is None:
+					raise RuntimeError("Score engraving failed")
+			record("score", notes, engrave, size_repeat)
+
+		if not can_render:
+			print(f"{'render':<16}{notes:>10}  skipped (fluidsynth not installed)")
+		elif notes > max_render_notes:
+			print(f"{'render':<16}{notes:>10}  skipped (above --max-render-notes)")
+		else:
+			def render():
+				if render_audio(midi_path, wav_path, mid) is None:
+					raise RuntimeError("Audio rendering failed")
+			record("render", notes, render, size_repeat)
+	return results
+
+
+def result_key(result):
+	return f"{result['stage']}/{result['notes'] if result['notes'] is not None else '-'}"
+
+
+def compare(results, calibration, baseline, tolerance):
+	"""
+	Args:
+		calibration: calibrate() of this run; the baseline's own is in the file
+
+	Returns:
+		list: Descriptions of the stages that regressed beyond `tolerance`
+	"""
+	previous = {result_key(result): result for result in baseline["results"]}
+	speed = calibration / baseline["calibration"] if baseline.get("calibration") else 1.0
+	regressions = []
+	print(f"\nThis machine runs the calibration workload x{speed:.2f} the baseline's time")
+	print(f"{'stage/notes':<24}{'time':>10}{'memory':>10}  (ratio to baseline)")
+	for result in results:
+		key = result_key(result)
+		if key not in previous:
+			continue
+		old = previous[key]
+		time_ratio = result["seconds"] / (old["seconds"] * speed) if old["seconds"] else 1.0
+		memory_ratio = result["peak_bytes"] / old["peak_bytes"] if old["peak_bytes"] else 1.0
+		flags = []
+		if time_ratio > 1 + tolerance and result["seconds"] - old["seconds"] * speed > MIN_TIME_DELTA:
+			flags.append("slower")
+		if memory_ratio > 1 + tolerance and result["peak_bytes"] - old["peak_bytes"] > MIN_MEMORY_DELTA:
+			flags.append("more memory")
+		print(f"{key:<24}{time_ratio:>10.2f}{memory_ratio:>10.2f}  {', '.join(flags)}")
+		if flags:
+			regressions.append(f"{key}: {', '.join(flags)} (time x{time_ratio:.2f}, memory x{memory_ratio:.2f})")
+	return regressions
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated note counts")
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--soundfont", default=DEFAULT_SOUNDFONT)
+	parser.add_argument("--max-score-notes", type=int, default=1000)
+	parser.add_argument("--max-render-notes", type=int, default=2000)
+	parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare with or save")
+	parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+	parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown or growth")
+	parser.add_argument("--ci", action="store_true", default=os.getenv("CI", "").lower() in ("1", "true", "yes"), help="Fail when there is no baseline (default on when CI is set)")
+	args = parser.parse_args()
+
+	sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+	calibration = calibrate()
+	with tempfile.TemporaryDirectory() as work_dir:
+		results = run(sizes, args.repeat, args.soundfont, args.max_score_notes, args.max_render_notes, work_dir)
+	# Measured again at the end, so drift during a long run is averaged out
+	calibration = (calibration + calibrate()) / 2
+
+	if args.save_baseline:
+		with open(args.baseline, "w") as f:
+			json.dump({
+				"python": platform.python_version(),
+				"platform": platform.platform(),
+				"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+				"calibration": calibration,
+				"results": results
+			}, f, indent=2)
+		print(f"\nBaseline written to {args.baseline}")
+		return 0
+
+	if not os.path.exists(args.baseline):
+		print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+		return 2 if args.ci else 0
+	with open(args.baseline, "r") as f:
+		baseline = json.load(f)
+	regressions = compare(results, calibration, baseline, args.tolerance)
+	if regressions:
+		print("\nRegressions:")
+		for regression in regressions:
+			print(f"  {regression}")
+		return 1
+	print("\nNo regressions")
+	return 0
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
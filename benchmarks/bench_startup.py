@@ -0,0 +1,132 @@
+"""
+Startup benchmark for the package and the instrument registry.
+
+Measures, each in a fresh interpreter, the time to `import music_composer` and to
+import the web server (which creates the Flask app), and fails if either exceeds its
+budget or loads one of the heavy dependencies that are meant to be deferred until a
+generation needs them (music21, google.genai, gemiwrap, numpy, mido). On failure the
+slowest imports reported by `python -X importtime` are listed.
+
+Also measures the one-off cost of building the instrument registry and the per-call
+cost of InstrumentKit() once the registry is warm, which is what every MIDI compile pays.
+
+Usage:
+	python benchmarks/bench_startup.py [--iterations 1000] [--repeat 5]
+		[--package-budget-ms 50] [--server-budget-ms 400]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("music21", "google.genai", "gemiwrap", "numpy", "mido")
+
+IMPORT_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(",".join(name for name in {heavy!r} if name in sys.modules))
+print(elapsed)
+"""
+
+COLD_SNIPPET = """
+import time
+from music21 import instrument
+from music_composer.instrument_kit import InstrumentKit
+start = time.perf_counter()
+InstrumentKit()
+print(time.perf_counter() - start)
+"""
+
+
+def measure_import(module, repeat):
+	"""
+	Returns:
+		tuple: (best import seconds over `repeat` fresh interpreters, heavy modules it loaded)
+	"""
+	timings = []
+	loaded = []
+	for _ in range(repeat):
+		result = subprocess.run(
+			[sys.executable, "-c", IMPORT_SNIPPET.format(module=module, heavy=HEAVY_MODULES)],
+			cwd=REPO_ROOT, check=True, capture_output=True, text=True
+		)
+		lines = result.stdout.splitlines()
+		loaded = [name for name in lines[-2].split(",") if name]
+		timings.append(float(lines[-1]))
+	return min(timings), loaded
+
+
+def slowest_imports(module, count=10):
+	"""Top cumulative entries of `python -X importtime` for one import."""
+	result = subprocess.run(
+		[sys.executable, "-X", "importtime", "-c", f"import {module}"],
+		cwd=REPO_ROOT, check=True, capture_output=True, text=True
+	)
+	rows = []
+	for line in result.stderr.splitlines():
+		parts = line.split("|")
+		if len(parts) == 3 and parts[1].strip().isdigit():
+			rows.append((int(parts[1]), parts[2].strip()))
+	return sorted(rows, reverse=True)[:count]
+
+
+def check_import(label, module, budget_ms, repeat):
+	"""Print the import time of `module` and return False if it breaks the budget."""
+	seconds, loaded = measure_import(module, repeat)
+	ok = seconds * 1000 <= budget_ms and not loaded
+	print(f"{label:<35}{seconds * 1000:.1f} ms (budget {budget_ms:g} ms){'' if ok else '  OVER BUDGET' if not loaded else ''}")
+	if loaded:
+		print(f"  loads deferred dependencies: {', '.join(loaded)}")
+	if not ok:
+		for microseconds, name in slowest_imports(module):
+			print(f"  {microseconds / 1000:8.1f} ms  {name}")
+	return ok
+
+
+def measure_cold():
+	"""Registry build time in a fresh process (music21 import excluded)."""
+	result = subprocess.run(
+		[sys.executable, "-c", COLD_SNIPPET],
+		cwd=REPO_ROOT, check=True, capture_output=True, text=True
+	)
+	return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure_warm(iterations):
+	"""Mean InstrumentKit() construction plus a lookup once the registry exists."""
+	sys.path.insert(0, REPO_ROOT)
+	from music_composer.instrument_kit import InstrumentKit
+
+	InstrumentKit()
+	start = time.perf_counter()
+	for _ in range(iterations):
+		kit = InstrumentKit()
+		kit.get_program_number("violin")
+	return (time.perf_counter() - start) / iterations
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--iterations", type=int, default=1000)
+	parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per import measurement")
+	parser.add_argument("--package-budget-ms", type=float, default=50.0)
+	parser.add_argument("--server-budget-ms", type=float, default=400.0)
+	args = parser.parse_args()
+
+	ok = check_import("import music_composer:", "music_composer", args.package_budget_ms, args.repeat)
+	ok = check_import("web server import (Flask app):", "music_composer.web_server", args.server_budget_ms, args.repeat) and ok
+
+	cold = measure_cold()
+	warm = measure_warm(args.iterations)
+	print(f"registry build (once per process): {cold * 1000:.3f} ms")
+	print(f"InstrumentKit() per call (warm):   {warm * 1e6:.3f} us")
+	return 0 if ok else 1
+
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -0,0 +1,89 @@
+"""
+Compare the fluidsynth subprocess backend with the in-process libfluidsynth backend.
+
+Both render the same synthetic composition several times. The in-process synth is
+created once, as a worker thread would, so the numbers show the per-render cost
+after the soundfont is loaded.
+
+Usage:
+	python benchmarks/bench_synth.py [--notes 500] [--repeat 5] [--soundfont path.sf2]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from music_composer.composition_table import CompositionTable
+from music_composer.midi_compiler import MidiCompiler
+from music_composer.synth import InProcessSynth, SubprocessSynth, inprocess_available
+
+DEFAULT_SOUNDFONT = os.path.join(REPO_ROOT, "music_composer", "GeneralUser-GS.sf2")
+
+
+def synthetic_composition(note_count, seed=0):
+	rng = random.Random(seed)
+	instruments = ["acoustic_grand", "violin", "cello", "flute"]
+	notes = []
+	for i in range(note_count):
+		instrument = instruments[i % len(instruments)]
+		notes.append({
+			"type": "note",
+			"pitch": rng.choice(["C4", "D4", "E4", "G4", "A4", "C5"]),
+			"duration": rng.choice([0.5, 1.0, 2.0]),
+			"velocity": rng.randint(60, 110),
+			"instrument": instrument,
+			"channel": instruments.index(instrument),
+			"offset": i * 0.25,
+			"effects": []
+		})
+	return {"key_signature": "C", "tempo": 120, "time_signature": "4/4", "notes": notes}
+
+
+def time_renders(render, repeat):
+	timings = []
+	for _ in range(repeat):
+		start = time.perf_counter()
+		render()
+		timings.append(time.perf_counter() - start)
+	return min(timings), sum(timings) / len(timings)
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--notes", type=int, default=500)
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--soundfont", default=DEFAULT_SOUNDFONT)
+	args = parser.parse_args()
+
+	music_data = synthetic_composition(args.notes)
+	compiler = MidiCompiler(music_data)
+	compiler.add_table(CompositionTable.from_notes(music_data["notes"]))
+	mid = compiler.build()
+
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		midi_path = os.path.join(tmp_dir, "bench.mid")
+		wav_path = os.path.join(tmp_dir, "bench.wav")
+		mid.save(midi_path)
+
+		subprocess_synth = SubprocessSynth(args.soundfont)
+		best, mean = time_renders(lambda: subprocess_synth.render_file(midi_path, wav_path), args.repeat)
+		print(f"subprocess: best {best * 1000:.1f} ms, mean {mean * 1000:.1f} ms")
+
+		if not inprocess_available():
+			print("inprocess:  skipped (pyfluidsynth/libfluidsynth not installed)")
+			return
+
+		start = time.perf_counter()
+		inprocess_synth = InProcessSynth(args.soundfont)
+		print(f"inprocess soundfont load (once per worker): {(time.perf_counter() - start) * 1000:.1f} ms")
+		best, mean = time_renders(lambda: inprocess_synth.render_file(mid, wav_path), args.repeat)
+		print(f"inprocess:  best {best * 1000:.1f} ms, mean {mean * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+	main()
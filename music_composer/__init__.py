@@ -1,6 +1,13 @@
-from .main import MusicComposer
-
 import os
 if os.path.exists(".env"):
     from dotenv import load_dotenv
-    load_dotenv()
\ No newline at end of file
+    load_dotenv()
+
+__all__ = ["MusicComposer"]
+
+def __getattr__(name):
+    # Importing the package stays cheap; the engine and its dependencies load on first use
+    if name == "MusicComposer":
+        from .main import MusicComposer
+        return MusicComposer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
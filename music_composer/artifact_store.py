@@ -0,0 +1,143 @@
+import os
+import re
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from custom_logger import logger_config
+
+_SAFE_NAME = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+class ArtifactStore:
+	"""
+	Per-job artifact directories under MUSIC_COMPOSER_BASE_PATH/artifacts.
+
+	Every generation gets its own directory, so concurrent jobs never share a file.
+	Finished directories are evicted once they are older than `max_age` seconds or
+	when the store grows beyond `max_bytes`, oldest first. Directories reserved by a
+	running job are never evicted.
+	"""
+
+	def __init__(self, root=None, max_bytes=None, max_age=None, sweep_interval=None):
+		"""
+		Args:
+			root: Store directory. Defaults to <MUSIC_COMPOSER_BASE_PATH>/artifacts
+			max_bytes: Size budget. Defaults to MUSIC_COMPOSER_ARTIFACT_MAX_BYTES or 1 GiB
+			max_age: Retention in seconds. Defaults to MUSIC_COMPOSER_ARTIFACT_MAX_AGE or 1 day
+			sweep_interval: Seconds between background evictions. Defaults to 300
+		"""
+		base_path = os.getenv("MUSIC_COMPOSER_BASE_PATH", os.path.dirname(os.path.abspath(__file__)))
+		self.root = root or os.path.join(base_path, "artifacts")
+		self.max_bytes = int(max_bytes or os.getenv("MUSIC_COMPOSER_ARTIFACT_MAX_BYTES", 1024 ** 3))
+		self.max_age = float(max_age or os.getenv("MUSIC_COMPOSER_ARTIFACT_MAX_AGE", 24 * 60 * 60))
+		self.sweep_interval = float(sweep_interval or os.getenv("MUSIC_COMPOSER_ARTIFACT_SWEEP_INTERVAL", 300))
+		os.makedirs(self.root, exist_ok=True)
+
+		self.__active = set()
+		self.__lock = threading.Lock()
+		self.__stop = threading.Event()
+		self.__thread = None
+
+	@staticmethod
+	def is_safe_name(name):
+		return bool(name) and bool(_SAFE_NAME.match(name)) and name not in (".", "..")
+
+	def job_dir(self, job_id):
+		"""Directory holding one job's artifacts (not created)."""
+		if not self.is_safe_name(job_id):
+			raise ValueError(f"Invalid job id: {job_id}")
+		return os.path.join(self.root, job_id)
+
+	def path(self, job_id, filename):
+		"""
+		Path of an existing artifact, or None if the job or file does not exist.
+		"""
+		if not self.is_safe_name(job_id) or not self.is_safe_name(filename):
+			return None
+		file_path = os.path.join(self.root, job_id, filename)
+		return file_path if os.path.isfile(file_path) else None
+
+	@contextmanager
+	def reserve(self, job_id):
+		"""
+		Create a job directory and protect it from eviction until the block exits.
+
+		Yields:
+			str: The job directory
+		"""
+		job_dir = self.job_dir(job_id)
+		with self.__lock:
+			self.__active.add(job_id)
+			os.makedirs(job_dir, exist_ok=True)
+		try:
+			yield job_dir
+		finally:
+			with self.__lock:
+				self.__active.discard(job_id)
+			# Age is measured from when the job finished writing
+			if os.path.isdir(job_dir):
+				os.utime(job_dir)
+
+	def __entries(self):
+		entries = []
+		for job_id in os.listdir(self.root):
+			job_dir = os.path.join(self.root, job_id)
+			if not os.path.isdir(job_dir):
+				continue
+			size = 0
+			for dirpath, _, filenames in os.walk(job_dir):
+				for filename in filenames:
+					try:
+						size += os.path.getsize(os.path.join(dirpath, filename))
+					except OSError:
+						pass
+			entries.append((os.path.getmtime(job_dir), size, job_id))
+		entries.sort()
+		return entries
+
+	def evict(self):
+		"""
+		Remove expired directories, then the oldest ones until the store fits `max_bytes`.
+
+		Returns:
+			int: Number of job directories removed
+		"""
+		removed = 0
+		with self.__lock:
+			entries = self.__entries()
+			# Running jobs count towards the budget but are never removed
+			total = sum(size for _, size, _ in entries)
+			now = time.time()
+			for mtime, size, job_id in entries:
+				if job_id in self.__active:
+					continue
+				if now - mtime <= self.max_age and total <= self.max_bytes:
+					break
+				shutil.rmtree(os.path.join(self.root, job_id), ignore_errors=True)
+				total -= size
+				removed += 1
+
+		if removed:
+			logger_config.info(f"Evicted {removed} artifact directories from {self.root}.")
+		return removed
+
+	def __sweep(self):
+		while not self.__stop.wait(self.sweep_interval):
+			try:
+				self.evict()
+			except Exception as e:
+				logger_config.warning(f"Artifact eviction failed: {e}")
+
+	def start(self):
+		"""Start background eviction. Safe to call more than once."""
+		if self.__thread and self.__thread.is_alive():
+			return
+		self.__stop.clear()
+		self.__thread = threading.Thread(target=self.__sweep, name="artifact-eviction", daemon=True)
+		self.__thread.start()
+
+	def stop(self):
+		self.__stop.set()
+		if self.__thread:
+			self.__thread.join()
+			self.__thread = None
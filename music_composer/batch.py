@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from custom_logger import logger_config
+from .engine_pool import ComposerPool, DEFAULT_MODEL_NAME
+from .worker_pool import WorkerPool
+
+def is_rate_limited(error):
+	"""True if an exception (or one it was raised from) is an API 429 / quota error."""
+	while error is not None:
+		if getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429:
+			return True
+		message = str(error)
+		if "429" in message or "RESOURCE_EXHAUSTED" in message or "rate limit" in message.lower():
+			return True
+		error = error.__cause__ or error.__context__
+	return False
+
+class SharedBackoff:
+	"""
+	Backoff shared by all model calls of a batch. When one call is rate limited, every
+	caller waits, instead of each thread hammering the API on its own schedule.
+	"""
+
+	def __init__(self, base_delay=2.0, max_delay=120.0):
+		self.base_delay = base_delay
+		self.max_delay = max_delay
+		self.__resume_at = 0.0
+		self.__lock = threading.Lock()
+
+	def wait(self):
+		with self.__lock:
+			delay = self.__resume_at - time.monotonic()
+		if delay > 0:
+			time.sleep(delay)
+
+	def penalize(self, attempt):
+		"""Hold all callers back for an exponential, jittered delay."""
+		delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+		with self.__lock:
+			self.__resume_at = max(self.__resume_at, time.monotonic() + delay)
+		return delay
+
+def _slug(text, length=40):
+	return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:length] or "piece"
+
+# One render-only engine per worker process, built on first use
+_worker_composer = None
+
+def _render_item(music_data, output_dir, composer_kwargs, output_format, render_scores):
+	"""
+	Worker pool entry point: compile and render one composition.
+
+	Returns:
+		dict: output path and render timing
+	"""
+	global _worker_composer
+	if _worker_composer is None:
+		from .main import MusicComposer
+		_worker_composer = MusicComposer(**{**composer_kwargs, "score_renderer": False})
+
+	started = time.perf_counter()
+	output = _worker_composer.generate_music("", music_data=music_data, output_dir=output_dir, output_format=output_format)
+	if not output:
+		raise ValueError("Audio rendering failed")
+	render_seconds = time.perf_counter() - started
+
+	score = None
+	if render_scores:
+		from .score_renderer import ScoreRenderer
+		score = ScoreRenderer().render(music_data, os.path.join(output_dir, "music_data.png"))
+	return {"output": output, "score": score, "render_seconds": render_seconds}
+
+def generate_many(prompts, output_root, instruments=None, model_name=None, llm_concurrency=None, render_workers=None, output_format="wav", max_retries=5, use_cache=True, render_scores=False, on_result=None, composer_pool=None, **composer_kwargs):
+	"""
+	Generate one piece per prompt.
+
+	Model calls run on a thread pool limited to `llm_concurrency`. Each composition
+	is handed to a worker process for MIDI compile and rendering as soon as it
+	arrives, so rendering overlaps the remaining model calls. Every item writes to
+	its own directory, and a failed item is recorded without stopping the batch.
+	An entry without a prompt, or one that `_read_prompts` could not parse (it
+	carries an "error"), is recorded as failed with that error.
+
+	Args:
+		prompts: Prompt strings, or dicts with "prompt" and optional "instruments"
+		output_root: Directory that receives one <index>-<slug> directory per prompt
+		instruments: Default instrument names for prompts that do not set their own
+		model_name: Gemini model. Defaults to MODEL_NAME or DEFAULT_MODEL_NAME
+		llm_concurrency: Concurrent model calls. Defaults to MUSIC_COMPOSER_BATCH_CONCURRENCY or 4
+		render_workers: Render processes. Defaults to MUSIC_COMPOSER_RENDER_WORKERS or the CPU count
+		output_format: Audio format of every item (see encoders.FORMATS)
+		max_retries: Retries of a rate-limited model call before the item fails
+		use_cache: Set to False to bypass the model response cache
+		render_scores: Also engrave score images (slow; off by default)
+		on_result: Optional callback called with each item's result as it finishes
+		composer_pool: Optional ComposerPool for the model calls (e.g. with a stub factory)
+		composer_kwargs: Extra MusicComposer arguments (soundfont_path, sample_rate, ...)
+
+	Returns:
+		list: One result dict per prompt, in prompt order, with index, prompt, status
+		("done" or "failed"), output, error, attempts and timings (llm, render and
+		elapsed seconds). The list is also written to <output_root>/results.json
+	"""
+	model_name = model_name or os.getenv("MODEL_NAME", DEFAULT_MODEL_NAME)
+	llm_concurrency = llm_concurrency or int(os.getenv("MUSIC_COMPOSER_BATCH_CONCURRENCY", 4))
+	render_workers = render_workers or int(os.getenv("MUSIC_COMPOSER_RENDER_WORKERS", os.cpu_count() or 1))
+	composer_pool = composer_pool or ComposerPool(max_size=llm_concurrency, **{**composer_kwargs, "render_cache": False, "score_renderer": False})
+	backoff = SharedBackoff()
+	os.makedirs(output_root, exist_ok=True)
+	batch_started = time.perf_counter()
+
+	items = []
+	for index, entry in enumerate(prompts):
+		entry = entry if isinstance(entry, dict) else {"prompt": entry}
+		prompt = entry.get("prompt")
+		error = entry.get("error")
+		if not error and not (isinstance(prompt, str) and prompt.strip()):
+			error = f"Entry has no prompt: {entry!r}"
+		items.append({
+			"index": index,
+			"prompt": prompt,
+			"instruments": entry.get("instruments", instruments),
+			"output_dir": None if error else os.path.join(output_root, f"{index:04d}-{_slug(prompt)}"),
+			"status": "failed" if error else "pending",
+			"output": None,
+			"score": None,
+			"error": error,
+			"attempts": 0,
+			"timings": {}
+		})
+
+	def compose(item):
+		started = time.perf_counter()
+		for attempt in range(max_retries + 1):
+			backoff.wait()
+			item["attempts"] = attempt + 1
+			try:
+				with composer_pool.acquire(model_name) as composer:
+					music_data = composer.compose(item["prompt"], instruments=item["instruments"], use_cache=use_cache)
+				item["timings"]["llm"] = time.perf_counter() - started
+				return music_data
+			except Exception as e:
+				if not is_rate_limited(e) or attempt == max_retries:
+					raise
+				delay = backoff.penalize(attempt)
+				logger_config.warning(f"Rate limited on item {item['index']}, backing off {delay:.1f}s.")
+
+	def finish(item, status, error=None):
+		item["status"] = status
+		item["error"] = error
+		# Seconds from the start of the batch until this item finished
+		item["timings"]["elapsed"] = time.perf_counter() - batch_started
+		if on_result:
+			on_result(_public(item))
+
+	def rendered(item, future):
+		try:
+			result = future.result()
+			item["output"] = result["output"]
+			item["score"] = result["score"]
+			item["timings"]["render"] = result["render_seconds"]
+			finish(item, "done")
+		except Exception as e:
+			logger_config.error(f"Batch item {item['index']} failed to render: {e}")
+			finish(item, "failed", str(e))
+
+	for item in items:
+		if item["status"] == "failed":
+			logger_config.error(f"Batch item {item['index']} is invalid: {item['error']}")
+			finish(item, "failed", item["error"])
+
+	with ThreadPoolExecutor(max_workers=llm_concurrency, thread_name_prefix="batch-llm") as llm_pool, WorkerPool(render_workers) as render_pool:
+		llm_futures = {llm_pool.submit(compose, item): item for item in items if item["status"] == "pending"}
+		render_futures = []
+		for future in as_completed(llm_futures):
+			item = llm_futures[future]
+			try:
+				music_data = future.result()
+			except Exception as e:
+				logger_config.error(f"Batch item {item['index']} failed to compose: {e}")
+				finish(item, "failed", str(e))
+				continue
+			os.makedirs(item["output_dir"], exist_ok=True)
+			render_future = render_pool.submit(_render_item, music_data, item["output_dir"], composer_kwargs, output_format, render_scores)
+			render_future.add_done_callback(lambda done, item=item: rendered(item, done))
+			render_futures.append(render_future)
+		wait(render_futures)
+
+	results = [_public(item) for item in items]
+	with open(os.path.join(output_root, "results.json"), "w") as f:
+		json.dump(results, f, indent=2)
+	return results
+
+def _public(item):
+	return {key: value for key, value in item.items() if key != "instruments"}
+
+def _read_prompts(path):
+	"""
+	Prompts from a text file (one per line) or JSON Lines ({"prompt": ..., "instruments": [...]}).
+	A line that is not valid JSON becomes an entry with an "error", so generate_many
+	records it as a failed item and carries on with the rest.
+	"""
+	prompts = []
+	with open(path, "r", encoding="utf-8") as f:
+		for number, line in enumerate(f, 1):
+			line = line.strip()
+			if not line or line.startswith("#"):
+				continue
+			if not line.startswith("{"):
+				prompts.append(line)
+				continue
+			try:
+				entry = json.loads(line)
+			except json.JSONDecodeError as e:
+				entry = {"prompt": None, "error": f"Line {number} is not valid JSON: {e}"}
+			prompts.append(entry)
+	return prompts
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="music-composer-batch", description="Generate one piece of music per prompt.")
+	parser.add_argument("prompts", help="Text file with one prompt per line, or JSON Lines with prompt/instruments")
+	parser.add_argument("-o", "--output", default="batch_output", help="Output directory")
+	parser.add_argument("--instruments", help="Comma-separated instrument names for every prompt")
+	parser.add_argument("--model", help="Gemini model name")
+	parser.add_argument("--concurrency", type=int, help="Concurrent model calls")
+	parser.add_argument("--workers", type=int, help="Render processes")
+	parser.add_argument("--format", default="wav", help="wav, flac, opus or mp3")
+	parser.add_argument("--retries", type=int, default=5, help="Retries of a rate-limited model call")
+	parser.add_argument("--scores", action="store_true", help="Also render score images")
+	parser.add_argument("--no-cache", action="store_true", help="Ignore cached model responses")
+	args = parser.parse_args(argv)
+
+	def report(result):
+		detail = result["output"] if result["status"] == "done" else result["error"]
+		print(f"[{result['index']:04d}] {result['status']}: {detail}", flush=True)
+
+	results = generate_many(
+		_read_prompts(args.prompts),
+		args.output,
+		instruments=args.instruments.split(",") if args.instruments else None,
+		model_name=args.model,
+		llm_concurrency=args.concurrency,
+		render_workers=args.workers,
+		output_format=args.format,
+		max_retries=args.retries,
+		use_cache=not args.no_cache,
+		render_scores=args.scores,
+		on_result=report
+	)
+	failed = sum(result["status"] != "done" for result in results)
+	print(f"{len(results) - failed}/{len(results)} done, results in {os.path.join(args.output, 'results.json')}")
+	return 1 if failed else 0
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -0,0 +1,416 @@
+"""
+Compact binary serialisation of compositions (.mcb).
+
+Layout (little-endian):
+
+	magic      4 bytes  b"MCMP"
+	version    u16
+	strings    u32 count, then per string: u16 byte length + UTF-8 bytes
+	header     u32 byte length + JSON of every top-level field except "notes"
+	notes      u32 count N, then one column per note field:
+	           flags u8[N], type u16[N], instrument u16[N], pitch u16[N], channel i16[N],
+	           offset f64[N], duration f64[N], velocity f64[N], pitch count u8[N],
+	           effect count u8[N]
+	pitches    u32 count P + u16[P] (chord pitches of all notes, in note order)
+	effects    u32 count E + type u16[E] + value f64[E]
+	tail       u32 byte length + per-note records for pitch_bend (f64 start, f64 end,
+	           i32 steps), vibrato (f64 depth, i32 speed, then i32 steps if
+	           FLAG_VIBRATO_STEPS), extra fields and raw notes (u32 length + JSON
+	           each), in note order
+
+Instrument names, note types, pitch names and effect types are interned in the
+string table and referenced by u16 index. Columns load with NumPy in one call each,
+so only building the note dicts is per-note work. A note that does not fit this
+shape is stored whole as JSON (FLAG_RAW), so any composition round-trips. Numbers
+round-trip by value: integral floats within the int64 range load as ints, and ints
+that a float64 cannot hold exactly keep their note raw.
+
+Version 2 added FLAG_VIBRATO_STEPS; version 1 files still load.
+"""
+import argparse
+import json
+import os
+import struct
+import numpy as np
+
+MAGIC = b"MCMP"
+VERSION = 2
+EXTENSION = ".mcb"
+
+FLAG_PITCH = 0x01
+FLAG_PITCHES = 0x02
+FLAG_EFFECTS = 0x04
+FLAG_PITCH_BEND = 0x08
+FLAG_VIBRATO = 0x10
+FLAG_EXTRAS = 0x20
+FLAG_VIBRATO_STEPS = 0x40
+FLAG_RAW = 0x80
+
+_PREAMBLE = struct.Struct("<4sH")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_PITCH_BEND = struct.Struct("<ddi")
+_VIBRATO = struct.Struct("<di")
+_I32 = struct.Struct("<i")
+
+# (name, dtype) of the per-note columns, in file order
+_COLUMNS = (
+	("flags", "<u1"),
+	("type", "<u2"),
+	("instrument", "<u2"),
+	("pitch", "<u2"),
+	("channel", "<i2"),
+	("offset", "<f8"),
+	("duration", "<f8"),
+	("velocity", "<f8"),
+	("pitch_count", "<u1"),
+	("effect_count", "<u1")
+)
+
+_MAX_STRINGS = 0xFFFF
+_CORE_FIELDS = ("type", "instrument", "offset", "duration", "velocity", "channel")
+_KNOWN_FIELDS = set(_CORE_FIELDS) | {"pitch", "pitches", "effects", "pitch_bend", "vibrato"}
+
+# Integral floats at or beyond this magnitude load as floats, since int64 cannot hold them
+_INT64_LIMIT = 2.0 ** 63
+
+def _is_number(value):
+	"""True for a number that float64 stores exactly (NaN and infinities included)."""
+	if isinstance(value, bool) or not isinstance(value, (int, float)):
+		return False
+	# Ints beyond 2**53 can lose digits as float64; float() raises for ints beyond its range
+	return isinstance(value, float) or float(value) == value
+
+def _number(value):
+	return int(value) if value.is_integer() and -_INT64_LIMIT <= value < _INT64_LIMIT else value
+
+def _numbers(column):
+	"""Column values as Python numbers, with integral floats in the int64 range as ints."""
+	values = column.tolist()
+	in_range = np.isfinite(column) & (column >= -_INT64_LIMIT) & (column < _INT64_LIMIT)
+	integral = in_range & (column == np.floor(np.where(in_range, column, 0)))
+	if integral.all():
+		return column.astype(np.int64).tolist()
+	ints = np.where(integral, column, 0).astype(np.int64).tolist()
+	return [whole if is_whole else value for value, whole, is_whole in zip(values, ints, integral.tolist())]
+
+class _StringTable:
+	def __init__(self):
+		self.strings = []
+		self.index = {}
+
+	def intern(self, value):
+		position = self.index.get(value)
+		if position is None:
+			position = len(self.strings)
+			if position >= _MAX_STRINGS:
+				raise ValueError(f"Too many distinct strings for the binary format (max {_MAX_STRINGS})")
+			self.strings.append(value)
+			self.index[value] = position
+		return position
+
+def _encode_note(note, strings):
+	"""
+	Returns:
+		tuple: (column values, chord pitch indexes, effects, tail bytes), or None if the
+		note does not fit the record and has to be stored raw
+	"""
+	try:
+		if not all(field in note for field in _CORE_FIELDS):
+			return None
+		if not isinstance(note["type"], str) or not isinstance(note["instrument"], str):
+			return None
+		channel = note["channel"]
+		if not _is_number(channel) or channel != int(channel) or not -32768 <= channel <= 32767:
+			return None
+		if not all(_is_number(note[field]) for field in ("offset", "duration", "velocity")):
+			return None
+
+		flags = 0
+		pitch_index = 0
+		pitches = []
+		effects = []
+		tail = []
+		if "pitch" in note:
+			if not isinstance(note["pitch"], str):
+				return None
+			flags |= FLAG_PITCH
+			pitch_index = strings.intern(note["pitch"])
+		if "pitches" in note:
+			chord = note["pitches"]
+			if not isinstance(chord, list) or len(chord) > 0xFF or not all(isinstance(p, str) for p in chord):
+				return None
+			flags |= FLAG_PITCHES
+			pitches = [strings.intern(p) for p in chord]
+		if "effects" in note:
+			if not isinstance(note["effects"], list) or len(note["effects"]) > 0xFF:
+				return None
+			for effect in note["effects"]:
+				if not isinstance(effect, dict) or effect.keys() != {"type", "value"} or not isinstance(effect["type"], str) or not _is_number(effect["value"]):
+					return None
+				effects.append((strings.intern(effect["type"]), effect["value"]))
+			flags |= FLAG_EFFECTS
+		if "pitch_bend" in note:
+			bend = note["pitch_bend"]
+			if not isinstance(bend, dict) or bend.keys() != {"start", "end", "steps"} or not all(_is_number(v) for v in bend.values()) or bend["steps"] != int(bend["steps"]):
+				return None
+			flags |= FLAG_PITCH_BEND
+			tail.append(_PITCH_BEND.pack(bend["start"], bend["end"], int(bend["steps"])))
+		if "vibrato" in note:
+			vibrato = note["vibrato"]
+			if not isinstance(vibrato, dict) or vibrato.keys() - {"steps"} != {"depth", "speed"} or not all(_is_number(v) for v in vibrato.values()):
+				return None
+			if vibrato["speed"] != int(vibrato["speed"]) or vibrato.get("steps", 0) != int(vibrato.get("steps", 0)):
+				return None
+			flags |= FLAG_VIBRATO
+			tail.append(_VIBRATO.pack(vibrato["depth"], int(vibrato["speed"])))
+			if "steps" in vibrato:
+				flags |= FLAG_VIBRATO_STEPS
+				tail.append(_I32.pack(int(vibrato["steps"])))
+
+		extras = {key: value for key, value in note.items() if key not in _KNOWN_FIELDS}
+		if extras:
+			flags |= FLAG_EXTRAS
+			payload = json.dumps(extras, separators=(",", ":")).encode("utf-8")
+			tail.append(_U32.pack(len(payload)) + payload)
+
+		row = (
+			flags,
+			strings.intern(note["type"]),
+			strings.intern(note["instrument"]),
+			pitch_index,
+			int(channel),
+			note["offset"],
+			note["duration"],
+			note["velocity"],
+			len(pitches),
+			len(effects)
+		)
+		return row, pitches, effects, b"".join(tail)
+	except (TypeError, ValueError, AttributeError, OverflowError, struct.error):
+		return None
+
+def dumps(music_data):
+	"""
+	Serialise a composition.
+
+	Returns:
+		bytes: The .mcb encoding
+	"""
+	strings = _StringTable()
+	notes = music_data.get("notes", [])
+	rows = []
+	pitches = []
+	effect_types = []
+	effect_values = []
+	tail = []
+	for note in notes:
+		encoded = _encode_note(note, strings)
+		if encoded is None:
+			payload = json.dumps(note, separators=(",", ":")).encode("utf-8")
+			rows.append((FLAG_RAW, 0, 0, 0, 0, 0.0, 0.0, 0.0, 0, 0))
+			tail.append(_U32.pack(len(payload)) + payload)
+			continue
+		row, chord, effects, note_tail = encoded
+		rows.append(row)
+		pitches.extend(chord)
+		for effect_type, value in effects:
+			effect_types.append(effect_type)
+			effect_values.append(value)
+		if note_tail:
+			tail.append(note_tail)
+
+	header = json.dumps({key: value for key, value in music_data.items() if key != "notes"}, separators=(",", ":")).encode("utf-8")
+
+	parts = [_PREAMBLE.pack(MAGIC, VERSION), _U32.pack(len(strings.strings))]
+	for value in strings.strings:
+		encoded = value.encode("utf-8")
+		if len(encoded) > 0xFFFF:
+			raise ValueError("String too long for the binary format")
+		parts.append(_U16.pack(len(encoded)))
+		parts.append(encoded)
+	parts.append(_U32.pack(len(header)))
+	parts.append(header)
+
+	parts.append(_U32.pack(len(rows)))
+	columns = list(zip(*rows)) if rows else [()] * len(_COLUMNS)
+	for (_, dtype), values in zip(_COLUMNS, columns):
+		parts.append(np.asarray(values, dtype=dtype).tobytes())
+	parts.append(_U32.pack(len(pitches)))
+	parts.append(np.asarray(pitches, dtype="<u2").tobytes())
+	parts.append(_U32.pack(len(effect_types)))
+	parts.append(np.asarray(effect_types, dtype="<u2").tobytes())
+	parts.append(np.asarray(effect_values, dtype="<f8").tobytes())
+	tail_bytes = b"".join(tail)
+	parts.append(_U32.pack(len(tail_bytes)))
+	parts.append(tail_bytes)
+	return b"".join(parts)
+
+def loads(data):
+	"""
+	Deserialise a composition written by `dumps`.
+
+	Raises:
+		ValueError: If the data is not a supported .mcb encoding
+	"""
+	view = memoryview(data)
+	try:
+		magic, version = _PREAMBLE.unpack_from(view, 0)
+		if magic != MAGIC:
+			raise ValueError("Not a binary composition (bad magic)")
+		if version > VERSION:
+			raise ValueError(f"Unsupported binary composition version {version}")
+		position = _PREAMBLE.size
+
+		(string_count,) = _U32.unpack_from(view, position)
+		position += 4
+		strings = []
+		for _ in range(string_count):
+			(length,) = _U16.unpack_from(view, position)
+			position += 2
+			strings.append(str(view[position:position + length], "utf-8"))
+			position += length
+		string_array = np.array(strings + [""], dtype=object)
+
+		(header_length,) = _U32.unpack_from(view, position)
+		position += 4
+		music_data = json.loads(str(view[position:position + header_length], "utf-8"))
+		position += header_length
+
+		def column(dtype, count):
+			nonlocal position
+			values = np.frombuffer(view, dtype=dtype, count=count, offset=position)
+			position += values.nbytes
+			return values
+
+		(note_count,) = _U32.unpack_from(view, position)
+		position += 4
+		columns = {name: column(dtype, note_count) for name, dtype in _COLUMNS}
+		(pitch_total,) = _U32.unpack_from(view, position)
+		position += 4
+		chord_pitches = string_array[column("<u2", pitch_total)].tolist()
+		(effect_total,) = _U32.unpack_from(view, position)
+		position += 4
+		effect_types = string_array[column("<u2", effect_total)].tolist()
+		effect_values = _numbers(column("<f8", effect_total))
+		(tail_length,) = _U32.unpack_from(view, position)
+		position += 4
+		if position + tail_length > len(view):
+			raise ValueError("Truncated binary composition")
+
+		flags = columns["flags"].tolist()
+		types = string_array[columns["type"]].tolist()
+		instruments = string_array[columns["instrument"]].tolist()
+		pitches = string_array[columns["pitch"]].tolist()
+		channels = columns["channel"].tolist()
+		offsets = _numbers(columns["offset"])
+		durations = _numbers(columns["duration"])
+		velocities = _numbers(columns["velocity"])
+		pitch_counts = columns["pitch_count"].tolist()
+		effect_counts = columns["effect_count"].tolist()
+
+		notes = []
+		pitch_position = 0
+		effect_position = 0
+		for row in range(note_count):
+			note_flags = flags[row]
+			if note_flags & FLAG_RAW:
+				(length,) = _U32.unpack_from(view, position)
+				position += 4
+				notes.append(json.loads(str(view[position:position + length], "utf-8")))
+				position += length
+				continue
+
+			note = {"type": types[row]}
+			if note_flags & FLAG_PITCH:
+				note["pitch"] = pitches[row]
+			if note_flags & FLAG_PITCHES:
+				end = pitch_position + pitch_counts[row]
+				note["pitches"] = chord_pitches[pitch_position:end]
+				pitch_position = end
+			note["duration"] = durations[row]
+			note["velocity"] = velocities[row]
+			note["instrument"] = instruments[row]
+			note["channel"] = channels[row]
+			note["offset"] = offsets[row]
+			if note_flags & FLAG_EFFECTS:
+				end = effect_position + effect_counts[row]
+				note["effects"] = [
+					{"type": effect_type, "value": value}
+					for effect_type, value in zip(effect_types[effect_position:end], effect_values[effect_position:end])
+				]
+				effect_position = end
+			if note_flags & FLAG_PITCH_BEND:
+				start, stop, steps = _PITCH_BEND.unpack_from(view, position)
+				position += _PITCH_BEND.size
+				note["pitch_bend"] = {"start": _number(start), "end": _number(stop), "steps": steps}
+			if note_flags & FLAG_VIBRATO:
+				depth, speed = _VIBRATO.unpack_from(view, position)
+				position += _VIBRATO.size
+				note["vibrato"] = {"depth": _number(depth), "speed": speed}
+				if note_flags & FLAG_VIBRATO_STEPS:
+					(note["vibrato"]["steps"],) = _I32.unpack_from(view, position)
+					position += _I32.size
+			if note_flags & FLAG_EXTRAS:
+				(length,) = _U32.unpack_from(view, position)
+				position += 4
+				note.update(json.loads(str(view[position:position + length], "utf-8")))
+				position += length
+			notes.append(note)
+	except (struct.error, IndexError, UnicodeDecodeError) as e:
+		raise ValueError(f"Corrupt binary composition: {e}") from e
+
+	music_data["notes"] = notes
+	return music_data
+
+def dump(music_data, path):
+	with open(path, "wb") as f:
+		f.write(dumps(music_data))
+
+def load(path):
+	with open(path, "rb") as f:
+		return loads(f.read())
+
+def is_binary(path):
+	with open(path, "rb") as f:
+		return f.read(len(MAGIC)) == MAGIC
+
+def load_composition(path):
+	"""Load a composition from either a .mcb file or a JSON file."""
+	if is_binary(path):
+		return load(path)
+	with open(path, "r", encoding="utf-8") as f:
+		return json.load(f)
+
+def convert(src, dst):
+	"""
+	Convert between JSON and binary. The direction follows `dst`: a .mcb destination
+	is written as binary, anything else as JSON.
+	"""
+	music_data = load_composition(src)
+	if dst.endswith(EXTENSION):
+		dump(music_data, dst)
+	else:
+		with open(dst, "w", encoding="utf-8") as f:
+			json.dump(music_data, f, indent=2)
+	return dst
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(prog="python -m music_composer.composition_format", description="Convert compositions between JSON and the binary .mcb format.")
+	parser.add_argument("sources", nargs="+", help="Composition files (JSON or .mcb)")
+	parser.add_argument("--to", choices=["binary", "json"], default="binary", help="Target format (default binary)")
+	parser.add_argument("-o", "--output-dir", help="Write converted files here instead of next to the sources")
+	args = parser.parse_args(argv)
+
+	extension = EXTENSION if args.to == "binary" else ".json"
+	for src in args.sources:
+		dst = os.path.splitext(src)[0] + extension
+		if args.output_dir:
+			os.makedirs(args.output_dir, exist_ok=True)
+			dst = os.path.join(args.output_dir, os.path.basename(dst))
+		convert(src, dst)
+		print(f"{src} ({os.path.getsize(src)} bytes) -> {dst} ({os.path.getsize(dst)} bytes)")
+	return 0
+
+if __name__ == "__main__":
+	raise SystemExit(main())
@@ -0,0 +1,153 @@
+import numpy as np
+from .drum_kit import DrumKit
+
+NOTE_DTYPE = np.dtype([
+	("offset", "f8"),
+	("duration", "f8"),
+	("velocity", "i2"),
+	("channel", "i1"),
+	("instrument_id", "i4"),
+	("pitch_id", "i4"),
+	("track_id", "i4")
+])
+
+# Channels a melodic instrument is moved to when it asks for the drum channel
+_MELODIC_CHANNELS = np.array([i for i in range(16) if i != DrumKit.MIDI_CHANNEL])
+
+def _pitch_key(value):
+	"""Hashable interning key for a pitch or list of pitches, or None if it cannot be interned."""
+	if isinstance(value, list):
+		value = tuple(value)
+	try:
+		hash(value)
+	except TypeError:
+		return None
+	return value
+
+class CompositionTable:
+	"""
+	Columnar view of a composition's notes as a NumPy structured array (NOTE_DTYPE).
+
+	Instrument names, pitches and tracks are interned once, so grouping, sorting and
+	offset-to-tick conversion run as array operations instead of per-note dict access.
+	`notes` keeps the source dicts in row order for per-note extras (effects, bends).
+	"""
+
+	def __init__(self, rows, notes, instruments, is_drum, pitches, track_keys):
+		self.rows = rows
+		self.notes = notes
+		self.instruments = instruments
+		self.is_drum = is_drum
+		self.pitches = pitches
+		self.track_keys = track_keys
+
+	def __len__(self):
+		return len(self.rows)
+
+	@classmethod
+	def from_notes(cls, notes):
+		"""
+		Build a table from `music_data["notes"]` in a single pass over the dicts.
+		"""
+		count = len(notes)
+		offsets = [0.0] * count
+		durations = [1.0] * count
+		velocities = [64] * count
+		channels = [0] * count
+		instrument_ids = [0] * count
+		pitch_ids = [-1] * count
+
+		instrument_index = {}
+		instruments = []
+		is_drum = []
+		pitch_index = {}
+		pitches = []
+
+		for row, note_data in enumerate(notes):
+			name = note_data.get("instrument", "acoustic_grand")
+			instrument_id = instrument_index.get(name)
+			if instrument_id is None:
+				lowered = name.lower()
+				instrument_id = instrument_index.get(lowered)
+				if instrument_id is None:
+					instrument_id = len(instruments)
+					instruments.append(lowered)
+					is_drum.append(DrumKit.is_drum(lowered))
+					instrument_index[lowered] = instrument_id
+				instrument_index[name] = instrument_id
+			instrument_ids[row] = instrument_id
+
+			offsets[row] = note_data.get("offset", 0.0)
+			durations[row] = note_data.get("duration", 1.0)
+			velocities[row] = note_data.get("velocity", 64)
+			channels[row] = note_data.get("channel", 0)
+
+			note_type = note_data.get("type")
+			if note_type == "note":
+				value = note_data.get("pitch")
+			elif note_type == "chord":
+				value = note_data.get("pitches")
+			else:
+				continue
+			key = _pitch_key(value)
+			pitch_id = pitch_index.get(key) if key is not None else None
+			if pitch_id is None:
+				pitch_id = len(pitches)
+				pitches.append(value)
+				if key is not None:
+					pitch_index[key] = pitch_id
+			pitch_ids[row] = pitch_id
+
+		rows = np.empty(count, dtype=NOTE_DTYPE)
+		rows["offset"] = np.asarray(offsets, dtype=np.float64)
+		rows["duration"] = np.asarray(durations, dtype=np.float64)
+		rows["velocity"] = np.clip(np.asarray(velocities, dtype=np.float64), 0, 127).astype(np.int16)
+		rows["instrument_id"] = instrument_ids
+		rows["pitch_id"] = pitch_ids
+
+		# 🥁 Drums always play on channel 9; melodic parts are moved off it
+		drum_rows = np.asarray(is_drum, dtype=bool)[rows["instrument_id"]] if count else np.zeros(0, dtype=bool)
+		channel = np.asarray(channels, dtype=np.float64).astype(np.int64)
+		channel[drum_rows] = DrumKit.MIDI_CHANNEL
+		moved = ~drum_rows & (channel == DrumKit.MIDI_CHANNEL)
+		if moved.any():
+			channel[moved] = np.random.choice(_MELODIC_CHANNELS, size=int(moved.sum()))
+		rows["channel"] = channel
+
+		# One track per instrument/channel, numbered in order of first appearance
+		track_codes = rows["instrument_id"].astype(np.int64) * 16 + channel
+		codes, first_rows, inverse = np.unique(track_codes, return_index=True, return_inverse=True)
+		appearance = np.argsort(first_rows, kind="stable")
+		rank = np.empty(len(codes), dtype=np.int32)
+		rank[appearance] = np.arange(len(codes), dtype=np.int32)
+		rows["track_id"] = rank[inverse.reshape(-1)]
+		track_keys = [
+			f"{instruments[int(code) // 16]}_{int(code) % 16}"
+			for code in codes[appearance]
+		]
+
+		return cls(rows, list(notes), instruments, is_drum, pitches, track_keys)
+
+	def sort_order(self):
+		"""Row order grouped by track (first appearance) and by offset within each track."""
+		return np.lexsort((self.rows["offset"], self.rows["track_id"]))
+
+	def take(self, order):
+		"""New table with rows (and source notes) in the given order."""
+		return CompositionTable(
+			self.rows[order],
+			[self.notes[i] for i in order.tolist()],
+			self.instruments,
+			self.is_drum,
+			self.pitches,
+			self.track_keys
+		)
+
+	def sorted(self):
+		return self.take(self.sort_order())
+
+	def start_ticks(self, ticks_per_beat):
+		return (self.rows["offset"] * ticks_per_beat).astype(np.int64)
+
+	def duration_ticks(self, ticks_per_beat):
+		return (self.rows["duration"] * ticks_per_beat).astype(np.int64)
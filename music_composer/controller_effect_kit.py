@@ -87,23 +87,40 @@ class ControllerEffectKit:
 		return name in cls._CONTROLLERS
 
 	@staticmethod
-	def add_effects(track, channel, note_data):
+	def effect_messages(channel, note_data):
 		"""
-		Add MIDI Control Change messages for effects using ControllerMap
+		Build MIDI Control Change messages for a note's effects using ControllerMap
 		
 		Args:
-			track: The MidiTrack to add effects to
 			channel: MIDI channel
-			effects: List of effect dictionaries
+			note_data: Note dictionary with an optional list of effect dictionaries
+
+		Returns:
+			list: control_change Messages to send at the note start
 		"""
 		effects = note_data.get("effects", None)
 		if not effects:
-			return
+			return []
 
+		messages = []
 		for effect in effects:
 			effect_type = effect.get("type")
 			value = effect.get("value", 64)
 
 			cc_number = ControllerEffectKit.get_cc_number(effect_type)
 			if cc_number != -1:
-				track.append(Message('control_change', control=cc_number, value=value, channel=channel, time=0))
+				value = max(0, min(127, int(value)))
+				messages.append(Message('control_change', control=cc_number, value=value, channel=channel, time=0))
+		return messages
+
+	@staticmethod
+	def add_effects(track, channel, note_data):
+		"""
+		Add MIDI Control Change messages for effects using ControllerMap
+		
+		Args:
+			track: The MidiTrack to add effects to
+			channel: MIDI channel
+			note_data: Note dictionary with an optional list of effect dictionaries
+		"""
+		track.extend(ControllerEffectKit.effect_messages(channel, note_data))
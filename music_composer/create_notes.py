@@ -4,10 +4,21 @@ from .instrument_kit import InstrumentKit
 import json
 from .drum_kit import DrumKit
 
-def image_notes(music_data_path, output_path):
+def image_notes(music_data, output_path):
+    """
+    Engrave a composition with LilyPond.
+
+    Args:
+        music_data: Composition dict, or the path of its JSON file
+        output_path: Base name of the image; LilyPond writes <output_path>.png
+
+    Returns:
+        str: Path of the PNG, or None if engraving failed
+    """
     try:
-        with open(music_data_path, "r") as f:
-            music_data = json.load(f)
+        if isinstance(music_data, (str, os.PathLike)):
+            with open(music_data, "r") as f:
+                music_data = json.load(f)
 
         # Create the score
         score = stream.Score()
@@ -32,7 +43,7 @@ def image_notes(music_data_path, output_path):
                     midi_program = DrumKit._PRIMARY_MAP.get(instr_name)
                     class_inst = instrument.MIDI_PROGRAM_TO_INSTRUMENT[midi_program]()
                 else:
-                    class_inst = inst_kit.get_class_map()[instr_name]()
+                    class_inst = inst_kit.get_instrument_class(instr_name)()
 
                 part = stream.Part()
                 part.insert(0, class_inst)
@@ -60,5 +71,7 @@ def image_notes(music_data_path, output_path):
             if os.path.exists(path):
                 os.remove(path)
 
+        png_path = f"{output_path}.png"
+        return png_path if os.path.exists(png_path) else None
     except:
-        pass
+        return None
@@ -0,0 +1,155 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+from collections import namedtuple
+from functools import lru_cache
+from .synth import CHANNELS, write_wav
+
+AudioFormat = namedtuple("AudioFormat", ["name", "mimetype", "extension"])
+
+FORMATS = {
+	"wav": AudioFormat("wav", "audio/wav", ".wav"),
+	"flac": AudioFormat("flac", "audio/flac", ".flac"),
+	"opus": AudioFormat("opus", "audio/ogg", ".opus"),
+	"mp3": AudioFormat("mp3", "audio/mpeg", ".mp3")
+}
+
+DEFAULT_FORMAT = "wav"
+
+def _ffmpeg_command(format_name, sample_rate, output_path, input_path=None):
+	codec = {
+		"flac": ["-c:a", "flac"],
+		"opus": ["-c:a", "libopus", "-b:a", "128k"],
+		"mp3": ["-c:a", "libmp3lame", "-q:a", "2"]
+	}[format_name]
+	if input_path:
+		source = ["-i", input_path]
+	else:
+		source = ["-f", "s16le", "-ar", str(sample_rate), "-ac", str(CHANNELS), "-i", "pipe:0"]
+	return ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", *source, *codec, output_path]
+
+def _native_command(format_name, sample_rate, output_path):
+	# Dedicated encoders reading raw little-endian 16-bit stereo PCM from stdin
+	if format_name == "flac":
+		return ["flac", "--silent", "--force", "--force-raw-format", "--endian=little", "--sign=signed",
+			f"--channels={CHANNELS}", "--bps=16", f"--sample-rate={sample_rate}", "-o", output_path, "-"]
+	if format_name == "opus":
+		return ["opusenc", "--quiet", "--raw", "--raw-rate", str(sample_rate), "--raw-chan", str(CHANNELS),
+			"--raw-bits", "16", "--bitrate", "128", "-", output_path]
+	if format_name == "mp3":
+		return ["lame", "--quiet", "-r", "-s", f"{sample_rate / 1000:g}", "--bitwidth", "16", "--signed",
+			"--little-endian", "-m", "j", "-V", "2", "-", output_path]
+	return None
+
+@lru_cache(maxsize=None)
+def _encoder_binary(format_name):
+	"""Name of the installed encoder for a format: the dedicated tool, else ffmpeg."""
+	native = {"flac": "flac", "opus": "opusenc", "mp3": "lame"}.get(format_name)
+	if native and shutil.which(native):
+		return native
+	if shutil.which("ffmpeg"):
+		return "ffmpeg"
+	return None
+
+def get_format(format_name):
+	"""
+	Returns:
+		AudioFormat: The format, or None if it is not supported
+	"""
+	return FORMATS.get((format_name or DEFAULT_FORMAT).lower())
+
+def format_available(format_name):
+	"""True if files in this format can be produced on this machine."""
+	audio_format = get_format(format_name)
+	if audio_format is None:
+		return False
+	return audio_format.name == "wav" or _encoder_binary(audio_format.name) is not None
+
+def available_formats():
+	return [name for name in FORMATS if format_available(name)]
+
+def encoder_command(format_name, sample_rate, output_path):
+	"""
+	Command that reads raw PCM on stdin and writes `output_path`.
+
+	Raises:
+		ValueError: If the format is unknown or no encoder for it is installed
+	"""
+	binary = _encoder_binary(format_name) if format_name in FORMATS and format_name != "wav" else None
+	if binary is None:
+		raise ValueError(f"No encoder available for {format_name}")
+	if binary == "ffmpeg":
+		return _ffmpeg_command(format_name, sample_rate, output_path)
+	return _native_command(format_name, sample_rate, output_path)
+
+def encode_blocks(pcm_blocks, format_name, sample_rate, output_path):
+	"""
+	Encode interleaved int16 stereo blocks as they are produced. The blocks are piped
+	straight into the encoder, so no intermediate WAV is written.
+
+	Args:
+		pcm_blocks: Iterable of numpy int16 arrays or bytes (e.g. InProcessSynth.iter_blocks)
+		format_name: One of FORMATS
+		sample_rate: Sample rate of the PCM
+		output_path: File to write
+
+	Returns:
+		str: output_path
+	"""
+	if format_name == "wav":
+		write_wav(output_path, pcm_blocks, sample_rate)
+		return output_path
+
+	command = encoder_command(format_name, sample_rate, output_path)
+	# stderr goes to a file: an encoder blocked on a full stderr pipe would stop reading stdin
+	with tempfile.TemporaryFile() as stderr:
+		process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+		try:
+			for block in pcm_blocks:
+				process.stdin.write(block.tobytes() if hasattr(block, "tobytes") else block)
+			process.stdin.close()
+		except BrokenPipeError:
+			pass
+		except BaseException:
+			process.kill()
+			process.wait()
+			raise
+		if process.wait() != 0:
+			stderr.seek(0)
+			raise ValueError(f"{command[0]} failed to encode {format_name}: {stderr.read().decode(errors='replace').strip()}")
+	return output_path
+
+def iter_wav_blocks(path, block_frames=4096):
+	"""Yield the PCM of a 16-bit WAV file in blocks of raw bytes."""
+	with wave.open(path, "rb") as wav:
+		while True:
+			data = wav.readframes(block_frames)
+			if not data:
+				return
+			yield data
+
+def transcode(input_path, format_name, output_path):
+	"""
+	Convert a rendered file to another format. WAV input is piped into the encoder
+	block by block; any other input needs ffmpeg.
+
+	Returns:
+		str: output_path
+	"""
+	if input_path.endswith(".wav"):
+		with wave.open(input_path, "rb") as wav:
+			sample_rate = wav.getframerate()
+			if wav.getnchannels() != CHANNELS or wav.getsampwidth() != 2:
+				raise ValueError(f"Unsupported WAV layout in {input_path}")
+		return encode_blocks(iter_wav_blocks(input_path), format_name, sample_rate, output_path)
+
+	if not shutil.which("ffmpeg"):
+		raise ValueError(f"ffmpeg is required to convert {os.path.basename(input_path)} to {format_name}")
+	if format_name == "wav":
+		command = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", input_path, "-c:a", "pcm_s16le", output_path]
+	else:
+		command = _ffmpeg_command(format_name, None, output_path, input_path=input_path)
+	subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+	return output_path
@@ -0,0 +1,84 @@
+import os
+import threading
+from contextlib import contextmanager
+
+DEFAULT_MODEL_NAME = "gemini-2.0-flash"
+
+class ComposerPool:
+	"""
+	Bounded pool of warm MusicComposer engines keyed by model name.
+
+	A composer is handed to one caller at a time, so the model client is never shared
+	between concurrent generations. At most `max_size` engines exist per model; callers
+	block until one is returned when all of them are busy.
+	"""
+
+	def __init__(self, max_size=4, factory=None, **composer_kwargs):
+		"""
+		Args:
+			max_size: Maximum number of engines per model name
+			factory: Callable(model_name) -> composer. Defaults to MusicComposer
+			composer_kwargs: Extra keyword arguments for the default factory
+		"""
+		if max_size < 1:
+			raise ValueError("max_size must be at least 1")
+		self.max_size = max_size
+		self.__factory = factory or self.__default_factory
+		self.__composer_kwargs = composer_kwargs
+		self.__condition = threading.Condition()
+		self.__idle = {}
+		self.__created = {}
+
+	def __default_factory(self, model_name):
+		from .main import MusicComposer
+		return MusicComposer(model_name=model_name, **self.__composer_kwargs)
+
+	def __checkout(self, model_name, timeout):
+		with self.__condition:
+			idle = self.__idle.setdefault(model_name, [])
+			while not idle and self.__created.get(model_name, 0) >= self.max_size:
+				if not self.__condition.wait(timeout=timeout):
+					raise TimeoutError(f"No composer available for model {model_name}")
+			if idle:
+				return idle.pop()
+			self.__created[model_name] = self.__created.get(model_name, 0) + 1
+
+		try:
+			return self.__factory(model_name)
+		except Exception:
+			with self.__condition:
+				self.__created[model_name] -= 1
+				self.__condition.notify()
+			raise
+
+	def __checkin(self, model_name, composer):
+		with self.__condition:
+			self.__idle[model_name].append(composer)
+			self.__condition.notify()
+
+	@contextmanager
+	def acquire(self, model_name=None, timeout=None):
+		"""
+		Borrow a composer for one generation.
+
+		Args:
+			model_name: Gemini model name. Defaults to MODEL_NAME or gemini-2.0-flash
+			timeout: Seconds to wait for a free engine. None waits forever
+
+		Yields:
+			MusicComposer: An engine reserved for the caller until the block exits
+		"""
+		model_name = model_name or os.getenv("MODEL_NAME", DEFAULT_MODEL_NAME)
+		composer = self.__checkout(model_name, timeout)
+		try:
+			yield composer
+		finally:
+			self.__checkin(model_name, composer)
+
+	def stats(self):
+		"""Number of engines created and idle per model name."""
+		with self.__condition:
+			return {
+				model_name: {"created": created, "idle": len(self.__idle.get(model_name, []))}
+				for model_name, created in self.__created.items()
+			}
@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from custom_logger import logger_config
+
+class Job:
+	"""
+	One queued generation. Status moves pending -> running -> done | failed, and `stage`
+	names the pipeline step currently running.
+	"""
+	PENDING = "pending"
+	RUNNING = "running"
+	DONE = "done"
+	FAILED = "failed"
+
+	def __init__(self, job_id, params):
+		self.id = job_id
+		self.params = params
+		self.status = Job.PENDING
+		self.stage = None
+		self.result = None
+		self.error = None
+		self.created_at = time.time()
+		self.started_at = None
+		self.finished_at = None
+
+	def set_stage(self, stage):
+		self.stage = stage
+
+	@property
+	def finished(self):
+		return self.status in (Job.DONE, Job.FAILED)
+
+	def to_dict(self):
+		return {
+			"job_id": self.id,
+			"status": self.status,
+			"stage": self.stage,
+			"error": self.error,
+			"created_at": self.created_at,
+			"started_at": self.started_at,
+			"finished_at": self.finished_at
+		}
+
+class JobManager:
+	"""
+	Runs generation jobs on a pool of worker threads and keeps their status for polling.
+
+	The pipeline is dominated by the model call and the LilyPond/fluidsynth subprocesses,
+	so threads are enough to keep many compositions in flight.
+	"""
+
+	def __init__(self, runner, max_workers=None, max_jobs=1000):
+		"""
+		Args:
+			runner: Callable(job) that runs the pipeline and returns the job result
+			max_workers: Worker threads. Defaults to MUSIC_COMPOSER_WORKERS or 2
+			max_jobs: Finished jobs kept for polling before the oldest are dropped
+		"""
+		self.__runner = runner
+		self.max_workers = max_workers or int(os.getenv("MUSIC_COMPOSER_WORKERS", 2))
+		self.max_jobs = max_jobs
+		self.__executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="music-job")
+		self.__jobs = OrderedDict()
+		self.__lock = threading.Lock()
+
+	def submit(self, **params):
+		"""Queue a job and return it immediately."""
+		job = Job(uuid.uuid4().hex, params)
+		with self.__lock:
+			self.__jobs[job.id] = job
+			self.__prune()
+		self.__executor.submit(self.__run, job)
+		return job
+
+	def get(self, job_id):
+		with self.__lock:
+			return self.__jobs.get(job_id)
+
+	def __prune(self):
+		excess = len(self.__jobs) - self.max_jobs
+		if excess <= 0:
+			return
+		for job_id in [job_id for job_id, job in self.__jobs.items() if job.finished][:excess]:
+			del self.__jobs[job_id]
+
+	def __run(self, job):
+		job.status = Job.RUNNING
+		job.started_at = time.time()
+		try:
+			job.result = self.__runner(job)
+			job.status = Job.DONE
+		except Exception as e:
+			logger_config.error(f"Job {job.id} failed at stage {job.stage}: {e} {traceback.format_exc()}", play_sound=False)
+			job.error = str(e)
+			job.status = Job.FAILED
+		finally:
+			job.finished_at = time.time()
+
+	def shutdown(self, wait=True):
+		self.__executor.shutdown(wait=wait)
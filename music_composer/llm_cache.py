@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from custom_logger import logger_config
+
+def _sha256(text) -> str:
+	return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def schema_hash(schema) -> str:
+	"""Hash a genai Schema (or any JSON-serialisable schema description)."""
+	if hasattr(schema, "model_dump_json"):
+		return _sha256(schema.model_dump_json(exclude_none=True))
+	return _sha256(json.dumps(schema, sort_keys=True, default=str))
+
+class ResponseCache:
+	"""
+	Two-tier cache of model responses: an in-memory LRU in front of one JSON file per
+	entry on disk. Entries expire `ttl` seconds after they were stored, and the disk
+	tier evicts least recently used files once it grows beyond `max_bytes`.
+
+	Keys cover everything that shapes the answer: prompt, instruments, model name,
+	system prompt and response schema.
+	"""
+
+	def __init__(self, root=None, max_entries=None, ttl=None, persist=True, max_bytes=None):
+		"""
+		Args:
+			root: Disk tier directory. Defaults to <MUSIC_COMPOSER_BASE_PATH>/llm_cache
+			max_entries: In-memory entries. Defaults to MUSIC_COMPOSER_LLM_CACHE_SIZE or 256
+			ttl: Seconds an entry stays valid. Defaults to MUSIC_COMPOSER_LLM_CACHE_TTL or 1 day
+			persist: Keep a disk tier that survives restarts
+			max_bytes: Disk tier size budget. Defaults to MUSIC_COMPOSER_LLM_CACHE_MAX_BYTES or 64 MiB
+		"""
+		base_path = os.getenv("MUSIC_COMPOSER_BASE_PATH", os.path.dirname(os.path.abspath(__file__)))
+		self.root = root or os.path.join(base_path, "llm_cache")
+		self.max_entries = int(max_entries or os.getenv("MUSIC_COMPOSER_LLM_CACHE_SIZE", 256))
+		self.ttl = float(ttl if ttl is not None else os.getenv("MUSIC_COMPOSER_LLM_CACHE_TTL", 24 * 60 * 60))
+		self.max_bytes = int(max_bytes or os.getenv("MUSIC_COMPOSER_LLM_CACHE_MAX_BYTES", 64 * 1024 ** 2))
+		self.persist = persist
+
+		self.memory_hits = 0
+		self.disk_hits = 0
+		self.misses = 0
+		self.__lock = threading.Lock()
+		self.__memory = OrderedDict()
+		# Disk tier index in recency order; recency survives restarts through the file mtime
+		self.__disk = OrderedDict()
+		self.__disk_bytes = 0
+		if self.persist:
+			os.makedirs(self.root, exist_ok=True)
+			entries = []
+			for filename in os.listdir(self.root):
+				path = os.path.join(self.root, filename)
+				if not filename.startswith(".") and filename.endswith(".json") and os.path.isfile(path):
+					entries.append((os.path.getmtime(path), filename[:-len(".json")], os.path.getsize(path)))
+			for _, key, size in sorted(entries):
+				self.__disk[key] = size
+				self.__disk_bytes += size
+		self.purge_expired()
+
+	@staticmethod
+	def key(user_prompt, instruments, model_name, system_instruction, schema) -> str:
+		parts = [
+			user_prompt,
+			json.dumps(list(instruments or [])),
+			model_name,
+			_sha256(system_instruction),
+			schema_hash(schema)
+		]
+		return _sha256("\x1f".join(parts))
+
+	def __disk_path(self, key):
+		return os.path.join(self.root, f"{key}.json")
+
+	def __remember(self, key, created_at, response):
+		self.__memory[key] = (created_at, response)
+		self.__memory.move_to_end(key)
+		while len(self.__memory) > self.max_entries:
+			self.__memory.popitem(last=False)
+
+	def __forget(self, key):
+		size = self.__disk.pop(key, None)
+		if size is not None:
+			self.__disk_bytes -= size
+
+	def __remove(self, key):
+		with self.__lock:
+			self.__forget(key)
+		try:
+			os.remove(self.__disk_path(key))
+			return True
+		except OSError:
+			return False
+
+	def __evict(self):
+		while self.__disk_bytes > self.max_bytes and len(self.__disk) > 1:
+			key, size = self.__disk.popitem(last=False)
+			self.__disk_bytes -= size
+			try:
+				os.remove(self.__disk_path(key))
+			except OSError:
+				pass
+
+	def __read_disk(self, key):
+		try:
+			with open(self.__disk_path(key), "r", encoding="utf-8") as f:
+				entry = json.load(f)
+			return entry["created_at"], entry["response"]
+		except (OSError, ValueError, KeyError):
+			return None
+
+	def get(self, key):
+		"""
+		Returns:
+			str: The cached raw response, or None on a miss or expired entry
+		"""
+		now = time.time()
+		with self.__lock:
+			entry = self.__memory.get(key)
+			if entry and now - entry[0] <= self.ttl:
+				self.__memory.move_to_end(key)
+				if key in self.__disk:
+					self.__disk.move_to_end(key)
+				self.memory_hits += 1
+				return entry[1]
+			self.__memory.pop(key, None)
+
+		entry = self.__read_disk(key) if self.persist else None
+		with self.__lock:
+			if entry and now - entry[0] <= self.ttl:
+				self.__remember(key, *entry)
+				if key in self.__disk:
+					self.__disk.move_to_end(key)
+					try:
+						os.utime(self.__disk_path(key))
+					except OSError:
+						pass
+				self.disk_hits += 1
+				return entry[1]
+			self.misses += 1
+
+		if entry:
+			self.__remove(key)
+		return None
+
+	def put(self, key, response):
+		created_at = time.time()
+		with self.__lock:
+			self.__remember(key, created_at, response)
+
+		if not self.persist:
+			return
+		tmp_path = os.path.join(self.root, f".{key}.{uuid.uuid4().hex}.tmp")
+		try:
+			with open(tmp_path, "w", encoding="utf-8") as f:
+				json.dump({"created_at": created_at, "response": response}, f)
+			size = os.path.getsize(tmp_path)
+			with self.__lock:
+				os.replace(tmp_path, self.__disk_path(key))
+				self.__forget(key)
+				self.__disk[key] = size
+				self.__disk_bytes += size
+				self.__evict()
+		except OSError as e:
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+			logger_config.warning(f"Failed to persist model response {key}: {e}")
+
+	def purge_expired(self):
+		"""Delete expired entries from the disk tier. Returns the number removed."""
+		if not self.persist:
+			return 0
+		removed = 0
+		now = time.time()
+		for filename in os.listdir(self.root):
+			if filename.startswith(".") or not filename.endswith(".json"):
+				continue
+			key = filename[:-len(".json")]
+			entry = self.__read_disk(key)
+			if (entry is None or now - entry[0] > self.ttl) and self.__remove(key):
+				removed += 1
+		return removed
+
+	def stats(self):
+		with self.__lock:
+			return {
+				"hits": self.memory_hits + self.disk_hits,
+				"memory_hits": self.memory_hits,
+				"disk_hits": self.disk_hits,
+				"misses": self.misses,
+				"memory_entries": len(self.__memory),
+				"disk_entries": len(self.__disk),
+				"disk_bytes": self.__disk_bytes
+			}
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_response_cache():
+	"""
+	Process-wide response cache when MUSIC_COMPOSER_LLM_CACHE is enabled (1/true), else None.
+	"""
+	global _default_cache
+	if os.getenv("MUSIC_COMPOSER_LLM_CACHE", "0").lower() not in ("1", "true", "yes"):
+		return None
+	with _default_cache_lock:
+		if _default_cache is None:
+			_default_cache = ResponseCache()
+		return _default_cache
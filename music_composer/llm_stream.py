@@ -0,0 +1,83 @@
+import json
+import os
+import time
+
+class GeminiStreamingClient:
+	"""
+	Streams a structured Gemini response as text chunks (generate_content_stream).
+	"""
+
+	def __init__(self, model_name, system_instruction, api_key=None):
+		"""
+		Args:
+			model_name: Gemini model
+			system_instruction: System prompt
+			api_key: Defaults to the first of GEMINI_API_KEYS, else the SDK's own lookup
+		"""
+		from google import genai
+		self.model_name = model_name
+		self.system_instruction = system_instruction
+		api_key = api_key or os.getenv("GEMINI_API_KEYS", "").split(",")[0].strip() or None
+		self.__client = genai.Client(api_key=api_key) if api_key else genai.Client()
+
+	def stream(self, user_prompt, schema):
+		"""
+		Yields:
+			str: Response text as it arrives
+		"""
+		from google import genai
+		config = genai.types.GenerateContentConfig(
+			system_instruction=self.system_instruction,
+			response_mime_type="application/json",
+			response_schema=schema
+		)
+		for chunk in self.__client.models.generate_content_stream(model=self.model_name, contents=user_prompt, config=config):
+			if chunk.text:
+				yield chunk.text
+
+class FakeStreamingClient:
+	"""
+	Stand-in for GeminiStreamingClient that replays a fixed response, for tests and
+	benchmarks that must not call the model.
+	"""
+
+	def __init__(self, response, chunk_size=64, delay=0.0):
+		"""
+		Args:
+			response: Composition dict or its JSON text
+			chunk_size: Characters per yielded chunk
+			delay: Seconds to sleep before each chunk, to mimic generation latency
+		"""
+		self.response = response if isinstance(response, str) else json.dumps(response)
+		self.chunk_size = chunk_size
+		self.delay = delay
+		self.calls = []
+
+	def stream(self, user_prompt, schema=None):
+		self.calls.append(user_prompt)
+		for start in range(0, len(self.response), self.chunk_size):
+			if self.delay:
+				time.sleep(self.delay)
+			yield self.response[start:start + self.chunk_size]
+
+class FakeGeminiWrapper:
+	"""
+	Stand-in for gemiwrap.GeminiWrapper that returns a fixed response, for tests and
+	benchmarks that must not call the model.
+	"""
+
+	def __init__(self, response, delay=0.0):
+		"""
+		Args:
+			response: Composition dict or its JSON text
+			delay: Seconds to sleep per call, to mimic generation latency
+		"""
+		self.response = response if isinstance(response, str) else json.dumps(response)
+		self.delay = delay
+		self.calls = []
+
+	def send_message(self, user_prompt, schema=None):
+		self.calls.append(user_prompt)
+		if self.delay:
+			time.sleep(self.delay)
+		return [self.response]
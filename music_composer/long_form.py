@@ -0,0 +1,246 @@
+"""
+Long-form compositions, generated section by section.
+
+One model response is capped by the output token limit, and its generation time grows
+with the length of the piece. A long-form piece is instead produced in two steps:
+
+1. The model writes a short section plan: name, key, tempo, time signature, mood and
+   bar range of each section.
+2. Every section is composed on its own, concurrently, through a ComposerPool, and
+   the sections are stitched into one timeline by shifting their note offsets.
+
+The piece then takes about as long as its slowest section. The stitched composition
+keeps a "sections" list, from which the MIDI compiler writes tempo, time and key
+signature changes at each section start.
+"""
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from custom_logger import logger_config
+from . import metrics
+from .batch import SharedBackoff, is_rate_limited
+from .engine_pool import ComposerPool, DEFAULT_MODEL_NAME
+from .pitch_table import normalize_key
+
+DEFAULT_SECONDS = 300
+DEFAULT_MAX_SECTIONS = 8
+# A section should fit well within one response
+TARGET_SECTION_SECONDS = 40
+# Key names as the MIDI key_signature meta message takes them (see pitch_table.MIDI_KEYS)
+KEY_FORMAT = 'Tonic with "#" or "b", plus "m" for minor, e.g. "C", "Am", "F#m", "Bb"'
+
+def _plan_schema():
+	from google import genai
+	string = genai.types.Schema(type=genai.types.Type.STRING)
+	number = genai.types.Schema(type=genai.types.Type.NUMBER)
+	integer = genai.types.Schema(type=genai.types.Type.INTEGER)
+	key = genai.types.Schema(type=genai.types.Type.STRING, description=KEY_FORMAT)
+	return genai.types.Schema(
+		type = genai.types.Type.OBJECT,
+		required = ["genre", "mood", "sections"],
+		properties = {
+			"key_signature": key,
+			"genre": string,
+			"mood": string,
+			"sections": genai.types.Schema(
+				type = genai.types.Type.ARRAY,
+				items = genai.types.Schema(
+					type = genai.types.Type.OBJECT,
+					required = ["name", "key_signature", "tempo", "time_signature", "mood", "start_bar", "end_bar"],
+					properties = {
+						"name": string,
+						"key_signature": key,
+						"tempo": number,
+						"time_signature": string,
+						"mood": string,
+						"start_bar": integer,
+						"end_bar": integer,
+						"description": string,
+					},
+				),
+			),
+		},
+	)
+
+def beats_per_bar(time_signature):
+	"""Quarter-note beats (the unit of note offsets) in one bar of a time signature."""
+	try:
+		numerator, denominator = map(int, str(time_signature).split("/"))
+		if numerator > 0 and denominator > 0:
+			return numerator * 4 / denominator
+	except ValueError:
+		pass
+	return 4.0
+
+def plan_prompt(user_prompt, duration_seconds, max_sections):
+	return f"""{user_prompt}
+
+	Do not write notes yet. Plan a piece of about {round(duration_seconds)} seconds as
+	at most {max_sections} consecutive sections (for example intro, themes, bridge, outro).
+	Give the key_signature of the whole piece, and for each section its name,
+	key_signature, tempo in BPM, time_signature, mood, start_bar and end_bar (inclusive,
+	the first section starts at bar 1) and a one sentence description of its musical
+	content. Write keys as a tonic with "#" or "b" and "m" for minor, e.g. "C", "Am",
+	"F#m" or "Bb", never "C major". Keep the sections one coherent piece."""
+
+def normalize_plan(plan, max_sections=DEFAULT_MAX_SECTIONS):
+	"""
+	Order the planned sections and fill in missing or invalid fields. Keys are
+	normalised to the names MIDI key signatures take ("A minor" becomes "Am"); a
+	section key that is not recognised falls back to the key of the piece.
+
+	Returns:
+		list: Section dicts with name, key_signature, tempo, time_signature, mood,
+		description and bars (at least 1)
+	"""
+	sections = []
+	raw_sections = sorted(plan.get("sections") or [], key=lambda section: int(section.get("start_bar", 0) or 0))
+	section_keys = [normalize_key(section.get("key_signature")) for section in raw_sections]
+	piece_key = normalize_key(plan.get("key_signature")) or next(filter(None, section_keys), None) or "C"
+	for index, section in enumerate(raw_sections[:max_sections]):
+		start_bar = int(section.get("start_bar", 1) or 1)
+		end_bar = int(section.get("end_bar", start_bar) or start_bar)
+		try:
+			tempo = min(300.0, max(20.0, float(section.get("tempo") or 90)))
+		except (TypeError, ValueError):
+			tempo = 90.0
+		sections.append({
+			"name": str(section.get("name") or f"section {index + 1}"),
+			"key_signature": section_keys[index] or piece_key,
+			"tempo": tempo,
+			"time_signature": section.get("time_signature") or "4/4",
+			"mood": section.get("mood") or plan.get("mood", ""),
+			"description": section.get("description", ""),
+			"bars": max(1, end_bar - start_bar + 1)
+		})
+	return sections
+
+def section_prompt(user_prompt, sections, index):
+	section = sections[index]
+	beats = section["bars"] * beats_per_bar(section["time_signature"])
+	context = []
+	if index > 0:
+		context.append(f"It follows the section \"{sections[index - 1]['name']}\" ({sections[index - 1]['mood']}).")
+	if index < len(sections) - 1:
+		context.append(f"It leads into the section \"{sections[index + 1]['name']}\" ({sections[index + 1]['mood']}).")
+	return f"""{user_prompt}
+
+	Write only section {index + 1} of {len(sections)} of a longer piece: "{section['name']}".
+	{section['description']}
+	Key {section['key_signature']}, {section['tempo']:g} BPM, {section['time_signature']}, mood: {section['mood']}.
+	It is {section['bars']} bars long: note offsets start at 0 and the last note ends by
+	offset {beats:g}. {' '.join(context)}"""
+
+def stitch(plan, sections, compositions):
+	"""
+	Join section compositions into one timeline.
+
+	Each section starts where the previous one ended: after its planned bars, or after
+	its last note (rounded up to a whole bar) if it ran longer, so sections never overlap.
+
+	Args:
+		plan: The model's plan (genre and mood of the piece)
+		sections: Normalised sections (see normalize_plan)
+		compositions: One composition per section, offsets starting at 0
+
+	Returns:
+		dict: The composition, with a "sections" list of name, offset, bars, tempo,
+		key_signature, time_signature and mood
+	"""
+	notes = []
+	placed = []
+	offset = 0.0
+	for section, composition in zip(sections, compositions):
+		bar_beats = beats_per_bar(section["time_signature"])
+		section_notes = composition.get("notes") or []
+		end = max((float(note.get("offset", 0)) + float(note.get("duration", 1)) for note in section_notes), default=0.0)
+		bars = max(section["bars"], math.ceil(end / bar_beats - 1e-9))
+		for note in section_notes:
+			notes.append({**note, "offset": offset + float(note.get("offset", 0))})
+		placed.append({
+			"name": section["name"],
+			"offset": offset,
+			"bars": bars,
+			"tempo": section["tempo"],
+			"key_signature": section["key_signature"],
+			"time_signature": section["time_signature"],
+			"mood": section["mood"]
+		})
+		offset += bars * bar_beats
+
+	first = placed[0]
+	return {
+		"key_signature": first["key_signature"],
+		"tempo": first["tempo"],
+		"time_signature": first["time_signature"],
+		"genre": plan.get("genre", ""),
+		"mood": plan.get("mood", ""),
+		"sections": placed,
+		"notes": notes
+	}
+
+def compose_long_form(user_prompt, instruments=None, duration_seconds=None, max_sections=None, composer_pool=None, model_name=None, concurrency=None, use_cache=True, max_retries=5, on_stage=None):
+	"""
+	Compose a long piece as a plan of sections generated concurrently.
+
+	Args:
+		user_prompt: Text description of the desired music
+		instruments: Optional list of instrument names to restrict the model to
+		duration_seconds: Target length. Defaults to MUSIC_COMPOSER_LONG_FORM_SECONDS or 300
+		max_sections: Most sections the plan may have. Defaults to MUSIC_COMPOSER_LONG_FORM_MAX_SECTIONS or 8
+		composer_pool: ComposerPool for the model calls. Section calls are limited by its size
+		model_name: Gemini model. Defaults to MODEL_NAME or DEFAULT_MODEL_NAME
+		concurrency: Concurrent section calls. Defaults to the pool size
+		use_cache: Set to False to ask the model again even if a response is cached
+		max_retries: Retries of a rate-limited model call before the piece fails
+		on_stage: Optional callback called with "plan" and "sections" as they start
+
+	Returns:
+		dict: The stitched composition, ready for generate_music(music_data=...)
+	"""
+	on_stage = on_stage or (lambda stage: None)
+	duration_seconds = float(duration_seconds or os.getenv("MUSIC_COMPOSER_LONG_FORM_SECONDS", DEFAULT_SECONDS))
+	max_sections = int(max_sections or os.getenv("MUSIC_COMPOSER_LONG_FORM_MAX_SECTIONS", DEFAULT_MAX_SECTIONS))
+	# Enough sections that each one stays a normal-sized response
+	max_sections = max(1, min(max_sections, math.ceil(duration_seconds / TARGET_SECTION_SECONDS)))
+	model_name = model_name or os.getenv("MODEL_NAME", DEFAULT_MODEL_NAME)
+	composer_pool = composer_pool or ComposerPool()
+	concurrency = max(1, min(concurrency or composer_pool.max_size, max_sections))
+	backoff = SharedBackoff()
+
+	def call(describe, request):
+		for attempt in range(max_retries + 1):
+			backoff.wait()
+			try:
+				with composer_pool.acquire(model_name) as composer:
+					return request(composer)
+			except Exception as e:
+				if not is_rate_limited(e) or attempt == max_retries:
+					raise
+				delay = backoff.penalize(attempt)
+				logger_config.warning(f"Rate limited on {describe}, backing off {delay:.1f}s.")
+
+	try:
+		on_stage("plan")
+		with metrics.stage("plan"):
+			plan = call("the section plan", lambda composer: composer.request_json(plan_prompt(user_prompt, duration_seconds, max_sections), _plan_schema(), use_cache=use_cache))
+		sections = normalize_plan(plan, max_sections)
+		if not sections:
+			raise ValueError("The plan has no sections")
+		logger_config.info(f"Planned {len(sections)} sections: {', '.join(section['name'] for section in sections)}.")
+
+		on_stage("sections")
+		started = time.perf_counter()
+		with metrics.stage("sections"):
+			with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="long-form") as executor:
+				futures = [
+					executor.submit(call, f"section {index + 1}", lambda composer, index=index: composer.compose(section_prompt(user_prompt, sections, index), instruments=instruments, use_cache=use_cache))
+					for index in range(len(sections))
+				]
+				compositions = [future.result() for future in futures]
+		logger_config.info(f"Composed {len(sections)} sections in {time.perf_counter() - started:.1f}s.")
+		return stitch(plan, sections, compositions)
+	except Exception as e:
+		logger_config.error(f"Failed to compose long-form music: {str(e)}")
+		raise ValueError(f"Failed to compose long-form music: {str(e)}") from e
@@ -1,37 +1,69 @@
 from custom_logger import logger_config
-from mido import Message, MidiFile, MidiTrack, MetaMessage, bpm2tempo
-from music21 import chord, note
-import subprocess
 import os
-from google import genai
-from gemiwrap import GeminiWrapper
+import importlib
 import json
 import traceback
-from .drum_kit import DrumKit
-from .instrument_kit import InstrumentKit
-from .controller_effect_kit import ControllerEffectKit
-from .pitch_bend_kit import PitchEffectKit
-import random
-from .create_notes import image_notes
+from .score_renderer import get_default_score_renderer
+from .render_cache import RenderCache, get_default_render_cache, unlink_output
+from .llm_cache import ResponseCache, get_default_response_cache
+from .stream_parser import IncrementalNoteParser
+from .synth import SubprocessSynth, get_synth, iter_file, wav_header
+from .encoders import FORMATS, encode_blocks, get_format, transcode
+from . import metrics
+from .profiling import active_session
+import wave
+from functools import lru_cache
+
+SYSTEM_PROMPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "system_prompt.txt")
+
+@lru_cache(maxsize=None)
+def _read_system_prompt():
+	with open(SYSTEM_PROMPT_PATH, 'r', encoding='utf-8') as file:
+		return file.read()
+
+@lru_cache(maxsize=16)
+def _render_system_instruction(template):
+	from .instrument_kit import InstrumentKit
+	instrument_json = json.dumps(InstrumentKit().get_midi_map(), indent=4)
+	return template.replace("####INSTRUMENTS####", instrument_json)
+
+# Imported by the stage that needs them rather than with the package
+DEFERRED_MODULES = (
+	"google.genai",
+	"gemiwrap",
+	"music_composer.composition_table",
+	"music_composer.midi_compiler",
+	"music_composer.composition_format",
+	"music_composer.parallel_render"
+)
+
+def warm_up():
+	"""
+	Import the deferred dependencies and build the instrument registry, e.g. from a
+	background thread once a server is up, so the first generation does not pay for them.
+	"""
+	for module in DEFERRED_MODULES:
+		try:
+			importlib.import_module(module)
+		except ImportError as e:
+			logger_config.warning(f"Could not preload {module}: {e}")
+	_render_system_instruction(_read_system_prompt())
 
 class MusicComposer:
+	"""
+	Composition engine. An instance holds only configuration and the model client, so it
+	can be reused for any number of generations (one at a time, see ComposerPool).
+	"""
 
-	def __init__(self, model_name="gemini-2.0-flash", system_instruction=None, piano_type="acoustic_grand", duration=480, soundfont_path=None, instruments=None):
+	def __init__(self, model_name="gemini-2.0-flash", system_instruction=None, piano_type="acoustic_grand", duration=480, soundfont_path=None, instruments=None, sample_rate=44100, render_cache=None, response_cache=None, synth_backend=None, parallel_render=None, score_renderer=None, stream_response=None, stream_client=None, save_format=None, llm_client=None, segment_cache=None):
 		self.__set_writable_path()
 		self.__model_name = model_name
-		self.__system_instruction = system_instruction
-		if not self.__system_instruction:
-			file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "system_prompt.txt")
-			with open(file_path, 'r', encoding='utf-8') as file:
-				self.__system_instruction = file.read()
-
-		instrument_json = json.dumps(InstrumentKit().get_midi_map(), indent=4)
-		self.__system_instruction = self.__system_instruction.replace("####INSTRUMENTS####", instrument_json)
-
-		self.__geminiWrapper = GeminiWrapper(
-			model_name=self.__model_name,
-			system_instruction=self.__system_instruction
-		)
+		# Rendered with the instrument list on first use, which loads music21
+		self.__system_prompt = system_instruction or _read_system_prompt()
+
+		# Created on the first model call, so render-only engines (batch workers) never build a client.
+		# llm_client replaces GeminiWrapper (e.g. llm_stream.FakeGeminiWrapper for offline runs)
+		self.__geminiWrapper = llm_client
 		if soundfont_path:
 			self.__soundfont_path = soundfont_path
 		else:
@@ -40,7 +72,34 @@ class MusicComposer:
 
 		self.__piano_type = piano_type
 		self.__duration = duration
+		self.__sample_rate = sample_rate
+		# "inprocess", "subprocess" or "auto"; defaults to MUSIC_COMPOSER_SYNTH
+		self.__synth_backend = synth_backend
+		# Render each track in its own process and mix with NumPy; defaults to MUSIC_COMPOSER_PARALLEL_RENDER
+		if parallel_render is None:
+			parallel_render = os.getenv("MUSIC_COMPOSER_PARALLEL_RENDER", "0").lower() in ("1", "true", "yes")
+		self.__parallel_render = parallel_render
+		# None uses the process-wide cache, False disables caching
+		self.__render_cache = get_default_render_cache() if render_cache is None else (render_cache or None)
+		# Model responses are only cached when enabled (MUSIC_COMPOSER_LLM_CACHE or an explicit cache)
+		self.__response_cache = get_default_response_cache() if response_cache is None else (response_cache or None)
+		# Score images are engraved in the background; None uses the shared renderer, False disables them
+		self.__score_renderer = get_default_score_renderer() if score_renderer is None else (score_renderer or None)
+		# Consume the model response incrementally and compile notes as they arrive;
+		# defaults to MUSIC_COMPOSER_LLM_STREAM. stream_client replaces the Gemini client (e.g. FakeStreamingClient)
+		if stream_response is None:
+			stream_response = stream_client is not None or os.getenv("MUSIC_COMPOSER_LLM_STREAM", "0").lower() in ("1", "true", "yes")
+		self.__stream_response = stream_response
+		self.__stream_client = stream_client
+		# "json" or "binary" (compact .mcb, see composition_format); defaults to MUSIC_COMPOSER_SAVE_FORMAT
+		self.__save_format = (save_format or os.getenv("MUSIC_COMPOSER_SAVE_FORMAT", "json")).lower()
 		self.__instruments = instruments or [{"type": "acoustic_grand", "channel": 0}]
+		# Re-render only the time windows an edit touches (see segment_render); None uses the
+		# shared cache when MUSIC_COMPOSER_SEGMENT_RENDER is set, False disables it
+		if segment_cache is None:
+			from .segment_render import get_default_segment_cache
+			segment_cache = get_default_segment_cache()
+		self.__segment_cache = segment_cache or None
 
 	def __set_writable_path(self):
 		self.__base_path_to_save_data = os.getenv("MUSIC_COMPOSER_BASE_PATH", os.path.dirname(os.path.abspath(__file__)))
@@ -51,19 +110,40 @@ class MusicComposer:
 
 		self.__output_wav = os.getenv("OUTPUT_WAV", f'{os.path.dirname(os.path.abspath(__file__))}/static/output.wav')
 
-	def __get_midi_notes(self, music_str):
-		try:
-			try:
-				return [int(music_str)]
-			except:
-				pass
-			if isinstance(music_str, str):  # Single note (e.g., "C4")
-				return [note.Note(music_str).pitch.midi]
-			else:  # Chord (e.g., ["C4", "E4", "G4"] or chord names like "Cmaj", "Dmin7", "F#dim")
-				return [p.midi for p in chord.Chord(music_str).pitches]
-		except Exception as e:
-			logger_config.warning(f"Skipping {music_str}. {e}.")
-			return []
+	def __get_output_paths(self, output_dir=None):
+		"""
+		Resolve where one generation writes its files.
+
+		Args:
+			output_dir: Directory for this generation's files. Defaults to the shared paths.
+
+		Returns:
+			dict: json, mcb (binary composition), image (LilyPond base name), png and midi
+			paths, plus one audio path per output format (wav, flac, opus, mp3)
+		"""
+		if not output_dir:
+			paths = {
+				"json": self.meta_data_save_path,
+				"image": self.meta_image_save_path,
+				"png": f"{self.meta_image_save_path}.png",
+				"midi": self.__output_midi,
+				"wav": self.__output_wav
+			}
+		else:
+			os.makedirs(output_dir, exist_ok=True)
+			paths = {
+				"json": os.path.join(output_dir, "music_data.json"),
+				"image": os.path.join(output_dir, "music_data"),
+				"png": os.path.join(output_dir, "music_data.png"),
+				"midi": os.path.join(output_dir, "output.mid"),
+				"wav": os.path.join(output_dir, "output.wav")
+			}
+
+		paths["mcb"] = f"{os.path.splitext(paths['json'])[0]}.mcb"
+		audio_base = os.path.splitext(paths["wav"])[0]
+		for name, audio_format in FORMATS.items():
+			paths.setdefault(name, f"{audio_base}{audio_format.extension}")
+		return paths
 
 	def __sort_notes_by_offset(self, music_info):
 		"""
@@ -74,178 +154,134 @@ class MusicComposer:
 			music_info (dict): The music information dictionary containing notes
 			
 		Returns:
-			dict: Updated music_info with sorted notes
+			CompositionTable: Columnar view of the sorted notes. music_info["notes"]
+			is updated to the same order.
 		"""
-		# Create a dictionary to group notes by instrument and channel
-		grouped_notes = {}
-		
-		# Group the notes
-		for note_data in music_info["notes"]:
-			instrument_name = note_data.get("instrument", "acoustic_grand").lower()
-			is_drum = DrumKit.is_drum(instrument_name)
-			channel = 9 if is_drum else note_data.get("channel", 0)
-			
-			# Create a unique key for each instrument/channel combination
-			track_key = f"{instrument_name}_{channel}"
-			
-			if track_key not in grouped_notes:
-				grouped_notes[track_key] = []
-				
-			grouped_notes[track_key].append(note_data)
-		
-		# Sort each group by offset
-		for track_key in grouped_notes:
-			grouped_notes[track_key].sort(key=lambda x: float(x.get("offset", 0.0)))
-		
-		# Flatten the sorted groups back into a single list
-		sorted_notes = []
-		for track_notes in grouped_notes.values():
-			sorted_notes.extend(track_notes)
-		
-		# Update the music_info dictionary
-		music_info["notes"] = sorted_notes
-		
-		return music_info
+		from .composition_table import CompositionTable
+		table = CompositionTable.from_notes(music_info["notes"]).sorted()
+		music_info["notes"] = table.notes
+		return table
 
-	def __create_midi_file(self, music_info):
+	def __create_midi_file(self, music_info, output_midi, compiler=None):
+		"""
+		Args:
+			music_info: The composition
+			output_midi: Where the MIDI file is saved
+			compiler: MidiCompiler that already holds the notes (streamed responses)
+
+		Returns:
+			MidiFile: The compiled file, or None on error
+		"""
 		try:
-			# Sort notes by offset for each instrument/channel
-			music_info = self.__sort_notes_by_offset(music_info)
-			mid = MidiFile()
-			
-			# Create a conductor track for tempo and key signature
-			conductor = MidiTrack()
-			mid.tracks.append(conductor)
-			
-			# Set tempo
-			tempo = music_info.get("tempo", 90)
-			conductor.append(MetaMessage('set_tempo', tempo=bpm2tempo(tempo)))
-			
-			# Set time signature
-			time_sig = music_info.get("time_signature", "4/4")
-			numerator, denominator = map(int, time_sig.split('/')) if '/' in time_sig else (4, 4)
-			conductor.append(MetaMessage('time_signature', numerator=numerator, denominator=denominator, clocks_per_click=24, notated_32nd_notes_per_beat=8))
-			
-			# Set key signature
-			conductor.append(MetaMessage('key_signature', key=music_info["key_signature"]))
-			
-			# Map to store tracks by instrument
-			instrument_tracks = {}
-			inst_kit = InstrumentKit()
-			
-			# Process notes for each instrument/track
-			for note_data in music_info["notes"]:
-				# Get instrument info
-				instrument_name = note_data.get("instrument", "acoustic_grand").lower()
-				# 🎯 Detect if it's a drum/percussion instrument
-				is_drum = DrumKit.is_drum(instrument_name)
-				channel = 9 if is_drum else note_data.get("channel", 0)  # Drum = channel 9
-				if not is_drum and channel == 9:
-					channel = random.choice([i for i in range(16) if i != 9])
-				
-				# Create track key
-				track_key = f"{instrument_name}_{channel}"
-				
-				# Create new track if needed
-				if track_key not in instrument_tracks:
-					track = MidiTrack()
-					mid.tracks.append(track)
-					instrument_tracks[track_key] = track
-					
-					if not is_drum:
-						# Set instrument program
-						program_number = inst_kit.get_program_number(instrument_name)
-						track.append(Message('program_change', program=program_number, channel=channel, time=0))
-				
-				# Get the track
-				track = instrument_tracks[track_key]
-
-				ControllerEffectKit.add_effects(track=track, channel=channel, note_data=note_data)
-				PitchEffectKit.add_pitch(track=track, channel=channel, ticks=self.__duration, note_data=note_data)
-				
-				# Process note
-				note_duration = float(note_data.get("duration", 1.0))
-				velocity = int(note_data.get("velocity", 64))
-				ticks = int(self.__duration * note_duration)
-
-				if is_drum:
-					# 🥁 Get mapped MIDI drum note
-					drum_note = DrumKit.get_midi_note(instrument_name)
-					if drum_note is None:
-						logger_config.warning(f"Unknown drum instrument: {instrument_name}")
-						continue
-					midi_notes = [drum_note]
-				else:
-					if note_data["type"] == "note":
-						midi_notes = self.__get_midi_notes(note_data["pitch"])
-					elif note_data["type"] == "chord":
-						midi_notes = self.__get_midi_notes(note_data["pitches"])
-					else:
-						continue
-				
-				if not midi_notes:
-					continue
-
-				# Track running time in ticks
-				if not hasattr(self, "_track_times"):
-					self._track_times = {}
-
-				if track_key not in self._track_times:
-					self._track_times[track_key] = 0
-
-				offset_beats = float(note_data.get("offset", 0.0))
-				event_time = int(offset_beats * self.__duration)
-
-				# Calculate delta from the current track time
-				delta_time = max(0, event_time - self._track_times[track_key])
-
-				# Update the track time to the absolute position
-				self._track_times[track_key] = event_time
-
-				# Add note_on events
-				for i, note_value in enumerate(midi_notes):
-					track.append(Message(
-						'note_on',
-						note=note_value,
-						velocity=velocity,
-						channel=channel,
-						time=delta_time if i == 0 else 0
-					))
-
-				# Add note_off events
-				for i, note_value in enumerate(midi_notes):
-					note_off_time = ticks if i == 0 else 0
-					track.append(Message(
-						'note_off',
-						note=note_value,
-						velocity=0,
-						channel=channel,
-						time=note_off_time
-					))
-			
+			if compiler is None:
+				from .midi_compiler import MidiCompiler
+				# Sort notes by offset for each instrument/channel
+				table = self.__sort_notes_by_offset(music_info)
+				compiler = MidiCompiler(music_info, duration=self.__duration)
+				compiler.add_table(table)
+			mid = compiler.build(music_info)
+			metrics.NOTES_COMPILED.inc(compiler.notes_compiled)
+			metrics.MIDI_EVENTS.inc(compiler.event_count)
+			metrics.MIDI_EVENTS_REMOVED.inc(compiler.events_removed)
+			if compiler.events_removed:
+				logger_config.info(f"Dropped {compiler.events_removed} redundant controller and pitchwheel events.")
+
 			# Save the MIDI file
-			if os.path.exists(self.__output_midi):
-				os.remove(self.__output_midi)
+			if os.path.exists(output_midi):
+				os.remove(output_midi)
 			
-			mid.save(self.__output_midi)
-			logger_config.info(f"MIDI file created: {self.__output_midi}.")
+			mid.save(output_midi)
+			logger_config.info(f"MIDI file created: {output_midi}.")
+			return mid
 		except Exception as e:
 			logger_config.error(f"Error creating MIDI file: {e} {traceback.format_exc()}", play_sound=False)
+			return None
+
+	def __render_audio(self, output_midi, output_path, mid=None, output_format="wav"):
+		"""
+		Render the compiled MIDI to `output_path` in `output_format`.
+
+		The in-process and parallel renderers feed their PCM straight into the encoder.
+		The fluidsynth command line tool can only write a WAV, which is then transcoded.
 
-	def __convert_midi_to_wav(self):
+		Returns:
+			str: output_path, or None if rendering failed
+		"""
 		try:
-			if os.path.exists(self.__output_wav):
-				os.remove(self.__output_wav)
+			if os.path.exists(output_path):
+				os.remove(output_path)
+
+			# Conductor plus at least two instrument tracks, otherwise there is nothing to split
+			if self.__parallel_render and mid is not None and len(mid.tracks) > 2:
+				try:
+					from .parallel_render import get_parallel_renderer
+					renderer = get_parallel_renderer(self.__soundfont_path, self.__sample_rate, self.__synth_backend)
+					result = renderer.render(mid, output_path, stems_dir=os.path.join(os.path.dirname(output_path), "stems"), output_format=output_format)
+					logger_config.info(f"Audio file created from {len(result['stems'])} stems: {output_path}")
+					return output_path
+				except Exception as e:
+					logger_config.warning(f"Parallel rendering failed, rendering in one pass: {e}")
 
-			command = f"fluidsynth -ni {self.__soundfont_path} {self.__output_midi} -F {self.__output_wav} -r 44100"
-			subprocess.run(command, shell=True, check=True, stdout=subprocess.DEVNULL)
-			logger_config.info(f"WAV file created: {self.__output_wav}")
-			return self.__output_wav
+			synth = get_synth(self.__soundfont_path, self.__sample_rate, self.__synth_backend)
+			try:
+				if synth.name == "subprocess":
+					self.__render_with_subprocess(output_midi, output_path, output_format)
+				elif self.__segment_cache:
+					from .segment_render import SegmentRenderer
+					renderer = SegmentRenderer(synth, self.__segment_cache)
+					encode_blocks(renderer.iter_blocks(mid if mid is not None else output_midi), output_format, self.__sample_rate, output_path)
+				else:
+					# The in-process synth renders straight from the compiled MidiFile
+					encode_blocks(synth.iter_blocks(mid if mid is not None else output_midi), output_format, self.__sample_rate, output_path)
+			except Exception as e:
+				if synth.name == "subprocess":
+					raise
+				logger_config.warning(f"In-process rendering failed, retrying with fluidsynth subprocess: {e}")
+				self.__render_with_subprocess(output_midi, output_path, output_format)
+			logger_config.info(f"Audio file created: {output_path}")
+			return output_path
 		except Exception as e:
-			logger_config.error(f"Error: Failed to convert MIDI to WAV: {e}", play_sound=False)
+			logger_config.error(f"Error: Failed to convert MIDI to {output_format}: {e}", play_sound=False)
 			return None
 
+	def __render_with_subprocess(self, output_midi, output_path, output_format):
+		synth = SubprocessSynth(self.__soundfont_path, self.__sample_rate)
+		if output_format == "wav":
+			synth.render_file(output_midi, output_path)
+			return
+		wav_path = f"{output_path}.wav"
+		try:
+			synth.render_file(output_midi, wav_path)
+			transcode(wav_path, output_format, output_path)
+		finally:
+			if os.path.exists(wav_path):
+				os.remove(wav_path)
+
+	def __save_composition(self, music_data, paths):
+		if self.__save_format == "binary":
+			from .composition_format import dump
+			dump(music_data, paths["mcb"])
+		else:
+			with open(paths["json"], "w") as f:
+				json.dump(music_data, f, indent=2)
+
+	def __schedule_score(self, music_data, paths):
+		"""Queue the score image without waiting for it. Repeated compositions hit the score cache."""
+		if not self.__score_renderer:
+			return
+		# Never leave a previous piece's image at a shared path while the new one renders
+		if os.path.exists(paths["png"]):
+			os.remove(paths["png"])
+		# Engraving runs after the generation returns, so a profiled generation profiles it separately
+		session = active_session()
+		self.__score_renderer.submit(music_data, paths["png"], profile_dir=session.output_dir if session else None)
+
+	@property
+	def __system_instruction(self):
+		return _render_system_instruction(self.__system_prompt)
+
 	def __schema(self):
+		from google import genai
 		return genai.types.Schema(
 			type = genai.types.Type.OBJECT,
 			required = ["key_signature", "tempo", "time_signature", "genre", "mood", "notes"],
@@ -346,42 +382,268 @@ class MusicComposer:
 			},
 		)
 
-	def generate_music(self, user_prompt: str, instruments = None, music_data = None) -> str:
+	def __compose(self, user_prompt, instruments, use_cache, on_stage):
+		"""
+		Ask the model for a composition (or reuse a cached response).
+
+		Returns:
+			tuple: (composition dict, MidiCompiler holding its notes or None). The
+			compiler is only returned for streamed responses, which are compiled as
+			they arrive.
+		"""
+		enhanced_prompt = user_prompt
+		if instruments:
+			enhanced_prompt = f"""{user_prompt}
+			Use only following instrument:
+			{','.join(instruments)}"""
+
+		# Generate music data using AI model
+		on_stage("llm")
+		schema = self.__schema()
+		response_key = None
+		music_meta = None
+		if self.__response_cache:
+			response_key = ResponseCache.key(user_prompt, instruments, self.__model_name, self.__system_instruction, schema)
+			if use_cache:
+				music_meta = self.__response_cache.get(response_key)
+
+		if music_meta is not None:
+			logger_config.info("Model response cache hit.")
+			return json.loads(music_meta), None
+
+		with metrics.stage("llm"):
+			if self.__stream_response:
+				music_data, compiler, music_meta = self.__compose_streaming(enhanced_prompt, schema)
+			else:
+				music_meta = self.__send(enhanced_prompt, schema)
+				music_data, compiler = json.loads(music_meta), None
+		if response_key:
+			self.__response_cache.put(response_key, music_meta)
+		return music_data, compiler
+
+	def __send(self, prompt, schema):
+		if self.__geminiWrapper is None:
+			from gemiwrap import GeminiWrapper
+			self.__geminiWrapper = GeminiWrapper(
+				model_name=self.__model_name,
+				system_instruction=self.__system_instruction
+			)
+		return self.__geminiWrapper.send_message(
+			user_prompt=prompt, 
+			schema=schema
+		)[0]
+
+	def request_json(self, prompt, schema, use_cache=True) -> dict:
+		"""
+		Ask the model for a JSON response with a schema other than the composition's,
+		e.g. the section plan of a long-form piece (see long_form). Responses go through
+		the same client and response cache as compose().
+
+		Args:
+			prompt: Full prompt text
+			schema: genai.types.Schema of the expected response
+			use_cache: Set to False to ask the model again even if the response is cached
+
+		Returns:
+			dict: The parsed response
+		"""
+		response_key = None
+		if self.__response_cache:
+			response_key = ResponseCache.key(prompt, None, self.__model_name, self.__system_instruction, schema)
+			if use_cache:
+				response = self.__response_cache.get(response_key)
+				if response is not None:
+					logger_config.info("Model response cache hit.")
+					return json.loads(response)
+
+		response = self.__send(prompt, schema)
+		data = json.loads(response)
+		if response_key:
+			self.__response_cache.put(response_key, response)
+		return data
+
+	def __compose_streaming(self, enhanced_prompt, schema):
+		"""
+		Stream the model response and compile each note as soon as it is complete, so
+		MIDI compilation overlaps generation instead of following it.
+
+		Returns:
+			tuple: (composition dict, MidiCompiler, raw response text)
+		"""
+		from .midi_compiler import MidiCompiler
+		if self.__stream_client is None:
+			from .llm_stream import GeminiStreamingClient
+			self.__stream_client = GeminiStreamingClient(self.__model_name, self.__system_instruction)
+		parser = IncrementalNoteParser()
+		# The header (tempo, signatures) is only needed by build(), once the stream ends
+		compiler = MidiCompiler({}, duration=self.__duration)
+		for chunk in self.__stream_client.stream(enhanced_prompt, schema):
+			for note_data in parser.feed(chunk):
+				try:
+					compiler.add_note(note_data)
+				except Exception as e:
+					logger_config.warning(f"Skipping streamed note {note_data}: {e}")
+		music_data = parser.finish()
+		logger_config.info(f"Streamed {parser.notes_emitted} notes, {compiler.notes_compiled} compiled during generation.")
+		return music_data, compiler, parser.text
+
+	def compose(self, user_prompt: str, instruments = None, use_cache = True) -> dict:
+		"""
+		Ask the model for a composition without rendering it.
+
+		Args:
+			user_prompt: Text description of the desired music
+			instruments: Optional list of instrument names to restrict the model to
+			use_cache: Set to False to ask the model again even if the response is cached
+
+		Returns:
+			dict: The composition, ready for generate_music(music_data=...)
+		"""
+		try:
+			music_data, _ = self.__compose(user_prompt, instruments, use_cache, lambda stage: None)
+			return music_data
+		except Exception as e:
+			logger_config.error(f"Failed to compose music: {str(e)}")
+			raise ValueError(f"Failed to compose music: {str(e)}") from e
+
+	def generate_music(self, user_prompt: str, instruments = None, music_data = None, output_dir = None, on_stage = None, use_cache = True, output_format = "wav") -> str:
 		"""
 		Generate music based on user prompt and optionally specified genre
 		
 		Args:
 			user_prompt: Text description of the desired music
-			genre: Optional genre to guide the generation
+			instruments: Optional list of instrument names to restrict the model to
+			music_data: Optional composition (or path to a JSON or .mcb file) to render instead of calling the model
+			output_dir: Optional directory for this generation's files
+			on_stage: Optional callback called with the name of each pipeline stage as it starts
+			use_cache: Set to False to ask the model again even if the response is cached
+			output_format: "wav", "flac", "opus" or "mp3" (see encoders.FORMATS)
 		
 		Returns:
-			Path to generated WAV file
+			Path to generated audio file
 		"""
 
+		on_stage = on_stage or (lambda stage: None)
 		try:
-			enhanced_prompt = user_prompt
-			if instruments:
-				enhanced_prompt = f"""{user_prompt}
-				Use only following instrument:
-				{','.join(instruments)}"""
-		
+			audio_format = get_format(output_format)
+			if audio_format is None:
+				raise ValueError(f"Unsupported output format: {output_format}")
+			paths = self.__get_output_paths(output_dir)
+			output_path = paths[audio_format.name]
+			compiler = None
+			if isinstance(music_data, (str, os.PathLike)):
+				from .composition_format import load_composition
+				music_data = load_composition(music_data)
 			if not music_data:
-				# Generate music data using AI model
-				music_meta = self.__geminiWrapper.send_message(
-					user_prompt=enhanced_prompt, 
-					schema=self.__schema()
-				)[0]
-			
-				# Convert to JSON and create MIDI file
-				music_data = json.loads(music_meta)
-				with open(self.meta_data_save_path, "w") as f:
-					json.dump(music_data, f, indent=2)
+				music_data, compiler = self.__compose(user_prompt, instruments, use_cache, on_stage)
+
+			self.__save_composition(music_data, paths)
 
+			cache_key = None
+			if self.__render_cache:
+				cache_key = RenderCache.key(music_data, self.__soundfont_path, self.__sample_rate, self.__duration, audio_format.name)
+				if self.__render_cache.fetch(cache_key, paths):
+					logger_config.info(f"Render cache hit: {output_path}")
+					self.__schedule_score(music_data, paths)
+					metrics.GENERATIONS.inc(outcome="cached")
+					return output_path
 
-			self.__create_midi_file(music_data)
-			image_notes(self.meta_data_save_path, self.meta_image_save_path)
-			# Convert to WAV
-			return self.__convert_midi_to_wav()
+			on_stage("midi")
+			with metrics.stage("midi") as span:
+				mid = self.__create_midi_file(music_data, paths["midi"], compiler)
+				span["failed"] = mid is None
+			# Render and encode
+			on_stage("audio")
+			with metrics.stage("audio") as span:
+				output_path = self.__render_audio(paths["midi"], output_path, mid, audio_format.name)
+				span["failed"] = output_path is None
+			if output_path:
+				metrics.AUDIO_BYTES.inc(os.path.getsize(output_path), format=audio_format.name)
+			if output_path and mid is not None and cache_key:
+				self.__render_cache.store(cache_key, paths, ("midi", audio_format.name))
+			# The score image is not needed for playback; it is written to paths["png"] later
+			self.__schedule_score(music_data, paths)
+			metrics.GENERATIONS.inc(outcome="done" if output_path else "failed")
+			return output_path
 		except Exception as e:
+			metrics.GENERATIONS.inc(outcome="failed")
 			logger_config.error(f"Failed to generate music: {str(e)}")
-			raise ValueError(f"Failed to generate music: {str(e)}") from e
\ No newline at end of file
+			raise ValueError(f"Failed to generate music: {str(e)}") from e
+
+	def stream_music(self, user_prompt: str, instruments = None, music_data = None, output_dir = None, on_stage = None, use_cache = True, block_frames = 4096):
+		"""
+		Generate music and yield the WAV while it is being synthesised, so playback can
+		start before rendering finishes. The complete file is still written to the output
+		path, and the score image is queued once the audio is done.
+
+		Args:
+			user_prompt: Text description of the desired music
+			instruments: Optional list of instrument names to restrict the model to
+			music_data: Optional composition (or path to a JSON or .mcb file) to render instead of calling the model
+			output_dir: Optional directory for this generation's files
+			on_stage: Optional callback called with the name of each pipeline stage as it starts
+			use_cache: Set to False to ask the model again even if the response is cached
+			block_frames: Audio frames per streamed PCM block
+
+		Yields:
+			bytes: A WAV header with open-ended sizes, then PCM blocks
+		"""
+		on_stage = on_stage or (lambda stage: None)
+		try:
+			paths = self.__get_output_paths(output_dir)
+			compiler = None
+			if isinstance(music_data, (str, os.PathLike)):
+				from .composition_format import load_composition
+				music_data = load_composition(music_data)
+			if not music_data:
+				music_data, compiler = self.__compose(user_prompt, instruments, use_cache, on_stage)
+
+			self.__save_composition(music_data, paths)
+
+			cache_key = None
+			if self.__render_cache:
+				cache_key = RenderCache.key(music_data, self.__soundfont_path, self.__sample_rate, self.__duration)
+				if self.__render_cache.fetch(cache_key, paths):
+					logger_config.info(f"Render cache hit: {paths['wav']}")
+					self.__schedule_score(music_data, paths)
+					metrics.GENERATIONS.inc(outcome="cached")
+					yield from iter_file(paths["wav"])
+					return
+
+			on_stage("midi")
+			with metrics.stage("midi"):
+				mid = self.__create_midi_file(music_data, paths["midi"], compiler)
+				if mid is None:
+					raise ValueError("MIDI compilation failed")
+
+			on_stage("audio")
+			synth = get_synth(self.__soundfont_path, self.__sample_rate, self.__synth_backend)
+			# Includes the time the client takes to consume each block
+			with metrics.stage("audio"):
+				if synth.name == "inprocess":
+					yield wav_header(self.__sample_rate)
+					unlink_output(paths["wav"])
+					with wave.open(paths["wav"], "wb") as wav:
+						wav.setnchannels(2)
+						wav.setsampwidth(2)
+						wav.setframerate(self.__sample_rate)
+						for block in synth.iter_blocks(mid, block_frames):
+							data = block.tobytes()
+							wav.writeframes(data)
+							yield data
+					logger_config.info(f"WAV file created: {paths['wav']}")
+				else:
+					# The command line synth cannot stream; send the file once it is rendered
+					if not self.__render_audio(paths["midi"], paths["wav"], mid):
+						raise ValueError("Audio rendering failed")
+					yield from iter_file(paths["wav"])
+			metrics.AUDIO_BYTES.inc(os.path.getsize(paths["wav"]), format="wav")
+
+			if cache_key:
+				self.__render_cache.store(cache_key, paths, ("midi", "wav"))
+			self.__schedule_score(music_data, paths)
+			metrics.GENERATIONS.inc(outcome="done")
+		except Exception as e:
+			metrics.GENERATIONS.inc(outcome="failed")
+			logger_config.error(f"Failed to stream music: {str(e)}")
+			raise ValueError(f"Failed to stream music: {str(e)}") from e
\ No newline at end of file
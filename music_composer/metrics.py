@@ -0,0 +1,197 @@
+"""
+Process-wide pipeline metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms are plain thread-safe objects registered on a module
+registry; `render()` produces the text served by the web server's /metrics route.
+Metrics are per process, so renders done in batch worker processes are not counted here.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Generation stages take from milliseconds (cache hits) to minutes (long renders)
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+def _escape(value):
+	return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels):
+	if not labels:
+		return ""
+	return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+def _format_value(value):
+	if value == math.inf:
+		return "+Inf"
+	if float(value).is_integer():
+		return str(int(value))
+	return repr(float(value))
+
+class _Metric:
+	type_name = None
+
+	def __init__(self, name, help_text, labelnames=()):
+		self.name = name
+		self.help_text = help_text
+		self.labelnames = tuple(labelnames)
+		self._values = {}
+		self._lock = threading.Lock()
+
+	def _key(self, labels):
+		if set(labels) != set(self.labelnames):
+			raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+		return tuple((name, labels[name]) for name in self.labelnames)
+
+	def _samples(self):
+		"""(suffix, labels, value) tuples for the exposition."""
+		with self._lock:
+			return [("", key, value) for key, value in sorted(self._values.items())]
+
+	def render(self):
+		lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.type_name}"]
+		for suffix, labels, value in self._samples():
+			lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+		return lines
+
+	def clear(self):
+		with self._lock:
+			self._values.clear()
+
+class Counter(_Metric):
+	type_name = "counter"
+
+	def inc(self, amount=1, **labels):
+		if amount < 0:
+			raise ValueError("Counters can only increase")
+		key = self._key(labels)
+		with self._lock:
+			self._values[key] = self._values.get(key, 0) + amount
+
+	def value(self, **labels):
+		with self._lock:
+			return self._values.get(self._key(labels), 0)
+
+class Gauge(_Metric):
+	type_name = "gauge"
+
+	def set(self, value, **labels):
+		key = self._key(labels)
+		with self._lock:
+			self._values[key] = value
+
+class Histogram(_Metric):
+	type_name = "histogram"
+
+	def __init__(self, name, help_text, labelnames=(), buckets=STAGE_BUCKETS):
+		super().__init__(name, help_text, labelnames)
+		self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+	def observe(self, value, **labels):
+		key = self._key(labels)
+		with self._lock:
+			state = self._values.get(key)
+			if state is None:
+				state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+			for index, bound in enumerate(self.buckets):
+				if value <= bound:
+					state["counts"][index] += 1
+					break
+			state["sum"] += value
+			state["count"] += 1
+
+	def count(self, **labels):
+		with self._lock:
+			state = self._values.get(self._key(labels))
+			return state["count"] if state else 0
+
+	def _samples(self):
+		samples = []
+		with self._lock:
+			for key, state in sorted(self._values.items()):
+				cumulative = 0
+				for bound, count in zip(self.buckets, state["counts"]):
+					cumulative += count
+					samples.append(("_bucket", key + (("le", _format_value(bound)),), cumulative))
+				samples.append(("_sum", key, state["sum"]))
+				samples.append(("_count", key, state["count"]))
+		return samples
+
+class Registry:
+	def __init__(self):
+		self.__metrics = {}
+		self.__lock = threading.Lock()
+
+	def register(self, metric):
+		with self.__lock:
+			if metric.name in self.__metrics:
+				raise ValueError(f"Metric already registered: {metric.name}")
+			self.__metrics[metric.name] = metric
+		return metric
+
+	def render(self):
+		with self.__lock:
+			metrics = list(self.__metrics.values())
+		lines = []
+		for metric in metrics:
+			lines.extend(metric.render())
+		return "\n".join(lines) + "\n"
+
+	def clear(self):
+		"""Reset every metric (tests and benchmarks)."""
+		with self.__lock:
+			metrics = list(self.__metrics.values())
+		for metric in metrics:
+			metric.clear()
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+	"music_composer_stage_seconds", "Time spent in each generation stage", ("stage",)
+))
+STAGE_FAILURES = REGISTRY.register(Counter(
+	"music_composer_stage_failures_total", "Generation stages that failed", ("stage",)
+))
+GENERATIONS = REGISTRY.register(Counter(
+	"music_composer_generations_total", "Finished generations by outcome (done, cached or failed)", ("outcome",)
+))
+NOTES_COMPILED = REGISTRY.register(Counter(
+	"music_composer_notes_compiled_total", "Notes compiled to MIDI"
+))
+MIDI_EVENTS = REGISTRY.register(Counter(
+	"music_composer_midi_events_total", "MIDI events emitted by the compiler"
+))
+MIDI_EVENTS_REMOVED = REGISTRY.register(Counter(
+	"music_composer_midi_events_removed_total", "Redundant controller and pitchwheel events dropped by the compiler"
+))
+AUDIO_BYTES = REGISTRY.register(Counter(
+	"music_composer_audio_bytes_total", "Bytes of audio written by renders", ("format",)
+))
+CACHE_STATS = REGISTRY.register(Gauge(
+	"music_composer_cache_stat", "Counters reported by the render, response and score caches", ("cache", "stat")
+))
+
+@contextmanager
+def stage(name):
+	"""
+	Time a block as one generation stage. An exception counts as a failure of the
+	stage and is re-raised.
+
+	Yields:
+		dict: Set "failed" to True to count a failure that did not raise
+	"""
+	span = {"failed": False}
+	started = time.perf_counter()
+	try:
+		yield span
+	except BaseException:
+		span["failed"] = True
+		raise
+	finally:
+		STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+		if span["failed"]:
+			STAGE_FAILURES.inc(stage=name)
+
+def render():
+	return REGISTRY.render()
@@ -0,0 +1,280 @@
+from custom_logger import logger_config
+from mido import Message, MidiFile, MidiTrack, MetaMessage, bpm2tempo
+import bisect
+import random
+from .drum_kit import DrumKit
+from .instrument_kit import InstrumentKit
+from .controller_effect_kit import ControllerEffectKit
+from .pitch_bend_kit import CENTS_PER_RANGE, PitchEffectKit
+from .midi_scheduler import RESET_PRIORITY, EventScheduler
+from .midi_optimizer import drop_redundant_events
+from .pitch_table import normalize_key, parse_midi_notes
+
+def get_midi_notes(music_str):
+	"""
+	Resolve a pitch, MIDI number or chord into a list of MIDI note numbers.
+	Returns an empty list (and logs a warning) if it cannot be parsed.
+	"""
+	midi_notes, error = parse_midi_notes(music_str)
+	if midi_notes is None:
+		logger_config.warning(f"Skipping {music_str}. {error}.")
+		return []
+	return midi_notes
+
+class MidiCompiler:
+	"""
+	Compiles a composition into a MidiFile.
+
+	Every note, controller change and pitch bend is first placed at its absolute tick
+	on its track. `build` then sorts each track once and converts it to delta times,
+	so overlapping notes keep their timing and cost is O(n log n) in the event count.
+	"""
+
+	def __init__(self, music_info, duration=480, pitch_tolerance=None, controller_threshold=None):
+		"""
+		Args:
+			music_info: Composition with tempo, time_signature and key_signature
+			duration: Ticks per beat of note offsets and durations
+			pitch_tolerance: Largest pitch error of sampled bend and vibrato curves, in
+				cents. Defaults to MUSIC_COMPOSER_PITCH_TOLERANCE_CENTS or 10
+			controller_threshold: Controller changes within this distance of the channel's
+				value are dropped by build(). Defaults to MUSIC_COMPOSER_CC_THRESHOLD or 0
+				(exact repeats only); False keeps every event
+		"""
+		self.__duration = duration
+		self.__set_music_info(music_info)
+		self.__pitch_tolerance = None if pitch_tolerance is None else pitch_tolerance * (PitchEffectKit.MAX + 1) / CENTS_PER_RANGE
+		# Pitch curves of notes seen before the tempo was known (streamed responses), expanded in build()
+		self.__pending_curves = []
+		self.__scheduler = EventScheduler()
+		self.__inst_kit = InstrumentKit()
+		self.__controller_threshold = controller_threshold
+		self.notes_compiled = 0
+		self.events_removed = 0
+
+	@property
+	def event_count(self):
+		return len(self.__scheduler)
+
+	def __set_music_info(self, music_info):
+		self.__music_info = music_info
+		# Start tick and tempo of every header change, for tempo-dependent curves
+		changes = self.__header_changes()
+		self.__tempo_ticks = [tick for tick, _ in changes]
+		self.__tempos = [float(header["tempo"]) for _, header in changes]
+
+	def __header_changes(self):
+		"""
+		(tick, header) pairs: the composition's tempo, time and key signature at tick 0,
+		then one entry per long-form section (see long_form) that starts later.
+		"""
+		header = {
+			"tempo": self.__music_info.get("tempo", 90),
+			"time_signature": self.__music_info.get("time_signature", "4/4"),
+			# Keys mido cannot write fall back to C, or for a section to the key before it
+			"key_signature": normalize_key(self.__music_info.get("key_signature")) or "C"
+		}
+		changes = [(0, header)]
+		for section in sorted(self.__music_info.get("sections", []), key=lambda section: float(section.get("offset", 0))):
+			tick = max(0, int(float(section.get("offset", 0)) * self.__duration))
+			header = {**header, **{key: section[key] for key in header if section.get(key)}}
+			header["key_signature"] = normalize_key(header["key_signature"]) or changes[-1][1]["key_signature"]
+			if tick == changes[-1][0]:
+				changes[-1] = (tick, header)
+			else:
+				changes.append((tick, header))
+		return changes
+
+	def __tempo_at(self, tick):
+		return self.__tempos[bisect.bisect_right(self.__tempo_ticks, tick) - 1]
+
+	def __add_pitch_curve(self, track_key, start_tick, channel, ticks, note_data, defer=True):
+		# Vibrato speed is in cycles per second, so curves depend on the tempo. Every curve
+		# waits for it, not only vibrato, so same-tick bends keep their relative order
+		if defer and "tempo" not in self.__music_info:
+			self.__pending_curves.append((track_key, start_tick, channel, ticks, note_data))
+			return
+		ticks_per_second = self.__duration * self.__tempo_at(start_tick) / 60
+		for relative_tick, message in PitchEffectKit.pitch_events(channel, ticks, note_data, self.__pitch_tolerance, ticks_per_second):
+			# The reset at the note end goes before a bend that starts on the same tick
+			priority = RESET_PRIORITY if relative_tick >= ticks else None
+			self.__scheduler.add(track_key, start_tick + relative_tick, message, priority)
+
+	def __conductor_track(self):
+		conductor = MidiTrack()
+		previous_tick = 0
+		previous = {}
+		for tick, header in self.__header_changes():
+			messages = []
+			# Set tempo
+			if header["tempo"] != previous.get("tempo"):
+				messages.append(MetaMessage('set_tempo', tempo=bpm2tempo(header["tempo"])))
+
+			# Set time signature
+			time_sig = header["time_signature"]
+			if time_sig != previous.get("time_signature"):
+				numerator, denominator = map(int, time_sig.split('/')) if '/' in time_sig else (4, 4)
+				messages.append(MetaMessage('time_signature', numerator=numerator, denominator=denominator, clocks_per_click=24, notated_32nd_notes_per_beat=8))
+
+			# Set key signature
+			if header["key_signature"] != previous.get("key_signature"):
+				messages.append(MetaMessage('key_signature', key=header["key_signature"]))
+
+			for message in messages:
+				message.time = tick - previous_tick
+				conductor.append(message)
+				previous_tick = tick
+			previous = header
+		return conductor
+
+	def add_note(self, note_data):
+		"""
+		Schedule one note or chord with its effects and pitch bend.
+
+		Returns:
+			bool: False if the note was skipped
+		"""
+		# Get instrument info
+		instrument_name = note_data.get("instrument", "acoustic_grand").lower()
+		# 🎯 Detect if it's a drum/percussion instrument
+		is_drum = DrumKit.is_drum(instrument_name)
+		channel = 9 if is_drum else int(float(note_data.get("channel", 0)))  # Drum = channel 9
+		if not is_drum and channel == 9:
+			channel = random.choice([i for i in range(16) if i != 9])
+
+		# Create track key
+		track_key = f"{instrument_name}_{channel}"
+
+		# Create new track if needed
+		if track_key not in self.__scheduler:
+			self.__scheduler.add_track(track_key)
+			if not is_drum:
+				# Set instrument program
+				program_number = self.__inst_kit.get_program_number(instrument_name)
+				self.__scheduler.add(track_key, 0, Message('program_change', program=program_number, channel=channel, time=0))
+
+		if is_drum:
+			# 🥁 Get mapped MIDI drum note
+			drum_note = DrumKit.get_midi_note(instrument_name)
+			if drum_note is None:
+				logger_config.warning(f"Unknown drum instrument: {instrument_name}")
+				return False
+			midi_notes = [drum_note]
+		else:
+			if note_data["type"] == "note":
+				midi_notes = get_midi_notes(note_data["pitch"])
+			elif note_data["type"] == "chord":
+				midi_notes = get_midi_notes(note_data["pitches"])
+			else:
+				return False
+
+		if not midi_notes:
+			return False
+
+		# Process note
+		note_duration = float(note_data.get("duration", 1.0))
+		velocity = max(0, min(127, int(note_data.get("velocity", 64))))
+		ticks = int(self.__duration * note_duration)
+		start_tick = int(float(note_data.get("offset", 0.0)) * self.__duration)
+
+		for message in ControllerEffectKit.effect_messages(channel, note_data):
+			self.__scheduler.add(track_key, start_tick, message)
+		if "pitch_bend" in note_data or "vibrato" in note_data:
+			self.__add_pitch_curve(track_key, start_tick, channel, ticks, note_data)
+
+		for note_value in midi_notes:
+			self.__scheduler.add(track_key, start_tick, Message('note_on', note=note_value, velocity=velocity, channel=channel, time=0))
+			self.__scheduler.add(track_key, start_tick + ticks, Message('note_off', note=note_value, velocity=0, channel=channel, time=0))
+
+		self.notes_compiled += 1
+		return True
+
+	def add_table(self, table):
+		"""
+		Schedule every row of a CompositionTable.
+
+		Tick positions and velocities are computed as arrays, pitches are resolved once per
+		distinct value and programs once per track; only message creation is per note.
+
+		Returns:
+			int: Number of notes scheduled
+		"""
+		track_keys = table.track_keys
+		for track_id, track_key in enumerate(track_keys):
+			if track_key in self.__scheduler:
+				continue
+			self.__scheduler.add_track(track_key)
+			instrument_name, channel = track_key.rsplit("_", 1)
+			if not DrumKit.is_drum(instrument_name):
+				# Set instrument program
+				program_number = self.__inst_kit.get_program_number(instrument_name)
+				self.__scheduler.add(track_key, 0, Message('program_change', program=program_number, channel=int(channel), time=0))
+
+		# 🥁 Drums sound their mapped note whatever pitch they were given
+		instrument_notes = [
+			[DrumKit.get_midi_note(name)] if is_drum else None
+			for name, is_drum in zip(table.instruments, table.is_drum)
+		]
+		pitch_notes = [get_midi_notes(pitch) for pitch in table.pitches]
+
+		start_ticks = table.start_ticks(self.__duration).tolist()
+		ticks = table.duration_ticks(self.__duration).tolist()
+		rows = table.rows
+		velocities = rows["velocity"].tolist()
+		channels = rows["channel"].tolist()
+		instrument_ids = rows["instrument_id"].tolist()
+		pitch_ids = rows["pitch_id"].tolist()
+		track_ids = rows["track_id"].tolist()
+
+		compiled = 0
+		for row, note_data in enumerate(table.notes):
+			midi_notes = instrument_notes[instrument_ids[row]]
+			if midi_notes is None:
+				pitch_id = pitch_ids[row]
+				if pitch_id < 0:
+					continue
+				midi_notes = pitch_notes[pitch_id]
+			if not midi_notes:
+				continue
+
+			track_key = track_keys[track_ids[row]]
+			channel = channels[row]
+			start_tick = start_ticks[row]
+
+			if "effects" in note_data:
+				for message in ControllerEffectKit.effect_messages(channel, note_data):
+					self.__scheduler.add(track_key, start_tick, message)
+			if "pitch_bend" in note_data or "vibrato" in note_data:
+				self.__add_pitch_curve(track_key, start_tick, channel, ticks[row], note_data)
+
+			for note_value in midi_notes:
+				self.__scheduler.add(track_key, start_tick, Message('note_on', note=note_value, velocity=velocities[row], channel=channel, time=0))
+				self.__scheduler.add(track_key, start_tick + ticks[row], Message('note_off', note=note_value, velocity=0, channel=channel, time=0))
+			compiled += 1
+
+		self.notes_compiled += compiled
+		return compiled
+
+	def build(self, music_info=None):
+		"""
+		Args:
+			music_info: Composition header for the conductor track, when it was not yet
+				known at construction (e.g. notes compiled while the response streams in)
+
+		Returns:
+			MidiFile: Conductor track followed by one track per instrument/channel
+		"""
+		if music_info is not None:
+			self.__set_music_info(music_info)
+		pending, self.__pending_curves = self.__pending_curves, []
+		for track_key, start_tick, channel, ticks, note_data in pending:
+			self.__add_pitch_curve(track_key, start_tick, channel, ticks, note_data, defer=False)
+		if self.__controller_threshold is not False:
+			self.events_removed += drop_redundant_events(self.__scheduler, self.__controller_threshold)
+		mid = MidiFile()
+		mid.tracks.append(self.__conductor_track())
+		for track_key in self.__scheduler.track_keys():
+			# Named after the track key so renders and stems can be matched to instruments
+			track = MidiTrack([MetaMessage('track_name', name=track_key, time=0)])
+			mid.tracks.append(self.__scheduler.to_track(track_key, track))
+		return mid
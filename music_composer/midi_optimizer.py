@@ -0,0 +1,96 @@
+"""
+Compile passes that remove MIDI events without changing what is heard.
+
+Models tend to repeat the same effects (reverb_level, volume, sustain) on every note,
+and glides often start at the value the previous note's reset left on the wheel.
+`drop_redundant_events` tracks the controller and pitchwheel state of each channel
+and drops messages that would not change it.
+"""
+import heapq
+import os
+
+# Controllers that trigger an action or address a parameter, so repeating them is not a no-op
+_ACTION_CONTROLLERS = frozenset([6, 38, 96, 97, 98, 99, 100, 101]) | frozenset(range(120, 128))
+# Pedal and toggle switches are either on (>= 64) or off, so values are never folded
+_SWITCH_CONTROLLERS = frozenset(range(64, 70))
+_RESET_ALL_CONTROLLERS = 121
+
+def default_threshold():
+	"""
+	Controller values within this distance of the channel's current value are folded
+	into it. MUSIC_COMPOSER_CC_THRESHOLD sets it (default 0, only exact repeats).
+	"""
+	return int(os.getenv("MUSIC_COMPOSER_CC_THRESHOLD", 0))
+
+def _state_key(message):
+	"""(channel, controller) of a message whose repeats can be dropped, or None."""
+	if message.type == "control_change":
+		if message.control in _ACTION_CONTROLLERS:
+			return None
+		return (message.channel, message.control)
+	if message.type == "pitchwheel":
+		return (message.channel, "pitch")
+	return None
+
+def _is_redundant(key, value, current, threshold):
+	if current is None:
+		return False
+	if value == current:
+		return True
+	return key[1] != "pitch" and key[1] not in _SWITCH_CONTROLLERS and abs(value - current) <= threshold
+
+def _indexed_events(scheduler, track_key, track_index):
+	"""(tick, track_index, position, message) tuples of a track, which sort in playback order."""
+	for position, (tick, message) in enumerate(scheduler.events(track_key)):
+		yield tick, track_index, position, message
+
+def drop_redundant_events(scheduler, threshold=None):
+	"""
+	Remove control_change and pitchwheel messages that set a channel to the value it
+	already has.
+
+	Tracks are merged in playback order (by tick, then track order, as players do), so
+	state is followed per channel across tracks. A message is only dropped if it is
+	also redundant within its own track, which keeps tracks correct when they are
+	rendered on their own (see parallel_render).
+
+	Args:
+		scheduler: EventScheduler holding the compiled tracks
+		threshold: Controller values within this distance of the current value are
+			dropped too. Pitchwheel and switch controllers only drop exact repeats.
+			Defaults to default_threshold()
+
+	Returns:
+		int: Number of events removed
+	"""
+	threshold = default_threshold() if threshold is None else max(0, int(threshold))
+	track_keys = scheduler.track_keys()
+	merged = heapq.merge(*[_indexed_events(scheduler, track_key, track_index) for track_index, track_key in enumerate(track_keys)])
+
+	channel_state = {}
+	track_state = {}
+	dropped = [[] for _ in track_keys]
+	for _, track_index, position, message in merged:
+		if message.type == "control_change" and message.control == _RESET_ALL_CONTROLLERS:
+			# The channel's controllers go back to their defaults, which depend on the synth
+			for state in (channel_state, track_state):
+				for key in [key for key in state if key[-2] == message.channel]:
+					del state[key]
+			continue
+
+		key = _state_key(message)
+		if key is None:
+			continue
+		value = message.pitch if key[1] == "pitch" else message.value
+		track_key = (track_index,) + key
+		if _is_redundant(key, value, channel_state.get(key), threshold) and _is_redundant(key, value, track_state.get(track_key), threshold):
+			dropped[track_index].append(position)
+			continue
+		channel_state[key] = value
+		track_state[track_key] = value
+
+	removed = 0
+	for track_key, positions in zip(track_keys, dropped):
+		if positions:
+			removed += scheduler.remove_events(track_key, positions)
+	return removed
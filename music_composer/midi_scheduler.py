@@ -0,0 +1,94 @@
+from mido import MidiTrack
+
+# Tie-break for events on the same tick: release voices first, then set program,
+# controllers and bends, and only then start the notes they shape.
+EVENT_PRIORITY = {
+	"note_off": 0,
+	"program_change": 1,
+	"control_change": 2,
+	"pitchwheel": 3,
+	"note_on": 4
+}
+DEFAULT_PRIORITY = 2
+# Pitchwheel resets at a note end, released before the note itself
+RESET_PRIORITY = -1
+
+class EventScheduler:
+	"""
+	Collects MIDI messages at absolute tick positions per track and serialises each track
+	with delta times in a single sorted pass.
+
+	Messages can be added in any order, so overlapping notes and effects that span a
+	note keep their exact timing instead of being chained one after another.
+	"""
+
+	def __init__(self):
+		self.__tracks = {}
+		self.__sequence = 0
+
+	def __len__(self):
+		return sum(len(events) for events in self.__tracks.values())
+
+	def __contains__(self, track_key):
+		return track_key in self.__tracks
+
+	def add_track(self, track_key):
+		"""Register a track so it is emitted even before it receives events."""
+		self.__tracks.setdefault(track_key, [])
+
+	def add(self, track_key, tick, message, priority=None):
+		"""
+		Schedule a message at an absolute tick. The message's own `time` is ignored and
+		overwritten when the track is serialised, so do not share a message between slots.
+
+		Args:
+			priority: Same-tick ordering (see EVENT_PRIORITY). Defaults to the message type's
+		"""
+		if priority is None:
+			priority = EVENT_PRIORITY.get(message.type, DEFAULT_PRIORITY)
+		# The sequence number keeps insertion order for otherwise equal events
+		self.__tracks.setdefault(track_key, []).append((max(0, int(tick)), priority, self.__sequence, message))
+		self.__sequence += 1
+
+	def track_keys(self):
+		return list(self.__tracks)
+
+	def events(self, track_key):
+		"""
+		Returns:
+			list: (absolute_tick, message) pairs in playback order
+		"""
+		return [(tick, message) for tick, _, _, message in sorted(self.__tracks.get(track_key, []), key=lambda event: event[:3])]
+
+	def remove_events(self, track_key, positions):
+		"""
+		Drop events by their index in `events(track_key)`. The others keep their order.
+
+		Returns:
+			int: Number of events removed
+		"""
+		ordered = sorted(self.__tracks.get(track_key, []), key=lambda event: event[:3])
+		drop = set(positions)
+		self.__tracks[track_key] = [event for index, event in enumerate(ordered) if index not in drop]
+		return len(ordered) - len(self.__tracks[track_key])
+
+	def to_track(self, track_key, track=None):
+		"""
+		Append a track's events to a MidiTrack as delta times.
+
+		Args:
+			track_key: Track to serialise
+			track: Existing MidiTrack to extend. A new one is created if omitted
+
+		Returns:
+			MidiTrack: The track holding the serialised events
+		"""
+		track = MidiTrack() if track is None else track
+		previous_tick = 0
+		for tick, message in self.events(track_key):
+			# Scheduled messages belong to the scheduler, so set the delta in place
+			# instead of paying for mido's validating copy()
+			message.time = tick - previous_tick
+			track.append(message)
+			previous_tick = tick
+		return track
@@ -0,0 +1,157 @@
+import io
+import os
+import re
+import threading
+import tempfile
+import numpy as np
+from mido import MidiFile, MidiTrack
+from .encoders import encode_blocks
+from .synth import get_synth, read_wav, write_wav
+from .worker_pool import WorkerPool
+
+def _track_name(track, index):
+	for message in track:
+		if message.is_meta and message.type == "track_name" and message.name:
+			return message.name
+	return f"track_{index}"
+
+def split_tracks(mid):
+	"""
+	Split a type 1 MidiFile into one file per instrument track, each with the conductor.
+
+	Returns:
+		list: (track_name, MidiFile) pairs
+	"""
+	if len(mid.tracks) < 2:
+		return [(_track_name(mid.tracks[0], 0) if mid.tracks else "track_0", mid)]
+
+	conductor = mid.tracks[0]
+	groups = []
+	for index, track in enumerate(mid.tracks[1:], start=1):
+		group = MidiFile(type=1, ticks_per_beat=mid.ticks_per_beat)
+		group.tracks.append(MidiTrack(conductor))
+		group.tracks.append(MidiTrack(track))
+		groups.append((_track_name(track, index), group))
+	return groups
+
+def _to_bytes(mid):
+	buffer = io.BytesIO()
+	mid.save(file=buffer)
+	return buffer.getvalue()
+
+def _render_group(midi_bytes, soundfont_path, sample_rate, backend):
+	"""
+	Worker entry point: render one group to float32 stereo frames in [-1, 1].
+	The synth (and its soundfont) is reused across calls within the worker process.
+	"""
+	mid = MidiFile(file=io.BytesIO(midi_bytes))
+	synth = get_synth(soundfont_path, sample_rate, backend)
+	if synth.name == "inprocess":
+		frames = synth.render(mid).reshape(-1, 2)
+	else:
+		with tempfile.TemporaryDirectory() as tmp_dir:
+			wav_path = os.path.join(tmp_dir, "group.wav")
+			synth.render_file(mid, wav_path)
+			frames, _ = read_wav(wav_path)
+	return frames.astype(np.float32) / 32768.0
+
+def mix(stems):
+	"""
+	Sum float32 stems of different lengths. If the sum clips, the whole mix is scaled
+	down so its peak sits just below full scale.
+
+	Returns:
+		numpy.ndarray: float32 frames of shape (frames, 2)
+	"""
+	length = max((len(stem) for stem in stems), default=0)
+	mixed = np.zeros((length, 2), dtype=np.float32)
+	for stem in stems:
+		mixed[:len(stem)] += stem
+	peak = float(np.max(np.abs(mixed))) if length else 0.0
+	if peak > 1.0:
+		mixed *= 0.999 / peak
+	return mixed
+
+def to_pcm16(frames):
+	# Inverse of the worker's int16 -> float scaling, so a lone stem round-trips exactly
+	return np.clip(np.rint(frames * 32768.0), -32768, 32767).astype(np.int16)
+
+def _safe_stem_name(name):
+	return re.sub(r"[^A-Za-z0-9_.-]+", "_", name) or "track"
+
+class ParallelRenderer:
+	"""
+	Renders each instrument track of a MIDI file in its own worker process and mixes
+	the results with NumPy. Wall-clock time scales with the number of cores for
+	multi-instrument pieces, and every track is also written out as a stem.
+	"""
+
+	def __init__(self, soundfont_path, sample_rate=44100, max_workers=None, backend=None):
+		"""
+		Args:
+			soundfont_path: SoundFont (.sf2) to render with
+			sample_rate: Output sample rate
+			max_workers: Worker processes. Defaults to MUSIC_COMPOSER_RENDER_WORKERS or the CPU count
+			backend: Synth backend for the workers (see synth.get_synth)
+		"""
+		self.soundfont_path = soundfont_path
+		self.sample_rate = sample_rate
+		self.backend = backend
+		self.max_workers = max_workers or int(os.getenv("MUSIC_COMPOSER_RENDER_WORKERS", os.cpu_count() or 1))
+		self.__executor = None
+		self.__lock = threading.Lock()
+
+	def __get_executor(self):
+		with self.__lock:
+			if self.__executor is None:
+				# Not multiprocessing: forking a threaded web server is unsafe, and spawn re-runs
+				# the caller's __main__ in every worker
+				self.__executor = WorkerPool(self.max_workers)
+			return self.__executor
+
+	def render(self, mid, output_path, stems_dir=None, output_format="wav"):
+		"""
+		Args:
+			mid: MidiFile to render
+			output_path: Path of the mixed audio file
+			stems_dir: Optional directory for one WAV per track
+			output_format: Format of the mix (see encoders.FORMATS)
+
+		Returns:
+			dict: {"path": output_path, "stems": {track_name: path}}
+		"""
+		groups = split_tracks(mid)
+		executor = self.__get_executor()
+		futures = [
+			executor.submit(_render_group, _to_bytes(group), self.soundfont_path, self.sample_rate, self.backend)
+			for _, group in groups
+		]
+		stems = [future.result() for future in futures]
+
+		encode_blocks([to_pcm16(mix(stems))], output_format, self.sample_rate, output_path)
+
+		stem_paths = {}
+		if stems_dir:
+			os.makedirs(stems_dir, exist_ok=True)
+			for (name, _), stem in zip(groups, stems):
+				stem_path = os.path.join(stems_dir, f"{_safe_stem_name(name)}.wav")
+				write_wav(stem_path, [to_pcm16(stem)], self.sample_rate)
+				stem_paths[name] = stem_path
+		return {"path": output_path, "stems": stem_paths}
+
+	def shutdown(self):
+		with self.__lock:
+			if self.__executor is not None:
+				self.__executor.shutdown()
+				self.__executor = None
+
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+def get_parallel_renderer(soundfont_path, sample_rate=44100, backend=None):
+	"""Process-wide renderer (and worker pool) per soundfont, sample rate and backend."""
+	key = (os.path.abspath(soundfont_path), sample_rate, backend)
+	with _renderers_lock:
+		if key not in _renderers:
+			_renderers[key] = ParallelRenderer(soundfont_path, sample_rate, backend=backend)
+		return _renderers[key]
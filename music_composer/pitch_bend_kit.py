@@ -1,12 +1,30 @@
 import math
+import os
+import numpy as np
 from mido import Message
 
+# General MIDI default bend range is +/-2 semitones, so the full wheel range spans 200 cents
+CENTS_PER_RANGE = 200
+# 480 ticks per beat at 90 BPM, the compiler's defaults
+DEFAULT_TICKS_PER_SECOND = 480 * 90 / 60
+
+def default_tolerance():
+	"""
+	Largest pitch error allowed when curves are sampled, in pitchwheel units.
+	MUSIC_COMPOSER_PITCH_TOLERANCE_CENTS sets it in cents (default 10).
+	"""
+	cents = float(os.getenv("MUSIC_COMPOSER_PITCH_TOLERANCE_CENTS", 10))
+	return cents * (PitchEffectKit.MAX + 1) / CENTS_PER_RANGE
+
 class PitchEffectKit:
 	"""
 	Pitch Bend helper: mido expects -8192 to +8191
 	"""
 	MIN = -8192
 	MAX = 8191
+	# Vibrato sampling bounds per cycle; the tolerance picks a value in between
+	MIN_VIBRATO_SAMPLES = 4
+	MAX_VIBRATO_SAMPLES = 64
 
 	@staticmethod
 	def normalize(value: float) -> int:
@@ -32,24 +50,6 @@ class PitchEffectKit:
 
 		return None, None, None, None
 
-	@staticmethod
-	def add_pitch(track, channel, ticks, note_data):
-		"""Add a glide from start to end bend over `ticks` duration"""
-
-		bend, start, end, steps = PitchEffectKit.get_pitch_values(note_data)
-		if bend:
-			if steps <= 0:
-				steps = 1
-			step_ticks = ticks // steps
-			for i in range(steps + 1):
-				t = i / steps
-				bend = start + (end - start) * t  # Linear interp
-				pitch_val = PitchEffectKit.to_pitchwheel(bend)
-				track.append(Message('pitchwheel', pitch=pitch_val, channel=channel, time=step_ticks if i > 0 else 0))
-
-			# Reset to center
-			track.append(Message('pitchwheel', pitch=0, channel=channel, time=0))
-
 	@staticmethod
 	def get_vib_values(note_data):
 		if "vibrato" in note_data:
@@ -63,19 +63,107 @@ class PitchEffectKit:
 		return None, None, None, None
 
 	@staticmethod
-	def add_vibrato(track, channel, ticks, note_data):
-		"""Add vibrato: sinusoidal pitch modulation"""
+	def pitch_curve(ticks, note_data, tolerance=None, ticks_per_second=DEFAULT_TICKS_PER_SECOND):
+		"""
+		Sample the pitch bend glide and vibrato of a note as one pitchwheel curve.
+
+		A glide is held in steps: at most the note's `steps`, and no more than needed to
+		keep each step within `tolerance`. Vibrato (`speed` in cycles per second) is
+		sampled at interval midpoints often enough to stay within `tolerance`, and is
+		added to the glide. Repeated wheel values are dropped.
+
+		Args:
+			ticks: Note length in ticks
+			note_data: Note with "pitch_bend" and/or "vibrato"
+			tolerance: Largest pitch error in pitchwheel units. Defaults to default_tolerance()
+			ticks_per_second: Tick rate at the composition tempo (vibrato only)
 
-		vib, depth, speed, steps = PitchEffectKit.get_pitch_values(note_data)
+		Returns:
+			tuple: (tick offsets, wheel values) as int arrays, or None if the note has no
+			pitch effect. Offsets are relative to the note start and strictly increasing.
+		"""
+		bend, start, end, steps = PitchEffectKit.get_pitch_values(note_data)
+		vib, depth, speed, _ = PitchEffectKit.get_vib_values(note_data)
+		if not bend and not vib:
+			return None
+		tolerance = max(1.0, tolerance or default_tolerance())
+		ticks = max(1, int(ticks))
+
+		# Each effect sets the longest interval (in whole ticks) a value may be held; when
+		# both are present their errors add up, so each gets half the tolerance
+		if bend and vib:
+			tolerance /= 2
+		longest = ticks
+		segments = 1
+		if bend:
+			start, end = float(start), float(end)
+			glide = abs(end - start) * PitchEffectKit.MAX
+			if glide > tolerance:
+				longest = max(1, math.floor(ticks * tolerance / glide))
+			segments = max(1, int(steps))
+		else:
+			start = end = 0.0
+
+		cycles = 0.0
 		if vib:
-			if steps <= 0:
-				steps = 1
-			step_ticks = ticks // steps
-			for i in range(steps + 1):
-				t = i / steps
-				bend = depth * math.sin(2 * math.pi * speed * t)
-				pitch_val = PitchEffectKit.to_pitchwheel(bend)
-				track.append(Message('pitchwheel', pitch=int(pitch_val), channel=channel, time=step_ticks if i > 0 else 0))
-
-			# Reset to center
-			track.append(Message('pitchwheel', pitch=0, channel=channel, time=0))
\ No newline at end of file
+			depth = float(depth)
+			cycles = max(0.0, float(speed)) * ticks / ticks_per_second
+			if cycles:
+				# Holding a midpoint sample of a sine of amplitude A over 1/n of a cycle is off by at most pi*A/n
+				per_cycle = math.ceil(math.pi * abs(depth) * PitchEffectKit.MAX / tolerance)
+				per_cycle = min(PitchEffectKit.MAX_VIBRATO_SAMPLES, max(PitchEffectKit.MIN_VIBRATO_SAMPLES, per_cycle))
+				longest = min(longest, max(1, math.floor(ticks / (cycles * per_cycle))))
+				segments = ticks
+
+		# A glide never takes more than its own `steps`
+		segments = min(segments, ticks, math.ceil(ticks / longest))
+		edges = (np.arange(segments + 1) * ticks) // segments
+		offsets = edges[:-1]
+		values = start + (end - start) * (offsets / ticks)
+		if vib and cycles:
+			# Sampled at the middle of each held interval (in whole ticks)
+			middles = (edges[:-1] + edges[1:]) / 2
+			values = values + depth * np.sin(2 * np.pi * cycles * middles / ticks)
+		wheel = np.clip(np.rint(values * PitchEffectKit.MAX), PitchEffectKit.MIN, PitchEffectKit.MAX).astype(np.int64)
+
+		keep = np.ones(segments, dtype=bool)
+		keep[1:] = wheel[1:] != wheel[:-1]
+		return offsets[keep], wheel[keep]
+
+	@staticmethod
+	def pitch_events(channel, ticks, note_data, tolerance=None, ticks_per_second=DEFAULT_TICKS_PER_SECOND):
+		"""
+		Pitchwheel messages for a note's glide and vibrato (see pitch_curve).
+
+		Returns:
+			list: (relative_tick, Message) pairs, ending with a reset to center at `ticks`
+			unless the curve already ends at center
+		"""
+		curve = PitchEffectKit.pitch_curve(ticks, note_data, tolerance, ticks_per_second)
+		if curve is None:
+			return []
+
+		offsets, wheel = curve
+		events = [
+			(offset, Message('pitchwheel', pitch=value, channel=channel, time=0))
+			for offset, value in zip(offsets.tolist(), wheel.tolist())
+		]
+		# Reset to center
+		if wheel[-1] != 0:
+			events.append((ticks, Message('pitchwheel', pitch=0, channel=channel, time=0)))
+		return events
+
+	@staticmethod
+	def add_pitch(track, channel, ticks, note_data, tolerance=None, ticks_per_second=DEFAULT_TICKS_PER_SECOND):
+		"""Add the glide (and vibrato, if any) over `ticks` duration"""
+
+		previous_tick = 0
+		for tick, message in PitchEffectKit.pitch_events(channel, ticks, note_data, tolerance, ticks_per_second):
+			track.append(message.copy(time=tick - previous_tick))
+			previous_tick = tick
+
+	@staticmethod
+	def add_vibrato(track, channel, ticks, note_data, tolerance=None, ticks_per_second=DEFAULT_TICKS_PER_SECOND):
+		"""Add vibrato: sinusoidal pitch modulation"""
+
+		PitchEffectKit.add_pitch(track, channel, ticks, {"vibrato": note_data["vibrato"]} if "vibrato" in note_data else {}, tolerance, ticks_per_second)
@@ -0,0 +1,133 @@
+import re
+from functools import lru_cache
+
+_SEMITONES = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+# music21 spells flats as "-", LLM output usually as "b"
+_ACCIDENTALS = {"": 0, "#": 1, "##": 2, "b": -1, "bb": -2, "-": -1, "--": -2}
+_OCTAVES = range(-1, 10)
+# music21 places a note without an octave in octave 4
+_DEFAULT_OCTAVE = 4
+
+def _build_note_table():
+	table = {}
+	for letter, semitone in _SEMITONES.items():
+		for accidental, shift in _ACCIDENTALS.items():
+			for octave in _OCTAVES:
+				if octave < 0 and "-" in accidental:
+					# "D---1" reads as D triple-flat in octave 1
+					continue
+				midi = (octave + 1) * 12 + semitone + shift
+				if 0 <= midi <= 127:
+					table[f"{letter}{accidental}{octave}"] = midi
+			midi = (_DEFAULT_OCTAVE + 1) * 12 + semitone + shift
+			table[f"{letter}{accidental}"] = midi
+	# Model output often uses lower-case letters ("c#4")
+	for name, midi in list(table.items()):
+		table.setdefault(name[0].lower() + name[1:], midi)
+	return table
+
+# Note name -> MIDI number for every letter, accidental and octave that fits in 0..127
+NOTE_TO_MIDI = _build_note_table()
+
+# Keys mido accepts for MetaMessage('key_signature'): a tonic, with "m" for minor
+MIDI_KEYS = frozenset([
+	"Cb", "Gb", "Db", "Ab", "Eb", "Bb", "F", "C", "G", "D", "A", "E", "B", "F#", "C#",
+	"Abm", "Ebm", "Bbm", "Fm", "Cm", "Gm", "Dm", "Am", "Em", "Bm", "F#m", "C#m", "G#m", "D#m", "A#m"
+])
+# Spellings of keys mido has no signature for
+_ENHARMONIC_KEYS = {
+	"A#": "Bb", "D#": "Eb", "G#": "Ab", "E#": "F", "B#": "C", "Fb": "E",
+	"Dbm": "C#m", "Gbm": "F#m", "Cbm": "Bm", "Fbm": "Em", "E#m": "Fm", "B#m": "Cm"
+}
+# music21 spells flats as "-" ("B-", "B-m"); elsewhere a hyphen only separates words
+_KEY_PATTERN = re.compile(r"([A-Ga-g])\s*(#|♯|♭|-?\s*sharp|-?\s*flat|b|-(?=m?$))?[\s-]*(m|min|minor|maj|major)?", re.IGNORECASE)
+
+def normalize_key(value):
+	"""
+	Key signature name in the form mido writes ("C", "F#", "Bbm"), from the spellings
+	models use, such as "C major", "A minor", "f# min" or "E-flat major".
+
+	Returns:
+		str: A key in MIDI_KEYS, or None if the value is not a key
+	"""
+	if not isinstance(value, str):
+		return None
+	match = _KEY_PATTERN.fullmatch(value.strip())
+	if match is None:
+		return None
+	tonic, accidental, mode = match.groups()
+	accidental = (accidental or "").lower()
+	accidental = "#" if accidental in ("#", "♯") or "sharp" in accidental else "b" if accidental else ""
+	# "CM" is C major, "Cm" C minor
+	minor = mode is not None and mode != "M" and mode.lower() in ("m", "min", "minor")
+	key = tonic.upper() + accidental + ("m" if minor else "")
+	key = _ENHARMONIC_KEYS.get(key, key)
+	return key if key in MIDI_KEYS else None
+
+def lookup_pitch(value):
+	"""
+	Resolve a single pitch name or MIDI number without music21.
+
+	Returns:
+		int: MIDI note number, or None if the value is not in the table
+	"""
+	if isinstance(value, bool):
+		return None
+	if isinstance(value, (int, float)):
+		return int(value)
+	if not isinstance(value, str):
+		return None
+	value = value.strip()
+	midi = NOTE_TO_MIDI.get(value)
+	if midi is not None:
+		return midi
+	try:
+		return int(value)
+	except ValueError:
+		return None
+
+@lru_cache(maxsize=4096)
+def _parse_with_music21(value):
+	"""
+	Parse a note name, or a tuple of names / a chord symbol, with music21.
+
+	Returns:
+		tuple: (midi_numbers, error). midi_numbers is None when parsing failed
+	"""
+	from music21 import chord, note
+	try:
+		if isinstance(value, str):
+			return (note.Note(value).pitch.midi,), None
+		return tuple(p.midi for p in chord.Chord(list(value)).pitches), None
+	except Exception as e:
+		return None, str(e)
+
+def parse_midi_notes(music_str):
+	"""
+	Resolve a pitch, MIDI number or list of pitches into MIDI note numbers.
+
+	Table lookups cover plain note names and numbers; music21 is only called (and
+	memoised) for anything else, e.g. unusual spellings.
+
+	Returns:
+		tuple: (midi_numbers, error). midi_numbers is None when parsing failed
+	"""
+	midi = lookup_pitch(music_str)
+	if midi is not None:
+		return [midi], None
+
+	if isinstance(music_str, str):
+		midi_numbers, error = _parse_with_music21(music_str.strip())
+	elif isinstance(music_str, (list, tuple)):
+		resolved = [lookup_pitch(pitch) for pitch in music_str]
+		if resolved and None not in resolved:
+			return resolved, None
+		try:
+			midi_numbers, error = _parse_with_music21(tuple(music_str))
+		except TypeError as e:
+			# Unhashable items cannot be memoised or parsed
+			return None, str(e)
+	else:
+		return None, f"Unsupported pitch value {music_str!r}"
+
+	return (list(midi_numbers) if midi_numbers is not None else None), error
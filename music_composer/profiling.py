@@ -0,0 +1,219 @@
+"""
+Opt-in profiling of single generations.
+
+`ProfileSession` runs cProfile and tracemalloc around a block and writes the results
+next to the job's artifacts as profile-* files:
+
+	profile-cprofile.pstats       raw cProfile stats (load with pstats or snakeviz)
+	profile-cprofile.txt          top functions by cumulative time
+	profile-tracemalloc.txt       peak traced memory and the largest allocation sites
+	profile-tracemalloc.snapshot  raw tracemalloc snapshot (tracemalloc.Snapshot.load)
+	profile-score.pstats/.txt     cProfile of score engraving, written by the score renderer
+
+Files larger than MUSIC_COMPOSER_PROFILE_MAX_BYTES are not kept, and only the
+profiles of the newest MUSIC_COMPOSER_PROFILE_KEEP jobs are retained; older jobs keep
+their audio. tracemalloc is process-wide, so allocations of generations running at the
+same time are included in the snapshot.
+"""
+import io
+import os
+import threading
+import time
+import tracemalloc
+from custom_logger import logger_config
+
+PREFIX = "profile-"
+HEADER = "X-Music-Composer-Profile"
+TOP_ENTRIES = 50
+
+def max_profile_bytes():
+	return int(os.getenv("MUSIC_COMPOSER_PROFILE_MAX_BYTES", 16 * 1024 * 1024))
+
+def profiling_requested(header_value=None):
+	"""
+	True if every generation is profiled (MUSIC_COMPOSER_PROFILE=1) or a request asked
+	for it with the X-Music-Composer-Profile header. When MUSIC_COMPOSER_PROFILE_TOKEN is
+	set, the header must carry that token, so clients cannot slow the server at will.
+	"""
+	if os.getenv("MUSIC_COMPOSER_PROFILE", "0").lower() in ("1", "true", "yes"):
+		return True
+	if not header_value:
+		return False
+	token = os.getenv("MUSIC_COMPOSER_PROFILE_TOKEN")
+	if token:
+		return header_value == token
+	return header_value.lower() in ("1", "true", "yes")
+
+def _keep_within_limit(path):
+	"""Remove a dump that exceeds the size limit. Returns True if it was kept."""
+	size = os.path.getsize(path)
+	if size <= max_profile_bytes():
+		return True
+	os.remove(path)
+	logger_config.warning(f"Dropped profile {path}: {size} bytes is over MUSIC_COMPOSER_PROFILE_MAX_BYTES.")
+	return False
+
+def write_cprofile(profile, output_dir, name):
+	"""
+	Write <name>.pstats and a <name>.txt summary of a finished cProfile.Profile.
+
+	Returns:
+		list: Paths written
+	"""
+	import pstats
+	written = []
+	stats_path = os.path.join(output_dir, f"{PREFIX}{name}.pstats")
+	profile.dump_stats(stats_path)
+	if _keep_within_limit(stats_path):
+		written.append(stats_path)
+
+	summary = io.StringIO()
+	pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(TOP_ENTRIES)
+	text_path = os.path.join(output_dir, f"{PREFIX}{name}.txt")
+	with open(text_path, "w") as f:
+		f.write(summary.getvalue())
+	if _keep_within_limit(text_path):
+		written.append(text_path)
+	return written
+
+# tracemalloc is global; nested or concurrent sessions share one trace
+_tracemalloc_users = 0
+# Whether the sessions started the trace, so one started by the application is left running
+_tracemalloc_started = False
+_tracemalloc_lock = threading.Lock()
+
+class ProfileSession:
+	"""
+	Context manager that profiles the calling thread with cProfile and the process
+	with tracemalloc, then writes the dumps to `output_dir`.
+	"""
+
+	def __init__(self, output_dir, label="generation"):
+		"""
+		Args:
+			output_dir: Job directory that receives the profile-* files
+			label: Written at the top of the text summaries
+		"""
+		self.output_dir = output_dir
+		self.label = label
+		self.files = []
+		self.__profile = None
+		self.__started = None
+		self.__outer = None
+
+	def path(self, name):
+		return os.path.join(self.output_dir, f"{PREFIX}{name}")
+
+	def __enter__(self):
+		global _tracemalloc_users, _tracemalloc_started
+		os.makedirs(self.output_dir, exist_ok=True)
+		with _tracemalloc_lock:
+			if _tracemalloc_users == 0:
+				_tracemalloc_started = not tracemalloc.is_tracing()
+				if _tracemalloc_started:
+					tracemalloc.start(10)
+			_tracemalloc_users += 1
+		import cProfile
+		self.__profile = cProfile.Profile()
+		try:
+			self.__profile.enable()
+		except ValueError as e:
+			# Python 3.12+ allows one active profiler per process
+			logger_config.warning(f"cProfile unavailable for {self.output_dir}: {e}")
+			self.__profile = None
+		# A nested session hands the thread back to the one around it on exit
+		self.__outer = active_session()
+		_local.session = self
+		self.__started = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		global _tracemalloc_users, _tracemalloc_started
+		elapsed = time.perf_counter() - self.__started
+		_local.session = self.__outer
+		self.__outer = None
+		if self.__profile is not None:
+			self.__profile.disable()
+		try:
+			snapshot = tracemalloc.take_snapshot()
+			current, peak = tracemalloc.get_traced_memory()
+		finally:
+			with _tracemalloc_lock:
+				_tracemalloc_users -= 1
+				if _tracemalloc_users == 0 and _tracemalloc_started:
+					tracemalloc.stop()
+					_tracemalloc_started = False
+
+		try:
+			if self.__profile is not None:
+				self.files.extend(write_cprofile(self.__profile, self.output_dir, "cprofile"))
+			self.__write_tracemalloc(snapshot, current, peak, elapsed, exc)
+			logger_config.info(f"Profile of {self.label} written to {self.output_dir}.")
+		except Exception as e:
+			logger_config.warning(f"Failed to write profile to {self.output_dir}: {e}")
+		return False
+
+	def __write_tracemalloc(self, snapshot, current, peak, elapsed, exc):
+		text_path = self.path("tracemalloc.txt")
+		with open(text_path, "w") as f:
+			f.write(f"{self.label}: {elapsed:.3f}s{f' (failed: {exc})' if exc else ''}\n")
+			f.write(f"traced memory: current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n\n")
+			f.write(f"Top {TOP_ENTRIES} allocation sites still alive at the end:\n")
+			for stat in snapshot.statistics("lineno")[:TOP_ENTRIES]:
+				f.write(f"{stat}\n")
+		if _keep_within_limit(text_path):
+			self.files.append(text_path)
+
+		snapshot_path = self.path("tracemalloc.snapshot")
+		snapshot.dump(snapshot_path)
+		if _keep_within_limit(snapshot_path):
+			self.files.append(snapshot_path)
+
+_local = threading.local()
+
+def active_session():
+	"""The ProfileSession running on this thread, if any."""
+	return getattr(_local, "session", None)
+
+def list_profiles(job_dir):
+	"""
+	Returns:
+		list: {"name", "bytes", "modified"} for each profile dump of a job, by name
+	"""
+	if not os.path.isdir(job_dir):
+		return []
+	profiles = []
+	for name in sorted(os.listdir(job_dir)):
+		file_path = os.path.join(job_dir, name)
+		if name.startswith(PREFIX) and os.path.isfile(file_path):
+			profiles.append({"name": name, "bytes": os.path.getsize(file_path), "modified": os.path.getmtime(file_path)})
+	return profiles
+
+def prune_profiles(root, keep=None):
+	"""
+	Delete the profile dumps of all but the newest `keep` profiled jobs under `root`
+	(the artifact store). The jobs' other artifacts are left alone.
+
+	Args:
+		keep: Jobs whose profiles are kept. Defaults to MUSIC_COMPOSER_PROFILE_KEEP or 20
+
+	Returns:
+		int: Number of files removed
+	"""
+	keep = int(keep if keep is not None else os.getenv("MUSIC_COMPOSER_PROFILE_KEEP", 20))
+	profiled = []
+	for job_id in os.listdir(root):
+		profiles = list_profiles(os.path.join(root, job_id))
+		if profiles:
+			profiled.append((max(profile["modified"] for profile in profiles), job_id, profiles))
+	profiled.sort(reverse=True)
+
+	removed = 0
+	for _, job_id, profiles in profiled[keep:]:
+		for profile in profiles:
+			try:
+				os.remove(os.path.join(root, job_id, profile["name"]))
+				removed += 1
+			except OSError:
+				pass
+	return removed
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from custom_logger import logger_config
+
+# Cached file name -> key of the generation path it is restored to (see MusicComposer)
+CACHED_FILES = {
+	"output.wav": "wav",
+	"output.flac": "flac",
+	"output.opus": "opus",
+	"output.mp3": "mp3",
+	"output.mid": "midi"
+}
+# An entry is only usable if it holds rendered audio
+AUDIO_FILES = ("output.wav", "output.flac", "output.opus", "output.mp3")
+
+def _normalize(value):
+	"""Make equal compositions serialise identically (1 == 1.0, key order, name case)."""
+	if isinstance(value, dict):
+		normalized = {key: _normalize(val) for key, val in value.items()}
+		if isinstance(normalized.get("instrument"), str):
+			normalized["instrument"] = normalized["instrument"].lower()
+		return normalized
+	if isinstance(value, (list, tuple)):
+		return [_normalize(val) for val in value]
+	if isinstance(value, float) and value.is_integer():
+		return int(value)
+	return value
+
+def composition_hash(music_data) -> str:
+	"""Stable SHA-256 of a composition, independent of key order and number formatting."""
+	payload = json.dumps(_normalize(music_data), sort_keys=True, separators=(",", ":"))
+	return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def soundfont_identity(soundfont_path) -> str:
+	"""Identify a soundfont by path, size and modification time without hashing it."""
+	try:
+		stat = os.stat(soundfont_path)
+		return f"{os.path.abspath(soundfont_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+	except OSError:
+		return os.path.abspath(soundfont_path)
+
+def unlink_output(path):
+	"""
+	Remove an output file before it is rewritten. fetch() hard-links cache entries into
+	the output paths, so writing through the old file in place would corrupt the entry.
+	"""
+	if os.path.lexists(path):
+		os.remove(path)
+
+def _link_or_copy(src, dst):
+	if os.path.exists(dst):
+		os.remove(dst)
+	try:
+		os.link(src, dst)
+	except OSError:
+		shutil.copyfile(src, dst)
+
+class RenderCache:
+	"""
+	Content-addressed cache of rendered audio and MIDI files (score images have their own
+	cache, see ScoreRenderer).
+
+	Entries are keyed on the normalised composition plus everything that changes the
+	rendered audio: soundfont identity, sample rate, tick resolution and output format.
+	Least recently used entries are evicted once the cache grows beyond `max_bytes`.
+	"""
+
+	def __init__(self, root=None, max_bytes=None):
+		"""
+		Args:
+			root: Cache directory. Defaults to <MUSIC_COMPOSER_BASE_PATH>/render_cache
+			max_bytes: Size budget. Defaults to MUSIC_COMPOSER_RENDER_CACHE_MAX_BYTES or 512 MiB
+		"""
+		base_path = os.getenv("MUSIC_COMPOSER_BASE_PATH", os.path.dirname(os.path.abspath(__file__)))
+		self.root = root or os.path.join(base_path, "render_cache")
+		self.max_bytes = int(max_bytes or os.getenv("MUSIC_COMPOSER_RENDER_CACHE_MAX_BYTES", 512 * 1024 ** 2))
+		self.hits = 0
+		self.misses = 0
+		os.makedirs(self.root, exist_ok=True)
+
+		self.__lock = threading.Lock()
+		self.__entries = OrderedDict()
+		self.__total_bytes = 0
+		self.__load_index()
+
+	def __entry_size(self, entry_dir):
+		return sum(
+			os.path.getsize(os.path.join(entry_dir, filename))
+			for filename in os.listdir(entry_dir)
+			if os.path.isfile(os.path.join(entry_dir, filename))
+		)
+
+	def __load_index(self):
+		# Recency survives restarts through the entry directory's mtime
+		entries = []
+		for key in os.listdir(self.root):
+			entry_dir = os.path.join(self.root, key)
+			if key.startswith(".") or not os.path.isdir(entry_dir):
+				continue
+			entries.append((os.path.getmtime(entry_dir), key, self.__entry_size(entry_dir)))
+		for _, key, size in sorted(entries):
+			self.__entries[key] = size
+			self.__total_bytes += size
+
+	@staticmethod
+	def key(music_data, soundfont_path, sample_rate, ticks_per_beat, output_format="wav") -> str:
+		parts = [
+			composition_hash(music_data),
+			soundfont_identity(soundfont_path),
+			str(sample_rate),
+			str(ticks_per_beat)
+		]
+		# WAV keys predate compressed formats and stay unchanged
+		if output_format != "wav":
+			parts.append(output_format)
+		return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+	def fetch(self, key, paths) -> bool:
+		"""
+		Restore a cached render into `paths` (audio and midi entries).
+
+		Returns:
+			bool: True on a hit
+		"""
+		with self.__lock:
+			entry_dir = os.path.join(self.root, key)
+			if key not in self.__entries or not any(os.path.isfile(os.path.join(entry_dir, filename)) for filename in AUDIO_FILES):
+				self.misses += 1
+				return False
+
+			for filename, path_key in CACHED_FILES.items():
+				src = os.path.join(entry_dir, filename)
+				if os.path.isfile(src) and paths.get(path_key):
+					_link_or_copy(src, paths[path_key])
+
+			self.__entries.move_to_end(key)
+			os.utime(entry_dir)
+			self.hits += 1
+			return True
+
+	def store(self, key, paths, path_keys):
+		"""
+		Copy a finished render into the cache and evict down to the byte budget.
+
+		Args:
+			key: Cache key (see key())
+			paths: Generation paths
+			path_keys: Entries of `paths` written by this render, e.g. ("midi", "wav").
+				Other files at those paths may be left over from an earlier run
+		"""
+		tmp_dir = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+		try:
+			os.makedirs(tmp_dir)
+			for filename, path_key in CACHED_FILES.items():
+				src = paths.get(path_key)
+				if path_key in path_keys and src and os.path.isfile(src):
+					shutil.copyfile(src, os.path.join(tmp_dir, filename))
+			size = self.__entry_size(tmp_dir)
+
+			with self.__lock:
+				entry_dir = os.path.join(self.root, key)
+				if key in self.__entries:
+					shutil.rmtree(tmp_dir, ignore_errors=True)
+					return
+				os.rename(tmp_dir, entry_dir)
+				self.__entries[key] = size
+				self.__total_bytes += size
+				self.__evict()
+		except Exception as e:
+			shutil.rmtree(tmp_dir, ignore_errors=True)
+			logger_config.warning(f"Failed to cache render {key}: {e}")
+
+	def __evict(self):
+		while self.__total_bytes > self.max_bytes and len(self.__entries) > 1:
+			key, size = self.__entries.popitem(last=False)
+			shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+			self.__total_bytes -= size
+
+	def stats(self):
+		with self.__lock:
+			return {
+				"hits": self.hits,
+				"misses": self.misses,
+				"entries": len(self.__entries),
+				"bytes": self.__total_bytes
+			}
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_render_cache():
+	"""
+	Process-wide render cache, or None when MUSIC_COMPOSER_RENDER_CACHE is set to 0/false.
+	"""
+	global _default_cache
+	if os.getenv("MUSIC_COMPOSER_RENDER_CACHE", "1").lower() in ("0", "false", "no"):
+		return None
+	with _default_cache_lock:
+		if _default_cache is None:
+			_default_cache = RenderCache()
+		return _default_cache
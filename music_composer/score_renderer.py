@@ -0,0 +1,204 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from custom_logger import logger_config
+from .render_cache import composition_hash, _link_or_copy
+from .worker_pool import child_env
+from . import metrics
+
+def _engrave(music_data, output_base, profile_dir=None):
+	"""Engrave in the current process. Runs in the child started by ScoreRenderer."""
+	from .create_notes import image_notes
+	if not profile_dir:
+		image_notes(music_data, output_base)
+		return
+	import cProfile
+	from .profiling import write_cprofile
+	profile = cProfile.Profile()
+	try:
+		profile.runcall(image_notes, music_data, output_base)
+	finally:
+		write_cprofile(profile, profile_dir, "score")
+
+class ScoreRenderer:
+	"""
+	Renders score images in the background, off the audio critical path.
+
+	Each render runs music21 and LilyPond in a child Python process (`python -m
+	music_composer.score_renderer`) with a timeout, and finished images are cached by
+	composition so a repeated piece is engraved once. The child never imports the
+	caller's __main__, so scripts that generate at module level are safe.
+	"""
+
+	def __init__(self, root=None, max_workers=None, timeout=None, max_bytes=None):
+		"""
+		Args:
+			root: Cache directory. Defaults to <MUSIC_COMPOSER_BASE_PATH>/score_cache
+			max_workers: Concurrent renders. Defaults to MUSIC_COMPOSER_SCORE_WORKERS or 1
+			timeout: Seconds before a render is killed. Defaults to MUSIC_COMPOSER_SCORE_TIMEOUT or 60
+			max_bytes: Cache size budget. Defaults to MUSIC_COMPOSER_SCORE_CACHE_MAX_BYTES or 128 MiB
+		"""
+		base_path = os.getenv("MUSIC_COMPOSER_BASE_PATH", os.path.dirname(os.path.abspath(__file__)))
+		self.root = root or os.path.join(base_path, "score_cache")
+		self.max_workers = max_workers or int(os.getenv("MUSIC_COMPOSER_SCORE_WORKERS", 1))
+		self.timeout = float(timeout or os.getenv("MUSIC_COMPOSER_SCORE_TIMEOUT", 60))
+		self.max_bytes = int(max_bytes or os.getenv("MUSIC_COMPOSER_SCORE_CACHE_MAX_BYTES", 128 * 1024 ** 2))
+		self.hits = 0
+		self.misses = 0
+		self.timeouts = 0
+		os.makedirs(self.root, exist_ok=True)
+
+		self.__executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="score-render")
+		self.__lock = threading.Lock()
+		# Output path -> Future, so callers can wait for a specific image
+		self.__pending = {}
+
+	def submit(self, music_data, output_png, profile_dir=None):
+		"""
+		Queue a score render. Returns immediately.
+
+		Args:
+			music_data: Composition dict (not read back from disk)
+			output_png: Where the image is written
+			profile_dir: Write a cProfile of the engraving here (see profiling)
+
+		Returns:
+			concurrent.futures.Future: Resolves to output_png, or None if rendering failed
+		"""
+		future = self.__executor.submit(self.render, music_data, output_png, profile_dir)
+		with self.__lock:
+			self.__pending[output_png] = future
+		future.add_done_callback(lambda _: self.__forget(output_png, future))
+		return future
+
+	def __forget(self, output_png, future):
+		with self.__lock:
+			if self.__pending.get(output_png) is future:
+				del self.__pending[output_png]
+
+	def wait(self, output_png, timeout=None):
+		"""
+		Wait for a queued render of `output_png`.
+
+		Returns:
+			str: output_png if the image exists, otherwise None
+		"""
+		with self.__lock:
+			future = self.__pending.get(output_png)
+		if future is not None:
+			try:
+				future.result(timeout)
+			except Exception:
+				pass
+		return output_png if os.path.isfile(output_png) else None
+
+	def render(self, music_data, output_png, profile_dir=None):
+		"""
+		Render a score image now, from the cache when possible. A cache hit is not profiled.
+
+		Returns:
+			str: output_png, or None if rendering failed or timed out
+		"""
+		try:
+			cached_png = os.path.join(self.root, f"{composition_hash(music_data)}.png")
+			if os.path.isfile(cached_png):
+				with self.__lock:
+					self.hits += 1
+				os.utime(cached_png)
+				_link_or_copy(cached_png, output_png)
+				return output_png
+
+			with self.__lock:
+				self.misses += 1
+			tmp_base = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+			try:
+				with metrics.stage("score") as span:
+					span["failed"] = not self.__engrave(music_data, tmp_base, profile_dir)
+				if span["failed"]:
+					return None
+				os.replace(f"{tmp_base}.png", cached_png)
+			finally:
+				if os.path.exists(f"{tmp_base}.png"):
+					os.remove(f"{tmp_base}.png")
+			self.__evict()
+			_link_or_copy(cached_png, output_png)
+			logger_config.info(f"Score image created: {output_png}")
+			return output_png
+		except Exception as e:
+			logger_config.warning(f"Failed to render score {output_png}: {e}")
+			return None
+
+	def __engrave(self, music_data, output_base, profile_dir=None):
+		json_path = f"{output_base}.json"
+		with open(json_path, "w") as f:
+			json.dump(music_data, f)
+		command = [sys.executable, "-m", "music_composer.score_renderer", json_path, output_base] + ([profile_dir] if profile_dir else [])
+		try:
+			# Own process group, so a timeout also kills the LilyPond process music21 starts
+			process = subprocess.Popen(command, env=child_env(), stdout=subprocess.DEVNULL, start_new_session=True)
+			try:
+				process.wait(self.timeout)
+			except subprocess.TimeoutExpired:
+				with self.__lock:
+					self.timeouts += 1
+				logger_config.warning(f"Score rendering timed out after {self.timeout:g}s.")
+				try:
+					os.killpg(process.pid, signal.SIGKILL)
+				except (AttributeError, OSError):
+					process.kill()
+				process.wait()
+				return False
+		finally:
+			os.remove(json_path)
+		return os.path.isfile(f"{output_base}.png")
+
+	def __evict(self):
+		with self.__lock:
+			entries = []
+			for filename in os.listdir(self.root):
+				path = os.path.join(self.root, filename)
+				if filename.endswith(".png") and not filename.startswith(".") and os.path.isfile(path):
+					stat = os.stat(path)
+					entries.append((stat.st_mtime, stat.st_size, path))
+			total = sum(size for _, size, _ in entries)
+			for _, size, path in sorted(entries):
+				if total <= self.max_bytes:
+					break
+				os.remove(path)
+				total -= size
+
+	def stats(self):
+		with self.__lock:
+			return {
+				"hits": self.hits,
+				"misses": self.misses,
+				"timeouts": self.timeouts,
+				"pending": len(self.__pending)
+			}
+
+	def shutdown(self, wait=True):
+		self.__executor.shutdown(wait=wait)
+
+_default_renderer = None
+_default_renderer_lock = threading.Lock()
+
+def get_default_score_renderer():
+	"""
+	Process-wide score renderer, or None when MUSIC_COMPOSER_SCORE is set to 0/false.
+	"""
+	global _default_renderer
+	if os.getenv("MUSIC_COMPOSER_SCORE", "1").lower() in ("0", "false", "no"):
+		return None
+	with _default_renderer_lock:
+		if _default_renderer is None:
+			_default_renderer = ScoreRenderer()
+		return _default_renderer
+
+if __name__ == "__main__":
+	# python -m music_composer.score_renderer <composition.json> <output_base> [profile_dir]
+	_engrave(*sys.argv[1:4])
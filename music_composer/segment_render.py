@@ -0,0 +1,335 @@
+"""
+Incremental re-rendering of edited compositions.
+
+The timeline is cut into fixed windows (MUSIC_COMPOSER_SEGMENT_SECONDS, default 5).
+Each window is rendered on its own from a reset synth: rendering starts at the onset of
+the earliest note that still sounds in the window (release tail included, and held
+on by the sustain pedal), with the controller, program and pitchwheel state its
+channels had at that point. Only the window's frames are kept.
+
+A window's audio therefore depends only on those events, so it is cached under a hash
+of them, with frames relative to the start of its render. When a few notes of a piece
+change, only the windows they sound in are synthesised again; the rest are spliced in
+from the cache. Repeated passages hit the cache too.
+"""
+import bisect
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from custom_logger import logger_config
+from .render_cache import soundfont_identity
+from .synth import CHANNELS, SAMPLE_WIDTH
+
+DEFAULT_WINDOW_SECONDS = 5.0
+# Controller that puts a channel's controllers back to their defaults
+_RESET_ALL_CONTROLLERS = 121
+# Sustain pedal: a note released while it is down sounds until the pedal is lifted
+_SUSTAIN = 64
+
+class SegmentCache:
+	"""
+	Rendered windows as raw PCM files, evicted least recently used first once the cache
+	grows beyond `max_bytes`.
+	"""
+
+	def __init__(self, root=None, max_bytes=None):
+		"""
+		Args:
+			root: Cache directory. Defaults to <MUSIC_COMPOSER_BASE_PATH>/segment_cache
+			max_bytes: Size budget. Defaults to MUSIC_COMPOSER_SEGMENT_CACHE_MAX_BYTES or 256 MiB
+		"""
+		base_path = os.getenv("MUSIC_COMPOSER_BASE_PATH", os.path.dirname(os.path.abspath(__file__)))
+		self.root = root or os.path.join(base_path, "segment_cache")
+		self.max_bytes = int(max_bytes or os.getenv("MUSIC_COMPOSER_SEGMENT_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+		self.hits = 0
+		self.misses = 0
+		os.makedirs(self.root, exist_ok=True)
+
+		self.__lock = threading.Lock()
+		self.__entries = OrderedDict()
+		self.__total_bytes = 0
+		# Recency survives restarts through the file mtime
+		entries = []
+		for name in os.listdir(self.root):
+			path = os.path.join(self.root, name)
+			if name.endswith(".pcm") and os.path.isfile(path):
+				entries.append((os.path.getmtime(path), name[:-len(".pcm")], os.path.getsize(path)))
+		for _, key, size in sorted(entries):
+			self.__entries[key] = size
+			self.__total_bytes += size
+
+	def __path(self, key):
+		return os.path.join(self.root, f"{key}.pcm")
+
+	def get(self, key):
+		"""
+		Returns:
+			bytes: The window's interleaved int16 stereo PCM, or None on a miss
+		"""
+		with self.__lock:
+			if key not in self.__entries:
+				self.misses += 1
+				return None
+			try:
+				with open(self.__path(key), "rb") as f:
+					data = f.read()
+				os.utime(self.__path(key))
+			except OSError:
+				self.__total_bytes -= self.__entries.pop(key)
+				self.misses += 1
+				return None
+			self.__entries.move_to_end(key)
+			self.hits += 1
+			return data
+
+	def put(self, key, data):
+		tmp_path = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+		try:
+			with open(tmp_path, "wb") as f:
+				f.write(data)
+			with self.__lock:
+				if key in self.__entries:
+					os.remove(tmp_path)
+					return
+				os.replace(tmp_path, self.__path(key))
+				self.__entries[key] = len(data)
+				self.__total_bytes += len(data)
+				self.__evict()
+		except Exception as e:
+			if os.path.exists(tmp_path):
+				os.remove(tmp_path)
+			logger_config.warning(f"Failed to cache window {key}: {e}")
+
+	def __evict(self):
+		while self.__total_bytes > self.max_bytes and len(self.__entries) > 1:
+			key, size = self.__entries.popitem(last=False)
+			try:
+				os.remove(self.__path(key))
+			except OSError:
+				pass
+			self.__total_bytes -= size
+
+	def stats(self):
+		with self.__lock:
+			return {
+				"hits": self.hits,
+				"misses": self.misses,
+				"entries": len(self.__entries),
+				"bytes": self.__total_bytes
+			}
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def segment_render_enabled():
+	return os.getenv("MUSIC_COMPOSER_SEGMENT_RENDER", "0").lower() in ("1", "true", "yes")
+
+def get_default_segment_cache():
+	"""Process-wide window cache, or None unless MUSIC_COMPOSER_SEGMENT_RENDER is set."""
+	global _default_cache
+	if not segment_render_enabled():
+		return None
+	with _default_cache_lock:
+		if _default_cache is None:
+			_default_cache = SegmentCache()
+		return _default_cache
+
+def timed_messages(midi, sample_rate):
+	"""
+	Returns:
+		list: (frame, Message) pairs of a MidiFile's merged tracks, meta messages left out.
+		Frames are rounded like InProcessSynth.iter_blocks does.
+	"""
+	messages = []
+	elapsed = 0.0
+	# Iterating a MidiFile merges its tracks and converts delta ticks to seconds
+	for message in midi:
+		elapsed += message.time
+		if not message.is_meta:
+			messages.append((int(round(elapsed * sample_rate)), message))
+	return messages
+
+def _pair_notes(messages, end_frame):
+	"""
+	Match note_on and note_off messages.
+
+	Returns:
+		list: (on_frame, off_frame, on_index, off_index) per note. Notes that are never
+		released end at `end_frame` and have no off_index.
+	"""
+	notes = []
+	sounding = {}
+	for index, (frame, message) in enumerate(messages):
+		if message.type == "note_on" and message.velocity > 0:
+			sounding.setdefault((message.channel, message.note), []).append((frame, index))
+		elif message.type in ("note_on", "note_off"):
+			started = sounding.get((message.channel, message.note))
+			if started:
+				on_frame, on_index = started.pop(0)
+				notes.append((on_frame, frame, on_index, index))
+	for started in sounding.values():
+		for on_frame, on_index in started:
+			notes.append((on_frame, end_frame, on_index, None))
+	return notes
+
+def _release_frames(messages, notes, end_frame):
+	"""
+	Frame at which each note starts its release. A note_off that arrives while its
+	channel's sustain pedal is down (CC64 >= 64) only takes effect when the pedal is
+	lifted or the controllers are reset; if that never happens the note sounds to
+	`end_frame`.
+
+	Args:
+		notes: Notes as returned by _pair_notes
+
+	Returns:
+		list: One frame per note, in the order of `notes`
+	"""
+	releases = [off_frame for _, off_frame, _, _ in notes]
+	note_offs = {off_index: position for position, (_, _, _, off_index) in enumerate(notes) if off_index is not None}
+	pedal_down = set()
+	held = {}
+	for index, (frame, message) in enumerate(messages):
+		if message.type == "control_change" and message.control in (_SUSTAIN, _RESET_ALL_CONTROLLERS):
+			if message.control == _SUSTAIN and message.value >= 64:
+				pedal_down.add(message.channel)
+			else:
+				pedal_down.discard(message.channel)
+				for position in held.pop(message.channel, []):
+					releases[position] = frame
+		elif index in note_offs and message.channel in pedal_down:
+			position = note_offs[index]
+			releases[position] = end_frame
+			held.setdefault(message.channel, []).append(position)
+	return releases
+
+def _state_key(message):
+	if message.type == "control_change":
+		return message.control
+	if message.type == "program_change":
+		return "program"
+	if message.type == "pitchwheel":
+		return "pitch"
+	return None
+
+class SegmentRenderer:
+	"""
+	Renders a MidiFile window by window through an InProcessSynth, reusing cached
+	windows (see the module docstring).
+	"""
+
+	def __init__(self, synth, cache, window_seconds=None):
+		"""
+		Args:
+			synth: InProcessSynth to render missing windows with
+			cache: SegmentCache holding rendered windows
+			window_seconds: Window length. Defaults to MUSIC_COMPOSER_SEGMENT_SECONDS or 5
+		"""
+		self.synth = synth
+		self.cache = cache
+		self.window_seconds = float(window_seconds or os.getenv("MUSIC_COMPOSER_SEGMENT_SECONDS", DEFAULT_WINDOW_SECONDS))
+		self.rendered_windows = 0
+		self.cached_windows = 0
+
+	def __identity(self):
+		return [soundfont_identity(self.synth.soundfont_path), self.synth.sample_rate, self.synth.tail_seconds]
+
+	def iter_blocks(self, midi):
+		"""
+		Args:
+			midi: MidiFile or path to one
+
+		Yields:
+			numpy.ndarray | bytes: Interleaved int16 stereo PCM, one window at a time.
+			The piece ends with the synth's release tail, like InProcessSynth.iter_blocks
+		"""
+		import numpy as np
+		if isinstance(midi, (str, os.PathLike)):
+			from mido import MidiFile
+			midi = MidiFile(midi)
+		sample_rate = self.synth.sample_rate
+		messages = timed_messages(midi, sample_rate)
+		tail_frames = int(self.synth.tail_seconds * sample_rate)
+		total_frames = (messages[-1][0] if messages else 0) + tail_frames
+		window_frames = max(1, int(self.window_seconds * sample_rate))
+		window_count = max(1, -(-total_frames // window_frames))
+
+		# Notes sounding in each window, counting the sustain pedal and their release tail
+		window_notes = [[] for _ in range(window_count)]
+		notes = _pair_notes(messages, total_frames)
+		for note, release_frame in zip(notes, _release_frames(messages, notes, total_frames)):
+			first = note[0] // window_frames
+			last = min(window_count - 1, (release_frame + tail_frames - 1) // window_frames)
+			for window in range(first, last + 1):
+				window_notes[window].append(note)
+
+		# Controller, program and pitchwheel messages per channel, for state and replay
+		controls = {}
+		for index, (frame, message) in enumerate(messages):
+			if _state_key(message) is not None:
+				channel_controls = controls.setdefault(message.channel, ([], []))
+				channel_controls[0].append(frame)
+				channel_controls[1].append(index)
+
+		self.rendered_windows = 0
+		self.cached_windows = 0
+		identity = self.__identity()
+		for window in range(window_count):
+			start = window * window_frames
+			frames = min(window_frames, total_frames - start)
+			notes = window_notes[window]
+			if not notes:
+				yield np.zeros(frames * CHANNELS, dtype=np.int16)
+				continue
+
+			render_start = min(start, min(note[0] for note in notes))
+			state, events = self.__window_events(messages, notes, controls, render_start, start + frames)
+			timed = [(0, messages[index][1]) for index in state] + [(messages[index][0] - render_start, messages[index][1]) for index in events]
+			# The state messages are listed first, so they are told apart from replayed ones by count
+			payload = identity + [start - render_start, frames, len(state), [[frame] + message.bytes() for frame, message in timed]]
+			key = hashlib.sha256(json.dumps(payload, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+			data = self.cache.get(key)
+			if data is None or len(data) != frames * CHANNELS * SAMPLE_WIDTH:
+				samples = self.synth.render_span(timed, start - render_start, frames)
+				data = samples.tobytes()
+				self.cache.put(key, data)
+				self.rendered_windows += 1
+			else:
+				self.cached_windows += 1
+			yield data
+		logger_config.info(f"Rendered {self.rendered_windows} of {window_count} windows, {self.cached_windows} from cache.")
+
+	def __window_events(self, messages, notes, controls, render_start, end):
+		"""
+		Returns:
+			tuple: (indices of the messages that set the channels' state at render_start,
+			indices of the messages replayed from render_start to `end`), in playback order
+		"""
+		channels = sorted({messages[note[2]][1].channel for note in notes})
+		state = []
+		replayed = []
+		for channel in channels:
+			frames, indices = controls.get(channel, ([], []))
+			split = bisect.bisect_left(frames, render_start)
+			# Last value of each controller before the render starts, in the order they were set
+			latest = OrderedDict()
+			for index in indices[:split]:
+				message = messages[index][1]
+				if message.type == "control_change" and message.control == _RESET_ALL_CONTROLLERS:
+					latest = OrderedDict((key, value) for key, value in latest.items() if key == "program")
+				state_key = _state_key(message)
+				latest.pop(state_key, None)
+				latest[state_key] = index
+			state.extend(latest.values())
+			replayed.extend(index for frame, index in zip(frames[split:], indices[split:]) if frame < end)
+
+		for _, off_frame, on_index, off_index in notes:
+			replayed.append(on_index)
+			if off_index is not None and off_frame < end:
+				replayed.append(off_index)
+		replayed.sort()
+		return state, replayed
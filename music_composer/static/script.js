@@ -25,6 +25,10 @@ const timeDisplay = document.querySelector('.time-display');
 const waveformElement = document.querySelector('.waveform');
 const textInput = document.getElementById("textInput");
 var output_path = "/static/output.wav";
+const JOB_POLL_INTERVAL_MS = 1000;
+// Start playback while the server is still synthesising instead of waiting for a job.
+// The server can turn this off (stream_playback in /api/settings).
+let streamPlayback = true;
 
 /**
  * SVG Icons
@@ -138,6 +142,9 @@ const SettingsManager = {
 				output_path = data.output_path
 				loadAudio()
 			}
+			if (data.stream_playback !== undefined) {
+				streamPlayback = data.stream_playback;
+			}
 		} catch (err) {
 			console.error("Failed to load settings:", err);
 		}
@@ -241,7 +248,12 @@ const MusicGenerator = {
 		generateButton.textContent = "Imagine...";
 
 		try {
-			const response = await fetch('/api/generate', {
+			if (this.canStream()) {
+				await this.stream(currentSelection);
+				return;
+			}
+
+			const response = await fetch('/api/jobs', {
 				method: 'POST',
 				headers: { 'Content-Type': 'application/json' },
 				body: JSON.stringify({
@@ -250,11 +262,14 @@ const MusicGenerator = {
 				})
 			});
 
-			const data = await response.json();
+			const job = await response.json();
 			if (!response.ok) {
-				throw new Error(data.message || 'Generation failed');
+				throw new Error(job.error || 'Generation failed');
 			}
 
+			await this.waitForJob(job.job_id);
+			const result = await (await fetch(`/api/jobs/${job.job_id}/result`)).json();
+			output_path = result.url;
 			loadAudio();
 		} catch (err) {
 			console.error("Error generating music:", err);
@@ -265,6 +280,55 @@ const MusicGenerator = {
 		}
 	},
 
+	// Streamed WAV needs server support and a player that can decode WAV
+	canStream() {
+		return streamPlayback && audio.canPlayType('audio/wav') !== '';
+	},
+
+	// Point the player at a streaming render; the finished file stays available for download
+	async stream(currentSelection) {
+		const response = await fetch('/api/streams', {
+			method: 'POST',
+			headers: { 'Content-Type': 'application/json' },
+			body: JSON.stringify({
+				text: textInput.value,
+				instruments: currentSelection
+			})
+		});
+
+		const stream = await response.json();
+		if (!response.ok) {
+			throw new Error(stream.error || 'Generation failed');
+		}
+
+		output_path = stream.file_url;
+		audio.src = stream.stream_url;
+		audio.load();
+		await new Promise((resolve, reject) => {
+			audio.addEventListener('canplay', resolve, { once: true });
+			audio.addEventListener('error', () => reject(new Error('Generation failed')), { once: true });
+		});
+		audio.play().catch(err => console.error("Error playing audio:", err));
+	},
+
+	// Poll the job until it finishes, showing the running stage on the button
+	async waitForJob(jobId) {
+		while (true) {
+			const response = await fetch(`/api/jobs/${jobId}`);
+			const job = await response.json();
+			if (!response.ok || job.status === 'failed') {
+				throw new Error(job.error || 'Generation failed');
+			}
+			if (job.status === 'done') {
+				return job;
+			}
+			if (job.stage) {
+				generateButton.textContent = `Imagine... (${job.stage})`;
+			}
+			await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+		}
+	},
+
 	initialize: function () {
 		generateButton.addEventListener('click', () => this.generate());
 	}
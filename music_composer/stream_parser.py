@@ -0,0 +1,117 @@
+import json
+from custom_logger import logger_config
+
+class IncrementalNoteParser:
+	"""
+	Incremental parser for a streamed composition JSON object.
+
+	Text is fed in arbitrary chunks as the model produces it. Each object in the
+	top-level "notes" array is decoded as soon as its closing brace arrives, so callers
+	can compile notes while the rest of the response is still being generated. Only new
+	characters are scanned and only the text of an unfinished note or key is kept for
+	the next chunk, so total work is linear in the response size.
+	"""
+
+	def __init__(self):
+		# Every chunk, joined once the response is complete
+		self.__chunks = []
+		# Text from the start of an unfinished note or key to the end of the last chunk
+		self.__pending = ""
+		self.__depth = 0
+		self.__in_string = False
+		self.__escaped = False
+		self.__string_start = None
+		self.__last_key = None
+		# Depth of the top-level "notes" array once it is open
+		self.__notes_depth = None
+		self.__note_start = None
+		self.notes_emitted = 0
+
+	def feed(self, chunk):
+		"""
+		Consume the next piece of the response.
+
+		Args:
+			chunk: Text as received from the model
+
+		Returns:
+			list: Note dicts completed by this chunk, in response order
+		"""
+		if not chunk:
+			return []
+		self.__chunks.append(chunk)
+		text = self.__pending + chunk
+		completed = []
+
+		for index in range(len(self.__pending), len(text)):
+			char = text[index]
+			if self.__in_string:
+				if self.__escaped:
+					self.__escaped = False
+				elif char == "\\":
+					self.__escaped = True
+				elif char == '"':
+					self.__in_string = False
+					if self.__depth == 1:
+						# Strings directly inside the top-level object are its keys (or string values)
+						self.__last_key = text[self.__string_start + 1:index]
+				continue
+
+			if char == '"':
+				self.__in_string = True
+				self.__string_start = index
+			elif char in "{[":
+				self.__depth += 1
+				if char == "[" and self.__depth == 2 and self.__last_key == "notes":
+					self.__notes_depth = 2
+				elif char == "{" and self.__notes_depth is not None and self.__depth == self.__notes_depth + 1:
+					self.__note_start = index
+			elif char in "}]":
+				if char == "}" and self.__note_start is not None and self.__depth == self.__notes_depth + 1:
+					note = self.__decode(text[self.__note_start:index + 1])
+					if note is not None:
+						completed.append(note)
+					self.__note_start = None
+				elif char == "]" and self.__depth == self.__notes_depth:
+					self.__notes_depth = None
+				self.__depth -= 1
+
+		# Keep only what an unfinished note or top-level key still needs
+		if not self.__in_string:
+			self.__string_start = None
+		starts = [start for start in (self.__note_start, self.__string_start) if start is not None]
+		consumed = min(starts) if starts else len(text)
+		self.__pending = text[consumed:]
+		if self.__note_start is not None:
+			self.__note_start -= consumed
+		if self.__string_start is not None:
+			self.__string_start -= consumed
+
+		self.notes_emitted += len(completed)
+		return completed
+
+	def __decode(self, note_text):
+		try:
+			note = json.loads(note_text)
+		except ValueError as e:
+			logger_config.warning(f"Skipping malformed streamed note: {e}")
+			return None
+		return note if isinstance(note, dict) else None
+
+	@property
+	def text(self):
+		if len(self.__chunks) > 1:
+			self.__chunks = ["".join(self.__chunks)]
+		return "".join(self.__chunks)
+
+	def finish(self):
+		"""
+		Decode the complete response once the stream has ended.
+
+		Returns:
+			dict: The full composition
+
+		Raises:
+			ValueError: If the response is not a complete JSON object
+		"""
+		return json.loads(self.text)
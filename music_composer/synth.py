@@ -0,0 +1,281 @@
+import os
+import struct
+import subprocess
+import threading
+import wave
+from functools import lru_cache
+from custom_logger import logger_config
+
+CHANNELS = 2
+SAMPLE_WIDTH = 2  # 16-bit PCM
+# Size of the canonical PCM header written by wave and wav_header
+WAV_HEADER_BYTES = 44
+
+def write_wav(path, pcm_blocks, sample_rate):
+	"""
+	Write interleaved int16 stereo blocks to a WAV file.
+
+	Returns:
+		int: Number of PCM bytes written
+	"""
+	written = 0
+	# Never write through a hard link shared with a render cache entry
+	if os.path.lexists(path):
+		os.remove(path)
+	with wave.open(path, "wb") as wav:
+		wav.setnchannels(CHANNELS)
+		wav.setsampwidth(SAMPLE_WIDTH)
+		wav.setframerate(sample_rate)
+		for block in pcm_blocks:
+			data = block.tobytes() if hasattr(block, "tobytes") else block
+			wav.writeframes(data)
+			written += len(data)
+	return written
+
+def wav_header(sample_rate, data_size=0xFFFFFFFF):
+	"""
+	RIFF/WAVE header for 16-bit stereo PCM. The default sizes mark an open-ended
+	stream, which players accept for audio that is still being rendered.
+	"""
+	byte_rate = sample_rate * CHANNELS * SAMPLE_WIDTH
+	riff_size = min(0xFFFFFFFF, data_size + 36)
+	return b"".join([
+		b"RIFF", struct.pack("<I", riff_size), b"WAVE",
+		b"fmt ", struct.pack("<IHHIIHH", 16, 1, CHANNELS, sample_rate, byte_rate, CHANNELS * SAMPLE_WIDTH, SAMPLE_WIDTH * 8),
+		b"data", struct.pack("<I", data_size)
+	])
+
+def iter_file(path, chunk_size=64 * 1024):
+	"""Yield a file's bytes in chunks."""
+	with open(path, "rb") as f:
+		while True:
+			chunk = f.read(chunk_size)
+			if not chunk:
+				return
+			yield chunk
+
+def read_wav(path):
+	"""
+	Returns:
+		tuple: (int16 array of shape (frames, 2), sample_rate)
+	"""
+	import numpy as np
+	with wave.open(path, "rb") as wav:
+		sample_rate = wav.getframerate()
+		frames = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+		channels = wav.getnchannels()
+	frames = frames.reshape(-1, channels)
+	if channels == 1:
+		frames = np.repeat(frames, CHANNELS, axis=1)
+	return frames, sample_rate
+
+class SubprocessSynth:
+	"""
+	Renders with the fluidsynth command line tool. Reloads the soundfont on every call,
+	but needs nothing beyond the fluidsynth binary.
+	"""
+	name = "subprocess"
+
+	def __init__(self, soundfont_path, sample_rate=44100):
+		self.soundfont_path = soundfont_path
+		self.sample_rate = sample_rate
+
+	def render_file(self, midi, output_wav):
+		"""
+		Args:
+			midi: Path to a MIDI file, or a MidiFile (saved next to the output first)
+			output_wav: WAV file to write
+
+		Returns:
+			str: output_wav
+		"""
+		midi_path = midi
+		if not isinstance(midi, (str, os.PathLike)):
+			midi_path = f"{output_wav}.mid"
+			midi.save(midi_path)
+		try:
+			command = ["fluidsynth", "-ni", self.soundfont_path, midi_path, "-F", output_wav, "-r", str(self.sample_rate)]
+			subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+		finally:
+			if midi_path is not midi:
+				os.remove(midi_path)
+		return output_wav
+
+class InProcessSynth:
+	"""
+	Renders through libfluidsynth (pyfluidsynth) with the soundfont loaded once.
+
+	MIDI events are dispatched straight from a MidiFile in memory and audio is pulled
+	from the synth in blocks, so there is no process spawn or soundfont reload per
+	render. An instance is not thread-safe; use `get_synth` for one per thread.
+	"""
+	name = "inprocess"
+
+	def __init__(self, soundfont_path, sample_rate=44100, tail_seconds=1.0):
+		import fluidsynth
+
+		self.soundfont_path = soundfont_path
+		self.sample_rate = sample_rate
+		self.tail_seconds = tail_seconds
+		self.__synth = fluidsynth.Synth(samplerate=float(sample_rate))
+		self.__sfid = self.__synth.sfload(soundfont_path, 1)
+		if self.__sfid == -1:
+			raise RuntimeError(f"Failed to load soundfont {soundfont_path}")
+
+	def __dispatch(self, message):
+		synth = self.__synth
+		if message.type == "note_on":
+			if message.velocity == 0:
+				synth.noteoff(message.channel, message.note)
+			else:
+				synth.noteon(message.channel, message.note, message.velocity)
+		elif message.type == "note_off":
+			synth.noteoff(message.channel, message.note)
+		elif message.type == "control_change":
+			synth.cc(message.channel, message.control, message.value)
+		elif message.type == "program_change":
+			synth.program_change(message.channel, message.program)
+		elif message.type == "pitchwheel":
+			synth.pitch_bend(message.channel, message.pitch)
+
+	def iter_blocks(self, midi, block_frames=4096):
+		"""
+		Render a MIDI file block by block.
+
+		Args:
+			midi: MidiFile or path to one
+			block_frames: Frames per yielded block
+
+		Yields:
+			numpy.ndarray: Interleaved int16 stereo samples, `block_frames` frames each
+			except the last
+		"""
+		import numpy as np
+		if isinstance(midi, (str, os.PathLike)):
+			from mido import MidiFile
+			midi = MidiFile(midi)
+		self.__synth.system_reset()
+
+		pending = 0
+		elapsed = 0.0
+		rendered = 0
+		buffer = []
+
+		def pull(frames):
+			# Render `frames` frames and yield whole blocks as they fill up
+			nonlocal pending
+			while frames > 0:
+				chunk = min(frames, block_frames - pending)
+				buffer.append(self.__synth.get_samples(chunk))
+				pending += chunk
+				frames -= chunk
+				if pending == block_frames:
+					yield np.concatenate(buffer)
+					buffer.clear()
+					pending = 0
+
+		# Iterating a MidiFile merges its tracks and converts delta ticks to seconds
+		for message in midi:
+			elapsed += message.time
+			target = int(round(elapsed * self.sample_rate))
+			if target > rendered:
+				yield from pull(target - rendered)
+				rendered = target
+			if not message.is_meta:
+				self.__dispatch(message)
+
+		yield from pull(int(self.tail_seconds * self.sample_rate))
+		if buffer:
+			yield np.concatenate(buffer)
+
+	def render_span(self, messages, start_frame, frames):
+		"""
+		Render timed messages from a reset synth and keep only part of the output, e.g.
+		one window of a piece (see segment_render).
+
+		Args:
+			messages: (frame, Message) pairs in playback order, frames counted from the
+				start of this render
+			start_frame: Frames rendered before the kept part, which are discarded
+			frames: Frames to return
+
+		Returns:
+			numpy.ndarray: Interleaved int16 stereo samples, `frames` frames long
+		"""
+		import numpy as np
+		self.__synth.system_reset()
+		end = start_frame + frames
+		rendered = 0
+		kept = []
+
+		def pull(target):
+			nonlocal rendered
+			samples = self.__synth.get_samples(target - rendered)
+			if target > start_frame:
+				kept.append(samples[max(0, start_frame - rendered) * CHANNELS:])
+			rendered = target
+
+		for frame, message in messages:
+			if frame >= end:
+				break
+			if frame > rendered:
+				pull(frame)
+			self.__dispatch(message)
+		if end > rendered:
+			pull(end)
+		return np.concatenate(kept) if kept else np.zeros(frames * CHANNELS, dtype=np.int16)
+
+	def render(self, midi):
+		"""
+		Returns:
+			numpy.ndarray: Interleaved int16 stereo samples for the whole file
+		"""
+		import numpy as np
+		blocks = list(self.iter_blocks(midi))
+		return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.int16)
+
+	def render_file(self, midi, output_wav):
+		write_wav(output_wav, self.iter_blocks(midi), self.sample_rate)
+		return output_wav
+
+_local = threading.local()
+
+@lru_cache(maxsize=None)
+def inprocess_available():
+	try:
+		import fluidsynth  # noqa: F401
+		return True
+	except (ImportError, OSError):
+		return False
+
+def get_synth(soundfont_path, sample_rate=44100, backend=None):
+	"""
+	Synth for the calling thread. In-process synths are created once per thread and
+	soundfont, so the soundfont is only loaded once per worker.
+
+	Args:
+		soundfont_path: SoundFont (.sf2) to render with
+		sample_rate: Output sample rate
+		backend: "inprocess", "subprocess" or "auto" (default MUSIC_COMPOSER_SYNTH or auto).
+			auto uses the in-process synth when pyfluidsynth is installed.
+
+	Returns:
+		InProcessSynth | SubprocessSynth
+	"""
+	backend = (backend or os.getenv("MUSIC_COMPOSER_SYNTH", "auto")).lower()
+	if backend == "subprocess" or (backend == "auto" and not inprocess_available()):
+		return SubprocessSynth(soundfont_path, sample_rate)
+
+	synths = getattr(_local, "synths", None)
+	if synths is None:
+		synths = _local.synths = {}
+	key = (os.path.abspath(soundfont_path), sample_rate)
+	if key not in synths:
+		try:
+			synths[key] = InProcessSynth(soundfont_path, sample_rate)
+		except Exception as e:
+			if backend == "inprocess":
+				raise
+			logger_config.warning(f"In-process synth unavailable, using fluidsynth subprocess: {e}")
+			synths[key] = SubprocessSynth(soundfont_path, sample_rate)
+	return synths[key]
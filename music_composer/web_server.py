@@ -1,8 +1,20 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, render_template, request, jsonify, send_from_directory, abort, send_file, Response
 import os
+import uuid
+import time
+import struct
+import threading
+import collections
+from contextlib import nullcontext
 from dotenv import load_dotenv
-import gc
 import importlib.resources
+from .engine_pool import ComposerPool
+from .jobs import Job, JobManager
+from .artifact_store import ArtifactStore
+from .encoders import FORMATS, available_formats, format_available, transcode
+from . import metrics
+from .synth import WAV_HEADER_BYTES, wav_header
+from .profiling import HEADER as PROFILE_HEADER, PREFIX as PROFILE_PREFIX, ProfileSession, list_profiles, profiling_requested, prune_profiles
 
 with importlib.resources.path("music_composer", "templates") as tpl_path:
     template_folder=str(tpl_path)
@@ -11,6 +23,13 @@ with importlib.resources.path("music_composer", "static") as static_path:
 
 app = Flask(__name__, template_folder=template_folder, static_folder=static_folder)
 
+# Warm composer engines shared across requests, bounded per model name
+composer_pool = ComposerPool(max_size=int(os.getenv("MUSIC_COMPOSER_POOL_SIZE", 4)))
+
+# One output directory per generation, evicted by age and size in the background
+artifact_store = ArtifactStore()
+artifact_store.start()
+
 
 instrumentMap = {
     "piano": [
@@ -218,6 +237,141 @@ instrumentMap = {
     ]
 }
 
+def resolve_instruments(instruments):
+    """Expand instrument groups selected in the UI into instrument names."""
+    if not instruments:
+        return None
+    return [inst for k in instruments if k in instrumentMap for inst in instrumentMap[k]]
+
+def generate_into_store(job_id, text, instruments, on_stage=None, use_cache=True, output_format="wav", profile=False, long_form=False, duration_seconds=None):
+    """Run one generation in its own artifact directory and describe the result."""
+    with artifact_store.reserve(job_id) as job_dir:
+        # cProfile and tracemalloc dumps are written next to the job's artifacts
+        with ProfileSession(job_dir, label=f"job {job_id}") if profile else nullcontext():
+            music_data = None
+            if long_form:
+                # Sections borrow their own composers, so none is held while they are composed
+                from .long_form import compose_long_form
+                music_data = compose_long_form(
+                    text,
+                    instruments=instruments,
+                    duration_seconds=duration_seconds,
+                    composer_pool=composer_pool,
+                    use_cache=use_cache,
+                    on_stage=on_stage
+                )
+            with composer_pool.acquire(os.getenv("MODEL_NAME", "gemini-2.0-flash")) as composer:
+                output_file = composer.generate_music(
+                    user_prompt=text,
+                    instruments=instruments,
+                    music_data=music_data,
+                    output_dir=job_dir,
+                    on_stage=on_stage,
+                    use_cache=use_cache,
+                    output_format=output_format
+                )
+    if profile:
+        prune_profiles(artifact_store.root)
+    if not output_file:
+        raise ValueError("Audio rendering failed")
+    result = {
+        "file": output_file,
+        "url": f"/api/artifacts/{job_id}/{os.path.basename(output_file)}",
+        # Rendered in the background; 404 until it is ready
+        "score_url": f"/api/artifacts/{job_id}/music_data.png"
+    }
+    if profile:
+        result["profiles_url"] = f"/api/jobs/{job_id}/profiles"
+    return result
+
+def run_generation_job(job):
+    return generate_into_store(
+        job.id,
+        job.params["text"],
+        job.params["instruments"],
+        on_stage=job.set_stage,
+        use_cache=job.params["use_cache"],
+        output_format=job.params["output_format"],
+        profile=job.params.get("profile", False),
+        long_form=job.params.get("long_form", False),
+        duration_seconds=job.params.get("duration_seconds")
+    )
+
+job_manager = JobManager(run_generation_job)
+
+# Stream requests by id, kept PENDING_STREAM_TTL seconds after their last change
+pending_streams = {}
+pending_streams_lock = threading.Lock()
+PENDING_STREAM_TTL = 300
+STREAM_POLL_SECONDS = 0.25
+
+def wants_cache(data):
+    """Requests can bypass the model response cache with use_cache=false or Cache-Control: no-cache."""
+    if "no-cache" in request.headers.get("Cache-Control", ""):
+        return False
+    return bool(data.get("use_cache", True))
+
+def requested_format(data):
+    """Output format named in a request body, defaulting to MUSIC_COMPOSER_OUTPUT_FORMAT or wav."""
+    return str(data.get("format") or os.getenv("MUSIC_COMPOSER_OUTPUT_FORMAT", "wav")).lower()
+
+def unsupported_format(output_format):
+    return jsonify({
+        "error": f"Unsupported output format: {output_format}",
+        "formats": available_formats()
+    }), 400
+
+# Rendered audio file name -> format, e.g. output.flac -> flac
+AUDIO_ARTIFACTS = {f"output{audio_format.extension}": audio_format for audio_format in FORMATS.values()}
+
+def negotiate_format(requested):
+    """
+    Pick the format to send for a rendered audio file: ?format= wins, then the Accept
+    header. The format of the requested file is preferred whenever the client accepts it.
+    """
+    format_name = request.args.get("format")
+    if format_name:
+        return FORMATS.get(format_name.lower())
+    if not request.accept_mimetypes:
+        return requested
+    candidates = [requested] + [audio_format for audio_format in FORMATS.values() if audio_format is not requested and format_available(audio_format.name)]
+    mimetype = request.accept_mimetypes.best_match([audio_format.mimetype for audio_format in candidates])
+    return next((audio_format for audio_format in candidates if audio_format.mimetype == mimetype), None)
+
+def send_audio_artifact(job_id, filename):
+    """Send a job's audio in the negotiated format, transcoding the rendered file on first request."""
+    target = negotiate_format(AUDIO_ARTIFACTS[filename])
+    if target is None:
+        return jsonify({"error": "No acceptable audio format", "formats": available_formats()}), 406
+
+    target_name = f"output{target.extension}"
+    file_path = artifact_store.path(job_id, target_name)
+    if file_path is None:
+        # Prefer the lossless WAV as the source of a conversion
+        sources = sorted(AUDIO_ARTIFACTS, key=lambda name: AUDIO_ARTIFACTS[name].name != "wav")
+        source = next(filter(None, (artifact_store.path(job_id, name) for name in sources)), None)
+        if source is None:
+            abort(404)
+        if not format_available(target.name):
+            return jsonify({"error": f"Cannot encode {target.name}", "formats": available_formats()}), 406
+        try:
+            with artifact_store.reserve(job_id) as job_dir:
+                tmp_path = os.path.join(job_dir, f".{uuid.uuid4().hex}-{target_name}")
+                try:
+                    transcode(source, target.name, tmp_path)
+                    os.replace(tmp_path, os.path.join(job_dir, target_name))
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+        except Exception as e:
+            print(f"Error converting {source} to {target.name}: {e}")
+            return jsonify({"error": f"Failed to convert audio to {target.name}"}), 500
+        file_path = artifact_store.path(job_id, target_name)
+
+    response = send_file(file_path, mimetype=target.mimetype, download_name=target_name)
+    response.headers["Vary"] = "Accept"
+    return response
+
 # Web page (form to create music)
 @app.route("/", methods=["GET"])
 def index():
@@ -225,37 +379,265 @@ def index():
 
 @app.route("/api/generate", methods=["POST"])
 def generate():
-    output_file = None
-    composer_instance = None
     try:
         data = request.get_json()
         text = data.get("text", "")
         instruments = data.get("instruments", []) # Default to empty list
-        all_inst = None
-        if instruments:
-            all_inst = [inst for k in instruments if k in instrumentMap for inst in instrumentMap[k]]
+        all_inst = resolve_instruments(instruments)
+        use_cache = wants_cache(data)
+        output_format = requested_format(data)
+        if not format_available(output_format):
+            return unsupported_format(output_format)
 
         print(f"Generating music with instruments: {all_inst}") # Log the actual list being passed
 
-        # Import and instantiate locally
-        from music_composer import MusicComposer
-        composer_instance = MusicComposer(os.getenv("MODEL_NAME", "gemini-2.0-flash"))
-        output_file = composer_instance.generate_music(user_prompt=text, instruments=all_inst)
+        result = generate_into_store(uuid.uuid4().hex, text, all_inst, use_cache=use_cache, output_format=output_format, profile=profiling_requested(request.headers.get(PROFILE_HEADER)), long_form=bool(data.get("long_form", False)), duration_seconds=data.get("duration_seconds"))
 
         return jsonify({
             "message": "Music generated!",
-            "file": output_file
+            **result
         })
     except Exception as e:
          print(f"Error during music generation: {e}")
          # import traceback; print(traceback.format_exc()) # Uncomment for detailed debug
          return jsonify({"error": "Failed to generate music. Invalid API/API Quota exceeded"}), 500
+
+@app.route("/api/jobs", methods=["POST"])
+def create_job():
+    data = request.get_json() or {}
+    output_format = requested_format(data)
+    if not format_available(output_format):
+        return unsupported_format(output_format)
+    job = job_manager.submit(
+        text=data.get("text", ""),
+        instruments=resolve_instruments(data.get("instruments", [])),
+        use_cache=wants_cache(data),
+        output_format=output_format,
+        profile=profiling_requested(request.headers.get(PROFILE_HEADER)),
+        long_form=bool(data.get("long_form", False)),
+        duration_seconds=data.get("duration_seconds")
+    )
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "result_url": f"/api/jobs/{job.id}/result"
+    }), 202
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/api/jobs/<job_id>/result", methods=["GET"])
+def get_job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job.status == Job.FAILED:
+        return jsonify({"error": "Failed to generate music. Invalid API/API Quota exceeded"}), 500
+    if job.status != Job.DONE:
+        return jsonify(job.to_dict()), 202
+    return jsonify({
+        "message": "Music generated!",
+        **job.result
+    })
+
+@app.route("/api/jobs/<job_id>/profiles", methods=["GET"])
+def get_job_profiles(job_id):
+    """cProfile and tracemalloc dumps of a profiled generation."""
+    if not artifact_store.is_safe_name(job_id):
+        abort(404)
+    profiles = list_profiles(artifact_store.job_dir(job_id))
+    for profile in profiles:
+        profile["url"] = f"/api/jobs/{job_id}/profiles/{profile['name']}"
+    return jsonify({"job_id": job_id, "profiles": profiles})
+
+@app.route("/api/jobs/<job_id>/profiles/<name>", methods=["GET"])
+def get_job_profile(job_id, name):
+    file_path = artifact_store.path(job_id, name) if name.startswith(PROFILE_PREFIX) else None
+    if file_path is None:
+        abort(404)
+    return send_file(file_path, mimetype="text/plain" if name.endswith(".txt") else "application/octet-stream", as_attachment=not name.endswith(".txt"))
+
+@app.route("/api/artifacts/<job_id>/<filename>", methods=["GET"])
+def get_artifact(job_id, filename):
+    if filename in AUDIO_ARTIFACTS:
+        return send_audio_artifact(job_id, filename)
+    file_path = artifact_store.path(job_id, filename)
+    if file_path is None:
+        abort(404)
+    return send_file(file_path)
+
+@app.route("/api/streams", methods=["POST"])
+def create_stream():
+    data = request.get_json() or {}
+    stream_id = uuid.uuid4().hex
+    now = time.time()
+    with pending_streams_lock:
+        for expired in [key for key, stream in pending_streams.items() if stream["status"] != "running" and now - stream["updated"] > PENDING_STREAM_TTL]:
+            del pending_streams[expired]
+        pending_streams[stream_id] = {
+            "params": {
+                "text": data.get("text", ""),
+                "instruments": resolve_instruments(data.get("instruments", [])),
+                "use_cache": wants_cache(data)
+            },
+            "status": "pending",
+            "followers": 0,
+            "updated": now
+        }
+    return jsonify({
+        "stream_id": stream_id,
+        "stream_url": f"/api/streams/{stream_id}",
+        "file_url": f"/api/artifacts/{stream_id}/output.wav"
+    }), 201
+
+def set_stream_status(stream, status):
+    with pending_streams_lock:
+        stream["status"] = status
+        stream["updated"] = time.time()
+
+def follow_stream(stream, stream_id):
+    """
+    Send a stream's WAV while the request that started it is still writing the file.
+
+    The caller counts the follower in stream["followers"] before the response starts;
+    it is released here. If the generation stops before it is done, the response fails
+    instead of ending cleanly, so the client does not take truncated audio as complete.
+    """
+    path = os.path.join(artifact_store.job_dir(stream_id), "output.wav")
+    offset = None
+    try:
+        while True:
+            status = stream["status"]
+            if offset is None and os.path.isfile(path) and os.path.getsize(path) >= WAV_HEADER_BYTES:
+                with open(path, "rb") as f:
+                    sample_rate = struct.unpack_from("<I", f.read(WAV_HEADER_BYTES), 24)[0]
+                # The file's own header gets its sizes once it is complete
+                yield wav_header(sample_rate)
+                offset = WAV_HEADER_BYTES
+            if offset is not None:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    data = f.read()
+                if data:
+                    offset += len(data)
+                    yield data
+            if status == "done":
+                return
+            if status != "running":
+                raise RuntimeError(f"Stream {stream_id} stopped before it finished ({status})")
+            time.sleep(STREAM_POLL_SECONDS)
     finally:
-        # Clean up the reference explicitly (good practice, though GC should get it)
-        del composer_instance
-        # Suggest garbage collection
-        gc.collect()
-        print("gc.collect() called after generation request.")
+        with pending_streams_lock:
+            stream["followers"] -= 1
+
+@app.route("/api/streams/<stream_id>", methods=["GET"])
+def play_stream(stream_id):
+    """
+    Generate and send the WAV with chunked transfer while it is being synthesised.
+
+    The first request starts the generation. Requests made while it runs follow the file
+    as it is written, and once it is done the file is sent with Range support, so
+    retries, seeking and replays work until the stream expires. If the first client
+    disconnects while others follow, the generation finishes for them; with no
+    followers it stops, and the next request generates the stream again.
+    """
+    with pending_streams_lock:
+        stream = pending_streams.get(stream_id)
+        status = stream["status"] if stream else None
+        if status == "pending":
+            stream["status"] = "running"
+            stream["updated"] = time.time()
+        elif status == "running":
+            stream["followers"] += 1
+    if stream is None:
+        return jsonify({"error": "Unknown or expired stream"}), 404
+    if status == "done":
+        return send_audio_artifact(stream_id, "output.wav")
+    if status == "failed":
+        return jsonify({"error": "Failed to generate music. Invalid API/API Quota exceeded"}), 500
+    if status == "running":
+        return Response(follow_stream(stream, stream_id), mimetype="audio/wav", headers={"Cache-Control": "no-store"})
+
+    params = stream["params"]
+
+    def generate_stream():
+        status = "pending"
+        try:
+            with artifact_store.reserve(stream_id) as job_dir:
+                with composer_pool.acquire(os.getenv("MODEL_NAME", "gemini-2.0-flash")) as composer:
+                    yield from composer.stream_music(
+                        user_prompt=params["text"],
+                        instruments=params["instruments"],
+                        output_dir=job_dir,
+                        use_cache=params["use_cache"]
+                    )
+            status = "done"
+        except GeneratorExit:
+            raise
+        except Exception:
+            status = "failed"
+            raise
+        finally:
+            set_stream_status(stream, status)
+
+    body = generate_stream()
+    try:
+        # Run the model call and compile before committing to a 200 response
+        first_chunk = next(body)
+    except Exception as e:
+        print(f"Error during music streaming: {e}")
+        return jsonify({"error": "Failed to generate music. Invalid API/API Quota exceeded"}), 500
+
+    def resume():
+        try:
+            yield first_chunk
+            # Not `yield from`, which would close the generation with the response
+            for chunk in body:
+                yield chunk
+        except GeneratorExit:
+            with pending_streams_lock:
+                followed = stream["followers"] > 0
+            if followed:
+                # Followers read the file this generation writes, so finish it for them
+                threading.Thread(target=collections.deque, args=(body, 0), name=f"stream-{stream_id}", daemon=True).start()
+            else:
+                body.close()
+            raise
+
+    return Response(resume(), mimetype="audio/wav", headers={"Cache-Control": "no-store"})
+
+def cache_stats():
+    from .render_cache import get_default_render_cache
+    from .llm_cache import get_default_response_cache
+    from .score_renderer import get_default_score_renderer
+    from .segment_render import get_default_segment_cache
+    render_cache = get_default_render_cache()
+    segment_cache = get_default_segment_cache()
+    response_cache = get_default_response_cache()
+    score_renderer = get_default_score_renderer()
+    return {
+        "render_cache": render_cache.stats() if render_cache else None,
+        "response_cache": response_cache.stats() if response_cache else None,
+        "score_renderer": score_renderer.stats() if score_renderer else None,
+        "segment_cache": segment_cache.stats() if segment_cache else None
+    }
+
+@app.route("/api/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(cache_stats())
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Stage timings, pipeline counters and cache stats in the Prometheus text format."""
+    for cache, stats in cache_stats().items():
+        for stat, value in (stats or {}).items():
+            metrics.CACHE_STATS.set(value, cache=cache, stat=stat)
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.route("/api/settings", methods=["GET"])
 def get_settings():
@@ -270,7 +652,8 @@ def get_settings():
     return jsonify({
         "api_key": gemini_key,
         "instruments":[k for k, _ in instrumentMap.items()],
-        "output_path":output_path
+        "output_path":output_path,
+        "stream_playback": os.getenv("MUSIC_COMPOSER_STREAM_PLAYBACK", "1").lower() not in ("0", "false", "no")
     })
 
 @app.route("/api/settings", methods=["POST"])
@@ -315,7 +698,15 @@ if os.getenv("NEW_STATIC_PATH", None):
         static_folder = f'{os.getenv("MUSIC_COMPOSER_BASE_PATH", None)}'
         return send_from_directory(static_folder, filename)
 
+def start_warm_up():
+    """Load the generation stack in the background, so startup stays fast and the first request does not pay for it."""
+    if os.getenv("MUSIC_COMPOSER_PREWARM", "1").lower() in ("0", "false", "no"):
+        return
+    from .main import warm_up
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
 def run_server():
+    start_warm_up()
     app.run(debug=False, host='0.0.0.0', port=os.getenv("SERVER_PORT", 8000))
 
 if __name__ == "__main__":
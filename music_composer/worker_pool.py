@@ -0,0 +1,142 @@
+"""
+Worker processes that never import the caller's __main__.
+
+multiprocessing's spawn and forkserver contexts re-import the script that started
+them in every worker, so a script that generates at module level would start a new
+generation per worker. fork is unsafe in a threaded web server. WorkerPool instead
+runs `python -m music_composer.worker_pool` children and sends them module-level
+functions by name, with pickled arguments and results over their stdin and stdout.
+
+Workers live as long as the pool, so state a function keeps in module globals (a
+loaded synth, a warm composer) is reused by later tasks on the same worker.
+"""
+import importlib
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future
+
+# Source tree holding the package, so worker processes import this copy of it
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def child_env():
+	"""Environment for a `python -m music_composer...` child process."""
+	return dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [PACKAGE_PARENT, os.getenv("PYTHONPATH")])))
+
+class WorkerPool:
+	"""
+	A fixed number of worker processes fed from one queue, with a
+	concurrent.futures-style `submit`. Processes start on first use; one that dies is
+	replaced for the next task, and its task fails with a RuntimeError.
+	"""
+
+	def __init__(self, max_workers):
+		self.max_workers = max(1, int(max_workers))
+		self.__tasks = queue.Queue()
+		self.__threads = []
+		self.__lock = threading.Lock()
+		self.__closed = False
+
+	def submit(self, fn, *args):
+		"""
+		Run `fn(*args)` in a worker process.
+
+		Args:
+			fn: Module-level function, imported by the worker through its module and name
+
+		Returns:
+			concurrent.futures.Future: Resolves to the function's return value
+		"""
+		future = Future()
+		with self.__lock:
+			if self.__closed:
+				raise RuntimeError("Cannot submit to a pool that was shut down")
+			if len(self.__threads) < self.max_workers:
+				thread = threading.Thread(target=self.__run, name=f"worker-pool-{len(self.__threads)}", daemon=True)
+				self.__threads.append(thread)
+				thread.start()
+			self.__tasks.put((future, fn.__module__, fn.__qualname__, args))
+		return future
+
+	def __start(self):
+		return subprocess.Popen([sys.executable, "-m", "music_composer.worker_pool"], stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=child_env())
+
+	def __run(self):
+		process = None
+		try:
+			while True:
+				task = self.__tasks.get()
+				if task is None:
+					return
+				future, module, name, args = task
+				if not future.set_running_or_notify_cancel():
+					continue
+				try:
+					if process is None:
+						process = self.__start()
+					pickle.dump((module, name, args), process.stdin)
+					process.stdin.flush()
+					succeeded, value = pickle.load(process.stdout)
+				except Exception as e:
+					# The worker died or the task could not be sent; start a fresh one next time
+					if process is not None:
+						process.kill()
+						process.wait()
+						process = None
+					future.set_exception(RuntimeError(f"Worker process failed: {e!r}"))
+					continue
+				if succeeded:
+					future.set_result(value)
+				else:
+					future.set_exception(value)
+		finally:
+			if process is not None:
+				process.stdin.close()
+				process.wait()
+
+	def shutdown(self, wait=True):
+		"""Stop the workers once the queued tasks are done."""
+		with self.__lock:
+			self.__closed = True
+			threads = list(self.__threads)
+			for _ in threads:
+				self.__tasks.put(None)
+		if wait:
+			for thread in threads:
+				thread.join()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.shutdown()
+		return False
+
+def _serve(requests, responses):
+	"""Worker loop: run (module, name, args) tasks until stdin closes."""
+	while True:
+		try:
+			module, name, args = pickle.load(requests)
+		except EOFError:
+			return
+		try:
+			fn = importlib.import_module(module)
+			for attribute in name.split("."):
+				fn = getattr(fn, attribute)
+			response = pickle.dumps((True, fn(*args)))
+		except Exception as e:
+			try:
+				response = pickle.dumps((False, e))
+			except Exception:
+				response = pickle.dumps((False, RuntimeError(f"{type(e).__name__}: {e}")))
+		responses.write(response)
+		responses.flush()
+
+if __name__ == "__main__":
+	# Results go over the original stdout; anything the tasks print goes to stderr
+	responses = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+	os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+	_serve(sys.stdin.buffer, responses)
@@ -12,8 +12,18 @@ setup(
 		]
 	},
 	include_package_data=True,
+	entry_points={
+		"console_scripts": [
+			"music-composer-batch=music_composer.batch:main"
+		]
+	},
+	extras_require={
+		# In-process rendering through libfluidsynth
+		"inprocess": ["pyfluidsynth"]
+	},
 	install_requires=[
 		"music21",
+		"numpy",
 		"mido",
 		"python-dotenv",
 		"custom_logger @ git+https://github.com/jebin2/custom_logger.git",
@@ -0,0 +1,61 @@
+import os
+import time
+import pytest
+from music_composer.artifact_store import ArtifactStore
+
+def _job(store, job_id, size, age):
+	job_dir = store.job_dir(job_id)
+	os.makedirs(job_dir)
+	with open(os.path.join(job_dir, "output.wav"), "wb") as f:
+		f.write(b"\0" * size)
+	mtime = time.time() - age
+	os.utime(job_dir, (mtime, mtime))
+	return job_dir
+
+@pytest.mark.parametrize("job_id", ["", ".", "..", "../etc", "a/b", "a\\b", "/tmp", "name with space"])
+def test_job_dir_rejects_unsafe_names(tmp_path, job_id):
+	store = ArtifactStore(root=str(tmp_path))
+	with pytest.raises(ValueError):
+		store.job_dir(job_id)
+	assert store.path(job_id, "output.wav") is None
+	assert store.path("job", job_id) is None
+
+def test_job_dir_and_path_stay_in_the_store(tmp_path):
+	store = ArtifactStore(root=str(tmp_path))
+	assert store.job_dir("0123abcd") == os.path.join(str(tmp_path), "0123abcd")
+	assert store.path("0123abcd", "output.wav") is None
+	_job(store, "0123abcd", 10, 0)
+	assert store.path("0123abcd", "output.wav") == os.path.join(str(tmp_path), "0123abcd", "output.wav")
+
+def test_reserve_creates_the_directory_and_refreshes_its_age(tmp_path):
+	store = ArtifactStore(root=str(tmp_path), max_age=60)
+	with store.reserve("job") as job_dir:
+		assert os.path.isdir(job_dir)
+		os.utime(job_dir, (0, 0))
+	assert time.time() - os.path.getmtime(job_dir) < 60
+	assert store.evict() == 0
+
+def test_evict_removes_the_oldest_first_until_the_store_fits(tmp_path):
+	store = ArtifactStore(root=str(tmp_path), max_bytes=250, max_age=3600)
+	for job_id, age in (("newest", 10), ("oldest", 30), ("middle", 20)):
+		_job(store, job_id, 100, age)
+	assert store.evict() == 1
+	assert sorted(os.listdir(tmp_path)) == ["middle", "newest"]
+
+def test_evict_removes_expired_directories(tmp_path):
+	store = ArtifactStore(root=str(tmp_path), max_age=60)
+	_job(store, "expired", 10, 120)
+	_job(store, "recent", 10, 0)
+	assert store.evict() == 1
+	assert os.listdir(tmp_path) == ["recent"]
+
+def test_evict_skips_reserved_directories(tmp_path):
+	store = ArtifactStore(root=str(tmp_path), max_bytes=150, max_age=60)
+	_job(store, "old", 100, 120)
+	_job(store, "newer", 100, 10)
+	with store.reserve("old"):
+		os.utime(store.job_dir("old"), (0, 0))
+		# The running job still counts towards the budget, so the next oldest goes
+		assert store.evict() == 1
+		assert os.listdir(tmp_path) == ["old"]
+	assert store.evict() == 0
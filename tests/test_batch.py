@@ -0,0 +1,91 @@
+import json
+import threading
+import time
+import pytest
+from music_composer import batch
+from music_composer.batch import SharedBackoff, _read_prompts, generate_many, is_rate_limited
+from music_composer.engine_pool import ComposerPool
+
+class QuotaError(Exception):
+	code = 429
+
+def test_rate_limit_is_found_through_the_cause():
+	try:
+		try:
+			raise QuotaError("quota")
+		except QuotaError as e:
+			raise ValueError("Failed to generate music") from e
+	except ValueError as e:
+		assert is_rate_limited(e)
+	assert is_rate_limited(RuntimeError("429 RESOURCE_EXHAUSTED"))
+	assert not is_rate_limited(ValueError("Failed to generate music"))
+
+def test_penalize_holds_back_every_caller():
+	backoff = SharedBackoff(base_delay=0.2)
+	delay = backoff.penalize(0)
+	assert 0.1 <= delay <= 0.2
+	waited = []
+
+	def caller():
+		started = time.monotonic()
+		backoff.wait()
+		waited.append(time.monotonic() - started)
+
+	threads = [threading.Thread(target=caller) for _ in range(3)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	assert len(waited) == 3
+	assert min(waited) >= delay - 0.05
+	# Once the delay has passed nobody waits
+	started = time.monotonic()
+	backoff.wait()
+	assert time.monotonic() - started < 0.05
+
+class StubComposer:
+	calls = {}
+
+	def compose(self, prompt, instruments=None, use_cache=True):
+		StubComposer.calls[prompt] = StubComposer.calls.get(prompt, 0) + 1
+		if prompt == "quota" and StubComposer.calls[prompt] == 1:
+			raise ValueError("Failed to generate music") from QuotaError("quota")
+		raise ValueError(f"no music for {prompt} with {instruments}")
+
+@pytest.fixture
+def composer_pool(monkeypatch):
+	StubComposer.calls = {}
+	monkeypatch.setattr(batch, "SharedBackoff", lambda: SharedBackoff(base_delay=0.01))
+	return ComposerPool(factory=lambda model_name: StubComposer())
+
+def test_failed_items_do_not_stop_the_batch(tmp_path, composer_pool):
+	prompts = ["slow strings", {"instruments": ["piano"]}, {"prompt": "quota", "instruments": ["cello"]}, {"prompt": None, "error": "Line 4 is not valid JSON"}, "brass"]
+	reported = []
+	results = generate_many(prompts, str(tmp_path), instruments=["violin"], llm_concurrency=2, render_workers=1, on_result=reported.append, composer_pool=composer_pool)
+
+	assert [result["index"] for result in results] == [0, 1, 2, 3, 4]
+	assert [result["status"] for result in results] == ["failed"] * 5
+	assert sorted(result["index"] for result in reported) == [0, 1, 2, 3, 4]
+	assert results[0]["error"] == "no music for slow strings with ['violin']"
+	assert results[1]["error"].startswith("Entry has no prompt")
+	assert results[2]["error"] == "no music for quota with ['cello']"
+	assert results[2]["attempts"] == 2
+	assert results[3]["error"] == "Line 4 is not valid JSON"
+	assert results[3]["attempts"] == 0
+	assert results[4]["prompt"] == "brass"
+	assert StubComposer.calls == {"slow strings": 1, "quota": 2, "brass": 1}
+	assert all("instruments" not in result for result in results)
+
+	with open(tmp_path / "results.json") as f:
+		assert json.load(f) == results
+
+def test_malformed_lines_are_kept_as_errors(tmp_path):
+	path = tmp_path / "prompts.jsonl"
+	path.write_text('# comment\n\ncalm piano\n{"prompt": "march", "instruments": ["trumpet"]}\n{"prompt": "broken"\n')
+	prompts = _read_prompts(str(path))
+	assert prompts[:2] == ["calm piano", {"prompt": "march", "instruments": ["trumpet"]}]
+	assert prompts[2]["prompt"] is None
+	assert prompts[2]["error"].startswith("Line 5 is not valid JSON")
+
+def test_composer_arguments_may_repeat_the_batch_overrides(tmp_path):
+	assert generate_many([], str(tmp_path), render_cache=True, score_renderer=True) == []
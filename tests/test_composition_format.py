@@ -0,0 +1,83 @@
+import json
+import math
+import pytest
+from music_composer import composition_format
+from music_composer.composition_format import FLAG_RAW, dumps, load_composition, loads
+
+def _note(**fields):
+	note = {"type": "note", "pitch": "C4", "instrument": "violin", "channel": 0, "offset": 0, "duration": 1, "velocity": 80}
+	note.update(fields)
+	return note
+
+def _round_trip(notes):
+	music_data = {"key_signature": "Am", "tempo": 96, "notes": notes}
+	loaded = loads(dumps(music_data))
+	assert loaded["key_signature"] == "Am" and loaded["tempo"] == 96
+	return loaded["notes"]
+
+def _raw_flags(notes):
+	data = dumps({"notes": notes})
+	# The flags column follows the preamble, string table, header and note count
+	(string_count,) = composition_format._U32.unpack_from(data, 6)
+	position = 10
+	for _ in range(string_count):
+		(length,) = composition_format._U16.unpack_from(data, position)
+		position += 2 + length
+	(header_length,) = composition_format._U32.unpack_from(data, position)
+	position += 4 + header_length + 4
+	return [flag & FLAG_RAW for flag in data[position:position + len(notes)]]
+
+def test_full_notes_round_trip():
+	notes = [
+		_note(effects=[{"type": "reverb_level", "value": 40}, {"type": "volume", "value": 99.5}], pitch_bend={"start": -0.5, "end": 0.25, "steps": 12}),
+		{"type": "chord", "pitches": ["C4", "E4", "G4"], "instrument": "acoustic_grand", "channel": 3, "offset": 2.5, "duration": 0.75, "velocity": 64, "vibrato": {"depth": 0.2, "speed": 6}},
+		_note(instrument="snare", channel=9, offset=4, extra={"swing": True}),
+		{"type": "note", "pitch": "D4"}
+	]
+	assert _round_trip(notes) == notes
+
+def test_vibrato_steps_stay_compact():
+	notes = [_note(vibrato={"depth": 0.3, "speed": 5, "steps": 32}), _note(vibrato={"depth": 0.3, "speed": 5})]
+	assert _round_trip(notes) == notes
+	assert _raw_flags(notes) == [0, 0]
+
+@pytest.mark.parametrize("value", [1e300, -1e300, 2.0 ** 63, -(2.0 ** 63) * 2, 1e-300, 0.1, 2 ** 53, -(2 ** 62)])
+def test_edge_numbers_round_trip_by_value(value):
+	notes = [_note(offset=value, velocity=value, effects=[{"type": "volume", "value": value}], pitch_bend={"start": value, "end": 0, "steps": 1})]
+	note = _round_trip(notes)[0]
+	for loaded in (note["offset"], note["velocity"], note["effects"][0]["value"], note["pitch_bend"]["start"]):
+		assert loaded == value
+		assert math.copysign(1, loaded) == math.copysign(1, value)
+
+def test_integral_floats_in_int64_range_load_as_ints():
+	note = _round_trip([_note(offset=3.0, duration=2.0 ** 62)])[0]
+	assert note["offset"] == 3 and isinstance(note["offset"], int)
+	assert note["duration"] == 2 ** 62 and isinstance(note["duration"], int)
+
+def test_non_finite_numbers_round_trip():
+	note = _round_trip([_note(offset=float("inf"), duration=float("-inf"), velocity=float("nan"))])[0]
+	assert note["offset"] == float("inf") and note["duration"] == float("-inf")
+	assert math.isnan(note["velocity"])
+
+def test_values_float64_cannot_hold_are_stored_raw():
+	notes = [_note(offset=2 ** 63 + 1), _note(offset=10 ** 400), _note(channel=70000), _note(vibrato={"depth": 0.2, "speed": 2.5})]
+	assert _round_trip(notes) == notes
+	assert _raw_flags(notes) == [FLAG_RAW] * 4
+
+def test_version_1_files_still_load():
+	data = bytearray(dumps({"notes": [_note(vibrato={"depth": 0.2, "speed": 6})]}))
+	data[4:6] = (1).to_bytes(2, "little")
+	assert loads(bytes(data))["notes"][0]["vibrato"] == {"depth": 0.2, "speed": 6}
+
+def test_corrupt_data_raises_value_error():
+	data = dumps({"notes": [_note()]})
+	with pytest.raises(ValueError):
+		loads(data[:-10])
+	with pytest.raises(ValueError):
+		loads(b"JSON" + data[4:])
+
+def test_load_composition_reads_both_formats(tmp_path):
+	music_data = {"tempo": 90, "notes": [_note()]}
+	composition_format.dump(music_data, tmp_path / "piece.mcb")
+	(tmp_path / "piece.json").write_text(json.dumps(music_data))
+	assert load_composition(tmp_path / "piece.mcb") == load_composition(tmp_path / "piece.json") == music_data
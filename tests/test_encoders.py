@@ -0,0 +1,39 @@
+import sys
+import numpy as np
+import pytest
+from music_composer import encoders
+
+# Copies stdin to the output file, after writing more to stderr than a pipe buffer holds
+STUB_ENCODER = """
+import sys
+sys.stderr.write("progress " * 100000)
+sys.stderr.flush()
+with open(sys.argv[1], "wb") as f:
+	f.write(sys.stdin.buffer.read())
+"""
+
+FAILING_ENCODER = """
+import sys
+sys.stdin.buffer.read()
+sys.stderr.write("unsupported sample rate")
+sys.exit(3)
+"""
+
+def _use_encoder(monkeypatch, script):
+	monkeypatch.setattr(encoders, "encoder_command", lambda format_name, sample_rate, output_path: [sys.executable, "-c", script, output_path])
+
+def test_chatty_encoder_does_not_deadlock(tmp_path, monkeypatch):
+	_use_encoder(monkeypatch, STUB_ENCODER)
+	blocks = [np.full((4096, 2), i, dtype=np.int16) for i in range(32)]
+	output = encoders.encode_blocks(iter(blocks), "flac", 44100, str(tmp_path / "out.flac"))
+	with open(output, "rb") as f:
+		assert f.read() == b"".join(block.tobytes() for block in blocks)
+
+def test_encoder_failure_reports_its_stderr(tmp_path, monkeypatch):
+	_use_encoder(monkeypatch, FAILING_ENCODER)
+	with pytest.raises(ValueError, match="unsupported sample rate"):
+		encoders.encode_blocks([b"\0" * 4096], "mp3", 44100, str(tmp_path / "out.mp3"))
+
+def test_wav_is_written_without_an_encoder(tmp_path):
+	output = encoders.encode_blocks([np.zeros((16, 2), dtype=np.int16)], "wav", 22050, str(tmp_path / "out.wav"))
+	assert list(encoders.iter_wav_blocks(output)) == [bytes(64)]
@@ -0,0 +1,58 @@
+import time
+from music_composer.llm_cache import ResponseCache
+
+def _key(prompt="calm piano", instruments=("piano",), schema=None):
+	return ResponseCache.key(prompt, instruments, "model", "system prompt", schema or {"type": "object"})
+
+def test_key_covers_everything_that_shapes_the_answer():
+	keys = {_key(), _key(prompt="loud drums"), _key(instruments=("violin",)), _key(schema={"type": "array"})}
+	assert len(keys) == 4
+	assert _key() == _key()
+
+def test_entries_survive_a_restart_through_the_disk_tier(tmp_path):
+	ResponseCache(root=str(tmp_path)).put(_key(), '{"notes": []}')
+	cache = ResponseCache(root=str(tmp_path))
+	assert cache.get(_key()) == '{"notes": []}'
+	assert cache.get(_key()) == '{"notes": []}'
+	assert cache.stats()["disk_hits"] == 1 and cache.stats()["memory_hits"] == 1
+
+def test_expired_entries_are_misses_and_removed(tmp_path, monkeypatch):
+	cache = ResponseCache(root=str(tmp_path), ttl=60)
+	cache.put(_key(), "response")
+	now = time.time()
+	monkeypatch.setattr(time, "time", lambda: now + 61)
+	assert cache.get(_key()) is None
+	assert cache.stats()["misses"] == 1
+	assert not list(tmp_path.glob("*.json"))
+
+def test_memory_tier_is_bounded(tmp_path):
+	cache = ResponseCache(root=str(tmp_path), max_entries=2, persist=False)
+	for prompt in ("a", "b", "c"):
+		cache.put(_key(prompt), prompt)
+	assert cache.get(_key("a")) is None
+	assert cache.get(_key("c")) == "c"
+	assert cache.stats()["memory_entries"] == 2
+	assert not list(tmp_path.iterdir())
+
+def test_zero_ttl_is_not_the_default(tmp_path, monkeypatch):
+	cache = ResponseCache(root=str(tmp_path), ttl=0)
+	assert cache.ttl == 0
+	cache.put(_key(), "response")
+	now = time.time()
+	monkeypatch.setattr(time, "time", lambda: now + 1)
+	assert cache.get(_key()) is None
+
+def test_disk_tier_evicts_least_recently_used_beyond_its_budget(tmp_path):
+	cache = ResponseCache(root=str(tmp_path), max_bytes=2500)
+	for prompt in ("a", "b"):
+		cache.put(_key(prompt), prompt * 1000)
+	assert cache.get(_key("a")) == "a" * 1000
+	cache.put(_key("c"), "c" * 1000)
+	assert sorted(path.stem for path in tmp_path.glob("*.json")) == sorted([_key("a"), _key("c")])
+	assert cache.stats()["disk_entries"] == 2
+	assert cache.stats()["disk_bytes"] <= 2500
+
+	restarted = ResponseCache(root=str(tmp_path), max_bytes=2500)
+	assert restarted.stats()["disk_entries"] == 2
+	assert restarted.get(_key("b")) is None
+	assert restarted.get(_key("a")) == "a" * 1000
@@ -0,0 +1,47 @@
+import pytest
+from mido import MetaMessage
+from music_composer.long_form import normalize_plan, stitch
+from music_composer.midi_compiler import MidiCompiler
+from music_composer.pitch_table import MIDI_KEYS, normalize_key
+
+@pytest.mark.parametrize("value, key", [
+	("C", "C"), ("Am", "Am"), ("F#m", "F#m"), ("C major", "C"), ("A minor", "Am"),
+	("f# min", "F#m"), ("E-flat major", "Eb"), ("Eb-minor", "Ebm"), ("B-", "Bb"),
+	("C-minor", "Cm"), ("CM", "C"), ("g sharp minor", "G#m"), ("A#", "Bb"), ("Gbm", "F#m"),
+	("C major blues", None), ("H", None), ("", None), (None, None), (5, None)
+])
+def test_normalize_key(value, key):
+	assert normalize_key(value) == key
+
+def test_every_normalised_key_is_accepted_by_mido():
+	for key in MIDI_KEYS:
+		MetaMessage("key_signature", key=key)
+
+def test_plan_keys_are_normalised_with_the_piece_key_as_fallback():
+	plan = {"key_signature": "D minor", "sections": [
+		{"name": "outro", "key_signature": "???", "start_bar": 9, "end_bar": 12},
+		{"name": "intro", "key_signature": "A minor", "start_bar": 1, "end_bar": 4},
+		{"name": "theme", "start_bar": 5, "end_bar": 8}
+	]}
+	sections = normalize_plan(plan)
+	assert [(section["name"], section["key_signature"]) for section in sections] == [("intro", "Am"), ("theme", "Dm"), ("outro", "Dm")]
+
+def test_plan_without_piece_key_falls_back_to_a_section_key():
+	plan = {"sections": [{"key_signature": "major"}, {"key_signature": "Bb major"}]}
+	assert [section["key_signature"] for section in normalize_plan(plan)] == ["Bb", "Bb"]
+	assert normalize_plan({"sections": [{}]})[0]["key_signature"] == "C"
+
+def test_stitched_sections_compile_with_valid_key_signatures():
+	sections = normalize_plan({"sections": [
+		{"name": "a", "key_signature": "C major", "tempo": 90, "time_signature": "4/4", "start_bar": 1, "end_bar": 2},
+		{"name": "b", "key_signature": "E minor", "tempo": 120, "time_signature": "3/4", "start_bar": 3, "end_bar": 4}
+	]})
+	note = {"type": "note", "pitch": "C4", "instrument": "violin", "channel": 0, "offset": 0, "duration": 1, "velocity": 80}
+	composition = stitch({"genre": "folk"}, sections, [{"notes": [note]}, {"notes": [note]}])
+	# Keys written by hand or by older plans go through the compiler unchecked
+	composition["sections"].append({**composition["sections"][-1], "offset": 20, "key_signature": "E minor blues"})
+	compiler = MidiCompiler(composition)
+	for note in composition["notes"]:
+		compiler.add_note(note)
+	keys = [message.key for message in compiler.build().tracks[0] if message.type == "key_signature"]
+	assert keys == ["C", "Em"]
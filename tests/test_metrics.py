@@ -0,0 +1,72 @@
+import pytest
+from music_composer import metrics
+from music_composer.metrics import Counter, Gauge, Histogram, Registry
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+	registry = Registry()
+	histogram = registry.register(Histogram("stage_seconds", "Stage time", ("stage",), buckets=(0.1, 1.0)))
+	for value in (0.05, 0.5, 0.5, 3.0):
+		histogram.observe(value, stage="render")
+	assert registry.render().splitlines() == [
+		"# HELP stage_seconds Stage time",
+		"# TYPE stage_seconds histogram",
+		'stage_seconds_bucket{stage="render",le="0.1"} 1',
+		'stage_seconds_bucket{stage="render",le="1"} 3',
+		'stage_seconds_bucket{stage="render",le="+Inf"} 4',
+		'stage_seconds_sum{stage="render"} 4.05',
+		'stage_seconds_count{stage="render"} 4'
+	]
+
+def test_label_values_are_escaped():
+	registry = Registry()
+	counter = registry.register(Counter("events_total", "Events", ("name",)))
+	gauge = registry.register(Gauge("level", "Level"))
+	counter.inc(2, name='say "hi"\\n\nnext')
+	gauge.set(0.25)
+	assert registry.render() == (
+		"# HELP events_total Events\n"
+		"# TYPE events_total counter\n"
+		'events_total{name="say \\"hi\\"\\\\n\\nnext"} 2\n'
+		"# HELP level Level\n"
+		"# TYPE level gauge\n"
+		"level 0.25\n"
+	)
+
+def test_metrics_reject_wrong_labels_and_duplicates():
+	registry = Registry()
+	counter = registry.register(Counter("events_total", "Events", ("name",)))
+	with pytest.raises(ValueError):
+		counter.inc(other="x")
+	with pytest.raises(ValueError):
+		counter.inc(-1, name="x")
+	with pytest.raises(ValueError):
+		registry.register(Counter("events_total", "Again"))
+
+def test_stage_times_blocks_and_counts_failures(monkeypatch):
+	metrics.REGISTRY.clear()
+	clock = iter([10.0, 10.25, 20.0, 20.5])
+	monkeypatch.setattr(metrics.time, "perf_counter", lambda: next(clock))
+	with metrics.stage("compile"):
+		pass
+	with pytest.raises(RuntimeError):
+		with metrics.stage("compile"):
+			raise RuntimeError("bad notes")
+	text = metrics.render()
+	assert 'music_composer_stage_seconds_bucket{stage="compile",le="0.1"} 0' in text
+	assert 'music_composer_stage_seconds_bucket{stage="compile",le="0.25"} 1' in text
+	assert 'music_composer_stage_seconds_bucket{stage="compile",le="+Inf"} 2' in text
+	assert 'music_composer_stage_seconds_sum{stage="compile"} 0.75' in text
+	assert 'music_composer_stage_seconds_count{stage="compile"} 2' in text
+	assert 'music_composer_stage_failures_total{stage="compile"} 1' in text
+	metrics.REGISTRY.clear()
+
+def test_metrics_route_serves_the_registry():
+	web_server = pytest.importorskip("music_composer.web_server")
+	metrics.REGISTRY.clear()
+	metrics.GENERATIONS.inc(outcome="done")
+	with web_server.app.test_client() as client:
+		response = client.get("/metrics")
+	assert response.status_code == 200
+	assert response.content_type == metrics.CONTENT_TYPE
+	assert 'music_composer_generations_total{outcome="done"} 1' in response.get_data(as_text=True)
+	metrics.REGISTRY.clear()
@@ -0,0 +1,23 @@
+from music_composer.composition_table import CompositionTable
+from music_composer.midi_compiler import MidiCompiler
+
+INFO = {"tempo": 120, "time_signature": "4/4", "key_signature": "C"}
+
+def _tracks(midi):
+	return [[(message.type, message.dict().get("channel")) for message in track if not message.is_meta] for track in midi.tracks[1:]]
+
+def test_channel_given_as_text_compiles_like_the_table_path():
+	notes = [
+		{"instrument": "violin", "channel": "2", "type": "note", "pitch": "A4", "offset": 0, "duration": 1},
+		{"instrument": "violin", "channel": 2, "type": "note", "pitch": "B4", "offset": 1, "duration": 1}
+	]
+	by_note = MidiCompiler(INFO, controller_threshold=False)
+	for note in notes:
+		assert by_note.add_note(note)
+	by_table = MidiCompiler(INFO, controller_threshold=False)
+	by_table.add_table(CompositionTable.from_notes(notes))
+
+	midi = by_note.build()
+	assert len(midi.tracks) == 2
+	assert _tracks(midi) == _tracks(by_table.build())
+	assert {channel for _, channel in _tracks(midi)[0]} == {2}
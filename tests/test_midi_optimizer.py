@@ -0,0 +1,113 @@
+from mido import Message
+from music_composer.midi_compiler import MidiCompiler
+from music_composer.midi_optimizer import drop_redundant_events
+from music_composer.midi_scheduler import EventScheduler
+
+INFO = {"tempo": 100, "time_signature": "4/4", "key_signature": "C"}
+EFFECTS = [{"type": "reverb_level", "value": 40}, {"type": "volume", "value": 100}, {"type": "sustain", "value": 127}]
+
+def _composition():
+	notes = []
+	for index in range(24):
+		effects = list(EFFECTS)
+		if index == 12:
+			effects = effects + [{"type": "reset_controllers", "value": 0}]
+		if index % 5 == 4:
+			effects = effects + [{"type": "volume", "value": 90}]
+		note = {"type": "note", "pitch": ["C4", "E4", "G4"][index % 3], "offset": index * 0.5, "duration": 0.75, "velocity": 80, "channel": 0, "effects": effects}
+		if index % 4 == 0:
+			note["pitch_bend"] = {"start": 0, "end": 0.5, "steps": 8}
+		if index % 6 == 0:
+			note["vibrato"] = {"depth": 0.2, "speed": 6, "steps": 16}
+		# Two instruments share channel 0, so state carries across their tracks
+		notes.append({**note, "instrument": "violin" if index % 2 else "viola"})
+	notes.append({"type": "note", "pitch": "C3", "offset": 0, "duration": 12, "velocity": 70, "channel": 1, "instrument": "cello", "effects": EFFECTS})
+	return notes
+
+def _compile(threshold):
+	compiler = MidiCompiler(INFO, controller_threshold=threshold)
+	for note in _composition():
+		compiler.add_note(note)
+	return compiler, compiler.build()
+
+def _absolute(track, track_index):
+	tick = 0
+	for position, message in enumerate(track):
+		tick += message.time
+		if not message.is_meta:
+			yield tick, track_index, position, message
+
+def _sounding(tracks):
+	"""Every note event with the controller and pitch state of its channel at that moment."""
+	events = sorted(event for index, track in enumerate(tracks) for event in _absolute(track, index))
+	state = {}
+	sounding = []
+	for tick, _, _, message in events:
+		if message.type == "control_change":
+			if message.control == 121:
+				state = {key: value for key, value in state.items() if key[0] != message.channel or key[1] == "program"}
+			state[(message.channel, message.control)] = message.value
+		elif message.type == "pitchwheel":
+			state[(message.channel, "pitch")] = message.pitch
+		elif message.type == "program_change":
+			state[(message.channel, "program")] = message.program
+		elif message.type in ("note_on", "note_off"):
+			channel_state = sorted((str(key[1]), value) for key, value in state.items() if key[0] == message.channel)
+			sounding.append((tick, message.type, message.channel, message.note, message.velocity, channel_state))
+	return sounding
+
+def test_optimized_midi_sounds_the_same():
+	plain, plain_midi = _compile(False)
+	optimized, optimized_midi = _compile(None)
+	assert plain.events_removed == 0
+	assert optimized.events_removed > 0
+	assert len(optimized_midi.tracks) == len(plain_midi.tracks)
+	assert _sounding(optimized_midi.tracks) == _sounding(plain_midi.tracks)
+	# Each track also sounds the same when it is rendered on its own
+	for plain_track, optimized_track in zip(plain_midi.tracks[1:], optimized_midi.tracks[1:]):
+		assert _sounding([optimized_track]) == _sounding([plain_track])
+
+def test_only_repeats_are_removed():
+	_, plain_midi = _compile(False)
+	_, optimized_midi = _compile(None)
+	for plain_track, optimized_track in zip(plain_midi.tracks[1:], optimized_midi.tracks[1:]):
+		kept = [message for message in optimized_track if message.type not in ("control_change", "pitchwheel")]
+		assert [message.type for message in kept] == [message.type for message in plain_track if message.type not in ("control_change", "pitchwheel")]
+
+def _scheduler(*tracks):
+	scheduler = EventScheduler()
+	for track_key, events in tracks:
+		scheduler.add_track(track_key)
+		for tick, message in events:
+			scheduler.add(track_key, tick, message)
+	return scheduler
+
+def _values(scheduler, track_key):
+	return [(tick, message.dict().get("value", message.dict().get("pitch"))) for tick, message in scheduler.events(track_key)]
+
+def test_repeat_from_another_track_is_kept_for_its_own_track():
+	volume = lambda value: Message("control_change", control=7, value=value, channel=0)
+	scheduler = _scheduler(("a_0", [(0, volume(100)), (10, volume(100))]), ("b_0", [(5, volume(100))]))
+	assert drop_redundant_events(scheduler) == 1
+	assert _values(scheduler, "a_0") == [(0, 100)]
+	assert _values(scheduler, "b_0") == [(5, 100)]
+
+def test_threshold_folds_controllers_but_not_switches_or_pitch():
+	scheduler = _scheduler(("a_0", [
+		(0, Message("control_change", control=7, value=100, channel=0)),
+		(1, Message("control_change", control=7, value=103, channel=0)),
+		(2, Message("control_change", control=64, value=127, channel=0)),
+		(3, Message("control_change", control=64, value=126, channel=0)),
+		(4, Message("pitchwheel", pitch=100, channel=0)),
+		(5, Message("pitchwheel", pitch=101, channel=0)),
+		(6, Message("control_change", control=6, value=2, channel=0)),
+		(7, Message("control_change", control=6, value=2, channel=0))
+	]))
+	assert drop_redundant_events(scheduler, threshold=5) == 1
+	assert [tick for tick, _ in _values(scheduler, "a_0")] == [0, 2, 3, 4, 5, 6, 7]
+
+def test_reset_all_controllers_forgets_the_state():
+	volume = Message("control_change", control=7, value=100, channel=0)
+	scheduler = _scheduler(("a_0", [(0, volume), (1, Message("control_change", control=121, value=0, channel=0)), (2, volume), (3, volume)]))
+	assert drop_redundant_events(scheduler) == 1
+	assert [tick for tick, _ in _values(scheduler, "a_0")] == [0, 1, 2]
@@ -0,0 +1,58 @@
+from mido import Message
+from music_composer.midi_scheduler import RESET_PRIORITY, EventScheduler
+
+
+def _types(scheduler, track_key="piano_0"):
+	return [(tick, message.type) for tick, message in scheduler.events(track_key)]
+
+
+def test_same_tick_events_follow_priority_not_insertion_order():
+	scheduler = EventScheduler()
+	scheduler.add("piano_0", 480, Message("note_on", note=62, velocity=64))
+	scheduler.add("piano_0", 480, Message("pitchwheel", pitch=100))
+	scheduler.add("piano_0", 480, Message("control_change", control=7, value=90))
+	scheduler.add("piano_0", 480, Message("note_off", note=60, velocity=0))
+	scheduler.add("piano_0", 0, Message("program_change", program=0))
+	assert _types(scheduler) == [
+		(0, "program_change"),
+		(480, "note_off"),
+		(480, "control_change"),
+		(480, "pitchwheel"),
+		(480, "note_on")
+	]
+
+
+def test_equal_events_keep_insertion_order():
+	scheduler = EventScheduler()
+	for value in (10, 20, 30):
+		scheduler.add("piano_0", 0, Message("control_change", control=7, value=value))
+	assert [message.value for _, message in scheduler.events("piano_0")] == [10, 20, 30]
+
+
+def test_pitch_reset_goes_before_a_bend_added_earlier_on_the_same_tick():
+	scheduler = EventScheduler()
+	scheduler.add("piano_0", 480, Message("pitchwheel", pitch=4000))
+	scheduler.add("piano_0", 480, Message("note_off", note=60, velocity=0))
+	scheduler.add("piano_0", 480, Message("pitchwheel", pitch=0), RESET_PRIORITY)
+	assert [(message.type, getattr(message, "pitch", None)) for _, message in scheduler.events("piano_0")] == [
+		("pitchwheel", 0),
+		("note_off", None),
+		("pitchwheel", 4000)
+	]
+
+
+def test_remove_events_keeps_priorities_of_the_rest():
+	scheduler = EventScheduler()
+	scheduler.add("piano_0", 480, Message("pitchwheel", pitch=0), RESET_PRIORITY)
+	scheduler.add("piano_0", 480, Message("control_change", control=7, value=90))
+	scheduler.add("piano_0", 480, Message("note_off", note=60, velocity=0))
+	assert scheduler.remove_events("piano_0", [2]) == 1
+	scheduler.add("piano_0", 480, Message("note_off", note=64, velocity=0))
+	assert _types(scheduler) == [(480, "pitchwheel"), (480, "note_off"), (480, "note_off")]
+
+
+def test_to_track_writes_delta_times():
+	scheduler = EventScheduler()
+	scheduler.add("piano_0", 960, Message("note_off", note=60, velocity=0))
+	scheduler.add("piano_0", 0, Message("note_on", note=60, velocity=64))
+	assert [message.time for message in scheduler.to_track("piano_0")] == [0, 960]
@@ -0,0 +1,47 @@
+import numpy as np
+from mido import Message, MetaMessage, MidiFile, MidiTrack
+from music_composer.parallel_render import _safe_stem_name, mix, split_tracks, to_pcm16
+
+def _track(name, program):
+	track = MidiTrack([MetaMessage("track_name", name=name), Message("program_change", program=program)])
+	track.append(Message("note_on", note=60, velocity=80))
+	track.append(Message("note_off", note=60, velocity=0, time=480))
+	return track
+
+def test_split_gives_each_track_the_conductor():
+	midi = MidiFile(type=1, ticks_per_beat=240)
+	conductor = MidiTrack([MetaMessage("set_tempo", tempo=400000)])
+	midi.tracks.extend([conductor, _track("violin_0", 40), _track("cello_1", 42), MidiTrack()])
+	groups = split_tracks(midi)
+	assert [name for name, _ in groups] == ["violin_0", "cello_1", "track_3"]
+	for (_, group), track in zip(groups, midi.tracks[1:]):
+		assert group.ticks_per_beat == 240
+		assert list(group.tracks[0]) == list(conductor)
+		assert list(group.tracks[1]) == list(track)
+
+def test_single_track_file_is_rendered_whole():
+	midi = MidiFile(type=0)
+	midi.tracks.append(_track("piano_0", 0))
+	assert split_tracks(midi) == [("piano_0", midi)]
+
+def test_mix_sums_stems_of_different_lengths():
+	a = np.full((4, 2), 0.25, dtype=np.float32)
+	b = np.full((2, 2), 0.5, dtype=np.float32)
+	assert mix([a, b]).tolist() == [[0.75, 0.75]] * 2 + [[0.25, 0.25]] * 2
+	assert mix([]).shape == (0, 2)
+
+def test_mix_that_clips_is_scaled_to_just_below_full_scale():
+	stems = [np.array([[0.8, -0.2], [0.1, 0.1]], dtype=np.float32)] * 2
+	mixed = mix(stems)
+	assert np.isclose(np.abs(mixed).max(), 0.999)
+	# Relative levels are kept
+	assert np.isclose(mixed[0, 1] / mixed[0, 0], -0.25)
+	assert to_pcm16(mixed).max() < 32767
+
+def test_pcm16_round_trips_a_stem():
+	pcm = np.array([[-32768, 32767], [0, -1]], dtype=np.int16)
+	assert np.array_equal(to_pcm16(pcm.astype(np.float32) / 32768.0), pcm)
+
+def test_stem_names_are_safe_file_names():
+	assert _safe_stem_name("../violin 0") == ".._violin_0"
+	assert _safe_stem_name("") == "track"
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from music_composer.pitch_bend_kit import CENTS_PER_RANGE, DEFAULT_TICKS_PER_SECOND, PitchEffectKit
+
+CENTS = (PitchEffectKit.MAX + 1) / CENTS_PER_RANGE
+
+def _exact(note_data, ticks, ticks_per_second=DEFAULT_TICKS_PER_SECOND):
+	"""The continuous curve at every tick, in wheel units."""
+	t = np.arange(ticks)
+	values = np.zeros(ticks)
+	if "pitch_bend" in note_data:
+		bend = note_data["pitch_bend"]
+		values += bend["start"] + (bend["end"] - bend["start"]) * t / ticks
+	if "vibrato" in note_data:
+		vibrato = note_data["vibrato"]
+		values += vibrato["depth"] * np.sin(2 * np.pi * vibrato["speed"] * t / ticks_per_second)
+	return values * PitchEffectKit.MAX
+
+def _held(offsets, wheel, ticks):
+	"""Wheel value at every tick, each sample held until the next one."""
+	return np.repeat(wheel, np.diff(np.append(offsets, ticks)))
+
+@pytest.mark.parametrize("note_data", [
+	{"pitch_bend": {"start": -1.0, "end": 1.0, "steps": 127}},
+	{"vibrato": {"depth": 0.3, "speed": 6}},
+	{"vibrato": {"depth": 0.5, "speed": 8}},
+	{"pitch_bend": {"start": 0.0, "end": 0.5, "steps": 127}, "vibrato": {"depth": 0.2, "speed": 5}}
+])
+@pytest.mark.parametrize("cents", [5, 10, 25])
+def test_sampled_curve_stays_within_the_tolerance(note_data, cents):
+	ticks = 1920
+	offsets, wheel = PitchEffectKit.pitch_curve(ticks, note_data, cents * CENTS)
+	assert offsets[0] == 0 and np.all(np.diff(offsets) > 0)
+	error = np.abs(_held(offsets, wheel, ticks) - _exact(note_data, ticks)).max()
+	# One wheel unit of rounding on top of the sampling error (depths and speeds here stay
+	# below MAX_VIBRATO_SAMPLES per cycle and one sample per tick)
+	assert error <= cents * CENTS + 1
+
+def test_glide_never_uses_more_than_its_steps():
+	offsets, wheel = PitchEffectKit.pitch_curve(960, {"pitch_bend": {"start": 0.0, "end": 1.0, "steps": 4}}, CENTS)
+	assert offsets.tolist() == [0, 240, 480, 720]
+
+def test_looser_tolerance_means_fewer_events():
+	note_data = {"vibrato": {"depth": 0.3, "speed": 6}}
+	counts = [len(PitchEffectKit.pitch_curve(1920, note_data, cents * CENTS)[0]) for cents in (5, 10, 25)]
+	assert counts[0] > counts[1] > counts[2]
+
+def test_events_end_with_a_reset_unless_already_centred():
+	events = PitchEffectKit.pitch_events(0, 480, {"pitch_bend": {"start": 0.0, "end": 1.0, "steps": 8}})
+	assert events[-1][0] == 480 and events[-1][1].pitch == 0
+	centred = PitchEffectKit.pitch_events(0, 480, {"pitch_bend": {"start": 0.0, "end": 0.0, "steps": 8}})
+	assert [(tick, message.pitch) for tick, message in centred] == [(0, 0)]
+	assert PitchEffectKit.pitch_events(0, 480, {}) == []
@@ -0,0 +1,31 @@
+import os
+import tracemalloc
+from music_composer.profiling import ProfileSession, active_session
+
+def test_session_leaves_an_existing_trace_running(tmp_path):
+	tracemalloc.start()
+	try:
+		with ProfileSession(str(tmp_path / "a")):
+			with ProfileSession(str(tmp_path / "b")):
+				pass
+		assert tracemalloc.is_tracing()
+	finally:
+		tracemalloc.stop()
+
+def test_session_stops_the_trace_it_started(tmp_path):
+	assert not tracemalloc.is_tracing()
+	with ProfileSession(str(tmp_path)) as session:
+		assert tracemalloc.is_tracing()
+		with ProfileSession(str(tmp_path / "nested")):
+			pass
+		assert tracemalloc.is_tracing()
+	assert not tracemalloc.is_tracing()
+	assert os.path.isfile(session.path("tracemalloc.txt"))
+
+def test_nested_session_restores_the_outer_one(tmp_path):
+	assert active_session() is None
+	with ProfileSession(str(tmp_path / "outer")) as outer:
+		with ProfileSession(str(tmp_path / "inner")) as inner:
+			assert active_session() is inner
+		assert active_session() is outer
+	assert active_session() is None
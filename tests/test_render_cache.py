@@ -0,0 +1,51 @@
+import os
+from music_composer.render_cache import RenderCache
+from music_composer.synth import write_wav
+
+
+def _paths(directory):
+	return {
+		"wav": os.path.join(directory, "output.wav"),
+		"flac": os.path.join(directory, "output.flac"),
+		"midi": os.path.join(directory, "output.mid")
+	}
+
+
+def _write(path, data):
+	with open(path, "wb") as f:
+		f.write(data)
+
+
+def test_store_only_keeps_files_of_this_render(tmp_path):
+	cache = RenderCache(root=str(tmp_path / "cache"))
+	paths = _paths(str(tmp_path))
+	_write(paths["wav"], b"wav")
+	_write(paths["midi"], b"midi")
+	# Left over from an earlier render in another format
+	_write(paths["flac"], b"stale")
+	cache.store("key", paths, ("midi", "wav"))
+
+	restored = _paths(str(tmp_path / "restored"))
+	os.makedirs(tmp_path / "restored")
+	assert cache.fetch("key", restored)
+	assert os.path.exists(restored["wav"])
+	assert not os.path.exists(restored["flac"])
+
+
+def test_rewriting_a_fetched_file_keeps_the_cache_entry(tmp_path):
+	cache = RenderCache(root=str(tmp_path / "cache"))
+	paths = _paths(str(tmp_path))
+	write_wav(paths["wav"], [b"\x01\x00" * 8], 44100)
+	_write(paths["midi"], b"midi")
+	cache.store("key", paths, ("midi", "wav"))
+	with open(paths["wav"], "rb") as f:
+		original = f.read()
+
+	assert cache.fetch("key", paths)
+	write_wav(paths["wav"], [b"\x02\x00" * 64], 44100)
+
+	restored = _paths(str(tmp_path / "restored"))
+	os.makedirs(tmp_path / "restored")
+	assert cache.fetch("key", restored)
+	with open(restored["wav"], "rb") as f:
+		assert f.read() == original
@@ -0,0 +1,31 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+COMPOSITION = {
+	"key_signature": "C",
+	"time_signature": "4/4",
+	"tempo": 90,
+	"notes": [{"instrument": "acoustic_grand", "channel": 0, "pitch": "C4", "offset": 0, "duration": 1, "velocity": 80}]
+}
+
+def test_render_does_not_import_the_callers_main(tmp_path):
+	# Scripts like test_music_composer.py generate at module level; a render must not run them again
+	marker = tmp_path / "runs.txt"
+	script = tmp_path / "script.py"
+	script.write_text(textwrap.dedent(f"""
+		from music_composer.score_renderer import ScoreRenderer
+		with open({str(marker)!r}, "a") as f:
+			f.write("run\\n")
+		renderer = ScoreRenderer(root={str(tmp_path / "cache")!r}, timeout=60)
+		renderer.render({COMPOSITION!r}, {str(tmp_path / "score.png")!r})
+		print(renderer.stats()["timeouts"])
+	"""))
+	root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.getenv("PYTHONPATH")])))
+	result = subprocess.run([sys.executable, str(script)], env=env, cwd=str(tmp_path), capture_output=True, text=True, timeout=120)
+	assert result.returncode == 0, result.stderr
+	assert marker.read_text() == "run\n"
+	assert result.stdout.split()[-1] == "0"
+	assert not [name for name in os.listdir(tmp_path / "cache") if name.startswith(".tmp-")]
@@ -0,0 +1,126 @@
+import numpy as np
+from mido import Message, MidiFile, MidiTrack, MetaMessage
+from music_composer.segment_render import SegmentCache, SegmentRenderer, timed_messages
+
+class FakeSynth:
+	"""
+	Deterministic stand-in for InProcessSynth: each voice is a tone that decays linearly
+	for tail_seconds after its release, scaled by channel volume (CC7). The sustain
+	pedal (CC64) holds released notes until it is lifted.
+	"""
+	name = "inprocess"
+
+	def __init__(self, soundfont_path, sample_rate=1000, tail_seconds=0.3):
+		self.soundfont_path = soundfont_path
+		self.sample_rate = sample_rate
+		self.tail_seconds = tail_seconds
+
+	def __render(self, messages, total):
+		tail = int(self.tail_seconds * self.sample_rate)
+		out = np.zeros(total)
+		voices = []
+		volume = {}
+		pedal = {}
+		position = 0
+
+		def fill(until):
+			frames = np.arange(position, until)
+			for voice in voices:
+				envelope = np.ones(len(frames))
+				if voice["release"] is not None:
+					envelope = np.clip(1 - (frames - voice["release"]) / tail, 0, 1)
+				tone = np.sin((frames - voice["start"]) * 0.01 * voice["note"])
+				out[position:until] += 50 * voice["velocity"] * volume.get(voice["channel"], 100) / 127 * envelope * tone
+
+		def release(channel, frame, note=None):
+			for voice in voices:
+				if voice["channel"] == channel and voice["release"] is None and (note is None and voice["held"] or voice["note"] == note):
+					if note is not None and pedal.get(channel, 0) >= 64:
+						voice["held"] = True
+					else:
+						voice["release"] = frame
+
+		for frame, message in messages:
+			if frame >= total:
+				break
+			if frame > position:
+				fill(frame)
+				position = frame
+			if message.type == "note_on" and message.velocity > 0:
+				voices.append({"channel": message.channel, "note": message.note, "velocity": message.velocity, "start": frame, "release": None, "held": False})
+			elif message.type in ("note_on", "note_off"):
+				release(message.channel, frame, message.note)
+			elif message.type == "control_change" and message.control == 7:
+				volume[message.channel] = message.value
+			elif message.type == "control_change" and message.control == 64:
+				pedal[message.channel] = message.value
+				if message.value < 64:
+					release(message.channel, frame)
+			voices[:] = [voice for voice in voices if voice["release"] is None or voice["release"] + tail > frame]
+		fill(total)
+		return np.repeat(np.round(out).astype(np.int16), 2)
+
+	def iter_blocks(self, midi, block_frames=4096):
+		messages = timed_messages(midi, self.sample_rate)
+		yield self.__render(messages, messages[-1][0] + int(self.tail_seconds * self.sample_rate))
+
+	def render_span(self, messages, start_frame, frames):
+		return self.__render(messages, start_frame + frames)[start_frame * 2:]
+
+def _midi(events):
+	midi = MidiFile(ticks_per_beat=480)
+	track = MidiTrack()
+	track.append(MetaMessage("set_tempo", tempo=500000))
+	tick = 0
+	for event_tick, message in sorted(events, key=lambda event: event[0]):
+		message.time = event_tick - tick
+		tick = event_tick
+		track.append(message)
+	midi.tracks.append(track)
+	return midi
+
+def _piece(last_note=72):
+	# 480 ticks per half second
+	events = [
+		(0, Message("control_change", control=7, value=90)),
+		(0, Message("control_change", control=64, value=127)),
+		(0, Message("note_on", note=60, velocity=80)),
+		(240, Message("note_off", note=60, velocity=0)),
+		(480, Message("note_on", note=64, velocity=70, channel=1)),
+		(960, Message("note_off", note=64, velocity=0, channel=1)),
+		(1700, Message("control_change", control=64, value=0)),
+		(2400, Message("control_change", control=7, value=60)),
+		(2400, Message("note_on", note=67, velocity=90)),
+		(2900, Message("note_off", note=67, velocity=0)),
+		(3840, Message("note_on", note=last_note, velocity=90, channel=1)),
+		(4200, Message("note_off", note=last_note, velocity=0, channel=1))
+	]
+	return _midi(events)
+
+def _render(renderer, midi):
+	return b"".join(bytes(block) if isinstance(block, (bytes, bytearray)) else block.tobytes() for block in renderer.iter_blocks(midi))
+
+def test_windows_splice_into_the_single_pass_render(tmp_path):
+	soundfont = tmp_path / "font.sf2"
+	soundfont.write_bytes(b"sf2")
+	synth = FakeSynth(str(soundfont))
+	midi = _piece()
+	expected = b"".join(block.tobytes() for block in synth.iter_blocks(midi))
+	renderer = SegmentRenderer(synth, SegmentCache(root=str(tmp_path / "cache")), window_seconds=0.5)
+	assert _render(renderer, midi) == expected
+	assert renderer.cached_windows == 0
+
+def test_only_edited_windows_are_rendered_again(tmp_path):
+	soundfont = tmp_path / "font.sf2"
+	soundfont.write_bytes(b"sf2")
+	synth = FakeSynth(str(soundfont))
+	renderer = SegmentRenderer(synth, SegmentCache(root=str(tmp_path / "cache")), window_seconds=0.5)
+	_render(renderer, _piece())
+	first_pass = renderer.rendered_windows
+
+	edited = _piece(last_note=74)
+	assert _render(renderer, edited) == b"".join(block.tobytes() for block in synth.iter_blocks(edited))
+	assert 0 < renderer.rendered_windows < first_pass
+	assert renderer.cached_windows > 0
+	_render(renderer, edited)
+	assert renderer.rendered_windows == 0
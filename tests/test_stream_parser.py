@@ -0,0 +1,43 @@
+import json
+import random
+from music_composer.stream_parser import IncrementalNoteParser
+
+COMPOSITION = {
+	"key_signature": "C",
+	"notes": [
+		{"type": "note", "pitch": "C4", "offset": i, "text": "brace } and \"quote\" [", "effects": {"bend": [0, 1]}}
+		for i in range(50)
+	],
+	"tempo": 90
+}
+
+def _feed(text, sizes):
+	parser = IncrementalNoteParser()
+	notes = []
+	position = 0
+	while position < len(text):
+		size = sizes()
+		notes.extend(parser.feed(text[position:position + size]))
+		position += size
+	return parser, notes
+
+def test_notes_are_the_same_for_any_chunking():
+	text = json.dumps(COMPOSITION)
+	rng = random.Random(1)
+	for sizes in (lambda: 1, lambda: 7, lambda: rng.randint(1, 200), lambda: len(text)):
+		parser, notes = _feed(text, sizes)
+		assert notes == COMPOSITION["notes"]
+		assert parser.notes_emitted == 50
+		assert parser.text == text
+		assert parser.finish() == COMPOSITION
+
+def test_notes_key_split_across_chunks():
+	parser = IncrementalNoteParser()
+	notes = parser.feed('{"tempo": 90, "no')
+	notes += parser.feed('tes": [{"pitch": "C4"}, {"pi')
+	notes += parser.feed('tch": "D4"}]}')
+	assert notes == [{"pitch": "C4"}, {"pitch": "D4"}]
+
+def test_malformed_note_is_skipped():
+	parser = IncrementalNoteParser()
+	assert parser.feed('{"notes": [{"pitch": C4}, {"pitch": "E4"}]}') == [{"pitch": "E4"}]
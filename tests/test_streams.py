@@ -0,0 +1,126 @@
+import os
+import wave
+from contextlib import contextmanager
+import pytest
+
+web_server = pytest.importorskip("music_composer.web_server")
+from music_composer.artifact_store import ArtifactStore
+from music_composer.synth import wav_header
+
+PCM = bytes(range(256)) * 64
+
+class FakeComposer:
+	def __init__(self):
+		self.calls = 0
+
+	def stream_music(self, user_prompt, instruments=None, output_dir=None, use_cache=True):
+		self.calls += 1
+		yield wav_header(44100)
+		with wave.open(os.path.join(output_dir, "output.wav"), "wb") as wav:
+			wav.setnchannels(2)
+			wav.setsampwidth(2)
+			wav.setframerate(44100)
+			for start in range(0, len(PCM), 4096):
+				wav.writeframes(PCM[start:start + 4096])
+				yield PCM[start:start + 4096]
+
+class FakePool:
+	def __init__(self, composer):
+		self.composer = composer
+
+	@contextmanager
+	def acquire(self, model_name):
+		yield self.composer
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+	composer = FakeComposer()
+	monkeypatch.setattr(web_server, "artifact_store", ArtifactStore(root=str(tmp_path)))
+	monkeypatch.setattr(web_server, "composer_pool", FakePool(composer))
+	monkeypatch.setattr(web_server, "pending_streams", {})
+	with web_server.app.test_client() as client:
+		client.composer = composer
+		yield client
+
+def test_stream_can_be_opened_again_after_it_finished(client):
+	stream = client.post("/api/streams", json={"text": "calm piano"}).get_json()
+	first = client.get(stream["stream_url"])
+	assert first.status_code == 200
+	assert first.data[44:] == PCM
+
+	replay = client.get(stream["stream_url"])
+	assert replay.status_code == 200
+	assert replay.data[44:] == PCM
+	partial = client.get(stream["stream_url"], headers={"Range": "bytes=44-99"})
+	assert partial.status_code == 206
+	assert partial.data == PCM[:56]
+	assert client.composer.calls == 1
+
+def test_disconnected_stream_is_generated_again(client):
+	stream = client.post("/api/streams", json={"text": "calm piano"}).get_json()
+	response = client.get(stream["stream_url"], buffered=False)
+	next(response.response)
+	response.close()
+	assert web_server.pending_streams[stream["stream_id"]]["status"] == "pending"
+
+	retry = client.get(stream["stream_url"])
+	assert retry.data[44:] == PCM
+	assert client.composer.calls == 2
+
+def test_unknown_stream_is_not_found(client):
+	assert client.get("/api/streams/0123abcd").status_code == 404
+
+def test_follower_sends_the_file_as_it_is_written(client):
+	job_dir = web_server.artifact_store.job_dir("0123abcd")
+	os.makedirs(job_dir)
+	stream = {"status": "running", "followers": 1}
+	path = os.path.join(job_dir, "output.wav")
+	f = open(path, "wb")
+	wav = wave.open(f, "wb")
+	wav.setnchannels(2)
+	wav.setsampwidth(2)
+	wav.setframerate(22050)
+	wav.writeframes(PCM[:4096])
+	f.flush()
+
+	follower = web_server.follow_stream(stream, "0123abcd")
+	assert next(follower) == wav_header(22050)
+	assert next(follower) == PCM[:4096]
+	wav.writeframes(PCM[4096:])
+	wav.close()
+	f.close()
+	stream["status"] = "done"
+	assert b"".join(follower) == PCM[4096:]
+	assert stream["followers"] == 0
+
+def test_followers_keep_the_generation_running_after_the_first_client_leaves(client):
+	stream = client.post("/api/streams", json={"text": "calm piano"}).get_json()
+	starter = client.get(stream["stream_url"], buffered=False)
+	assert next(starter.response) == wav_header(44100)
+	next(starter.response)
+	follower = client.get(stream["stream_url"], buffered=False)
+	starter.close()
+
+	assert b"".join(follower.response)[44:] == PCM
+	assert web_server.pending_streams[stream["stream_id"]]["status"] == "done"
+	assert web_server.pending_streams[stream["stream_id"]]["followers"] == 0
+	assert client.composer.calls == 1
+
+def test_follower_fails_when_the_generation_stops_early(client):
+	job_dir = web_server.artifact_store.job_dir("0123abcd")
+	os.makedirs(job_dir)
+	with wave.open(os.path.join(job_dir, "output.wav"), "wb") as wav:
+		wav.setnchannels(2)
+		wav.setsampwidth(2)
+		wav.setframerate(44100)
+		wav.writeframes(PCM[:4096])
+	stream = {"status": "running", "followers": 1}
+
+	follower = web_server.follow_stream(stream, "0123abcd")
+	assert next(follower) == wav_header(44100)
+	assert next(follower) == PCM[:4096]
+	# The first client left and nobody kept the generation going
+	stream["status"] = "pending"
+	with pytest.raises(RuntimeError):
+		next(follower)
+	assert stream["followers"] == 0
@@ -0,0 +1,45 @@
+import math
+import os
+import subprocess
+import sys
+import textwrap
+import pytest
+from music_composer.worker_pool import PACKAGE_PARENT, WorkerPool
+
+def test_results_come_back_and_workers_are_reused():
+	with WorkerPool(2) as pool:
+		assert pool.submit(math.sqrt, 16.0).result(60) == 4.0
+		pids = {pool.submit(os.getpid).result(60) for _ in range(6)}
+	assert os.getpid() not in pids
+	assert 1 <= len(pids) <= 2
+
+def test_exceptions_are_raised_from_the_future():
+	with WorkerPool(1) as pool:
+		with pytest.raises(ValueError):
+			pool.submit(math.sqrt, -1.0).result(60)
+		# The worker survives a failed task
+		assert pool.submit(math.sqrt, 9.0).result(60) == 3.0
+
+def test_a_dead_worker_fails_its_task_and_is_replaced():
+	with WorkerPool(1) as pool:
+		first = pool.submit(os.getpid).result(60)
+		with pytest.raises(RuntimeError):
+			pool.submit(os._exit, 1).result(60)
+		assert pool.submit(os.getpid).result(60) != first
+
+def test_workers_do_not_import_the_callers_main(tmp_path):
+	marker = tmp_path / "runs.txt"
+	script = tmp_path / "script.py"
+	script.write_text(textwrap.dedent(f"""
+		import math
+		from music_composer.worker_pool import WorkerPool
+		with open({str(marker)!r}, "a") as f:
+			f.write("run\\n")
+		with WorkerPool(2) as pool:
+			print(sum(future.result() for future in [pool.submit(math.sqrt, 4.0) for _ in range(4)]))
+	"""))
+	env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [PACKAGE_PARENT, os.getenv("PYTHONPATH")])))
+	result = subprocess.run([sys.executable, str(script)], env=env, cwd=str(tmp_path), capture_output=True, text=True, timeout=120)
+	assert result.returncode == 0, result.stderr
+	assert result.stdout.split() == ["8.0"]
+	assert marker.read_text() == "run\n"